@@ -0,0 +1,94 @@
+"""
+Measures cold import time of ai_storyteller modules and flags heavy dependencies
+pulled in at import.
+
+Each module is imported in a fresh interpreter, so nothing is shared between runs.
+Backends are expected to load torch, transformers, diffusers and friends on first
+use, not on import; any module that imports one of them, or takes longer than
+`--max-ms`, fails the run. Useful as a regression guard in CI:
+
+    uv run python scripts/benchmarks/bench_import_time.py --max-ms 150
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+
+import typer
+
+DEFAULT_MODULES = [
+    "ai_storyteller.pipeline.cli",
+    "ai_storyteller.pipeline.runner",
+    "ai_storyteller.music_generation.diffrhythm",
+    "ai_storyteller.music_generation.worker",
+    "ai_storyteller.text_generation.gemini",
+    "ai_storyteller.text_generation.chat_completions",
+    "ai_storyteller.text_generation.local_transformers",
+    "ai_storyteller.image_generation.flux",
+    "ai_storyteller.tts.narration",
+    "ai_storyteller.asr.transcriber",
+]
+
+# Must not be imported until a backend is used
+HEAVY_MODULES = [
+    "torch",
+    "torchaudio",
+    "transformers",
+    "diffusers",
+    "numpy",
+    "pydantic_settings",
+    "google.genai",
+    "openai",
+    "dotenv",
+]
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def import_once(module: str) -> tuple[float, list[str]]:
+    """Imports `module` in a new interpreter. Returns seconds spent and heavy modules loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data["seconds"], data["heavy"]
+
+
+def main(
+    modules: list[str] = typer.Argument(None, help="Modules to import. Defaults to the entry points."),
+    repeats: int = typer.Option(5, help="Fresh interpreters per module; the median is reported."),
+    max_ms: float | None = typer.Option(None, help="Fail if any median import takes longer."),
+) -> None:
+    failures = []
+    typer.echo(f"{'module':<52} {'median ms':>10} {'min ms':>8}  heavy imports")
+    for module in modules or DEFAULT_MODULES:
+        try:
+            runs = [import_once(module) for _ in range(repeats)]
+        except subprocess.CalledProcessError as e:
+            typer.echo(f"{module:<52} failed: {e.stderr.strip().splitlines()[-1]}")
+            failures.append(module)
+            continue
+        times = [seconds * 1000 for seconds, _ in runs]
+        heavy = runs[-1][1]
+        median = statistics.median(times)
+        typer.echo(f"{module:<52} {median:10.1f} {min(times):8.1f}  {', '.join(heavy) or '-'}")
+        if heavy or (max_ms is not None and median > max_ms):
+            failures.append(module)
+    if failures:
+        typer.echo(f"{len(failures)} module(s) over budget or importing heavy dependencies")
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
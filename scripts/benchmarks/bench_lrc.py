@@ -0,0 +1,83 @@
+"""
+Benchmarks lyric sheet cleaning, parsing and validation on a synthetic corpus.
+
+Sheets look like LLM output: a code fence around timed lines, with some sheets
+overrunning the song or going back in time.
+
+    uv run python scripts/benchmarks/bench_lrc.py --sheets 5000
+"""
+
+import random
+import time
+from collections.abc import Callable
+
+import typer
+
+from ai_storyteller.utils.lrc import LrcValidationError, LyricSheet, format_timestamp
+from ai_storyteller.utils.text_utils import clean_lyric_lines
+
+WORDS = "小羊 大野狼 媽媽 森林 門 敲 唱歌 快樂 lamb wolf mother forest door sing".split()
+
+
+def make_sheet(rng: random.Random, lines: int, audio_length: int) -> str:
+    time_cs = rng.randrange(0, 1000)
+    step = audio_length * 100 // lines
+    out = ["```"]
+    for _ in range(lines):
+        text = " ".join(rng.choices(WORDS, k=rng.randint(3, 8)))
+        out.append(f"{format_timestamp(time_cs)}{text}")
+        # Random gaps make some sheets overrun the song; a few step backwards
+        time_cs += rng.randint(step // 2, step + step // 5)
+        if rng.random() < 0.005:
+            time_cs -= step * 2
+    out.append("```")
+    return "\n".join(out)
+
+
+def best_of(repeats: int, fn: Callable[[], object]) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(
+    sheets: int = typer.Option(5000, help="Lyric sheets in the corpus."),
+    lines: int = typer.Option(40, help="Lines per sheet."),
+    audio_length: int = typer.Option(95, help="Song length to validate against."),
+    repeats: int = typer.Option(5, help="Runs per case; the fastest is reported."),
+    seed: int = typer.Option(0),
+) -> None:
+    rng = random.Random(seed)
+    corpus = [make_sheet(rng, lines, audio_length) for _ in range(sheets)]
+    total_lines = sheets * lines
+
+    def validate_all() -> int:
+        invalid = 0
+        for text in corpus:
+            try:
+                LyricSheet.parse(text).check(audio_length)
+            except LrcValidationError:
+                invalid += 1
+        return invalid
+
+    cases: dict[str, Callable[[], object]] = {
+        "clean_lyric_lines": lambda: [clean_lyric_lines(text) for text in corpus],
+        "LyricSheet.parse": lambda: [LyricSheet.parse(text) for text in corpus],
+        "parse + check": validate_all,
+        "parse + to_lrc": lambda: [LyricSheet.parse(text).to_lrc() for text in corpus],
+    }
+    typer.echo(f"{sheets} sheets x {lines} lines, best of {repeats}")
+    for name, fn in cases.items():
+        seconds = best_of(repeats, fn)
+        typer.echo(
+            f"{name:>20}: {seconds * 1000:8.1f} ms  "
+            f"{sheets / seconds:10.0f} sheets/s  {total_lines / seconds:12.0f} lines/s"
+        )
+    typer.echo(f"{validate_all()} of {sheets} sheets rejected")
+
+
+if __name__ == "__main__":
+    typer.run(main)
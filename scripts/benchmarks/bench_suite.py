@@ -0,0 +1,434 @@
+"""
+Benchmarks the generation pipeline end to end against tiny local stand-in models.
+
+Every case runs in a fresh interpreter, so its first run is a true cold start
+(imports, model load, first inference) and its peak RSS is its own. The case is then
+repeated warm. Results go to a JSON file with latency percentiles, throughput and
+peak RSS, and are compared against a stored baseline:
+
+    uv run python scripts/benchmarks/bench_suite.py run                 # all cases
+    uv run python scripts/benchmarks/bench_suite.py run text.* image.*  # glob filter
+    uv run python scripts/benchmarks/bench_suite.py run --save-baseline
+    uv run python scripts/benchmarks/bench_suite.py list
+
+Stand-in models (see standins.py) are built once into the stand-in directory. The
+numbers measure our code and the framework around it on a CPU-only box, so compare
+runs on the same machine only.
+"""
+
+import fnmatch
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import typer
+
+import standins
+
+if TYPE_CHECKING:
+    from ai_storyteller.library.store import StoryLibrary
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_OUTPUT = BASE_DIR / "data" / "cache" / "benchmarks" / "latest.json"
+DEFAULT_BASELINE = BASE_DIR / "data" / "cache" / "benchmarks" / "baseline.json"
+DEFAULT_STANDINS = BASE_DIR / "data" / "cache" / "benchmarks" / "standins"
+LRC_DIR = BASE_DIR / "data" / "music_generation" / "lrc"
+STORIES_DIR = BASE_DIR / "data" / "stories"
+
+app = typer.Typer(help=__doc__, add_completion=False)
+
+
+@dataclass
+class Workload:
+    """A prepared case: `run` does one unit of measured work covering `items` items."""
+
+    run: Callable[[], object]
+    items: int
+    unit: str
+
+
+# name -> builder(stand-in dir, scratch dir); builders import lazily so cold runs count imports
+CASES: dict[str, Callable[[Path, Path], Workload]] = {}
+
+
+def case(name: str) -> Callable[[Callable[[Path, Path], Workload]], Callable[[Path, Path], Workload]]:
+    def register(builder: Callable[[Path, Path], Workload]) -> Callable[[Path, Path], Workload]:
+        CASES[name] = builder
+        return builder
+
+    return register
+
+
+def _fitted_lrc(scratch: Path, audio_length: int) -> Path:
+    from ai_storyteller.utils.lrc import LyricSheet
+
+    text = (LRC_DIR / "eg_en_full.lrc").read_text(encoding="utf-8")
+    path = scratch / f"song_{audio_length}.lrc"
+    path.write_text(LyricSheet.parse(text).fit(audio_length).to_lrc(), encoding="utf-8")
+    return path
+
+
+def _music_script_case(audio_length: int, chunked: bool) -> Callable[[Path, Path], Workload]:
+    def build(root: Path, scratch: Path) -> Workload:
+        from ai_storyteller.music_generation.diffrhythm import DiffRhythm
+
+        os.environ["DIFFRHYTHM_PYTHON"] = sys.executable  # The stand-in is not a uv project
+        model = DiffRhythm(package_path=standins.diffrhythm_vendor(root))
+        lrc_path = _fitted_lrc(scratch, audio_length)
+
+        def run() -> None:
+            path = model.generate_music(
+                ref_prompt="Children's song",
+                lrc_path=lrc_path,
+                audio_length=audio_length,  # type: ignore[arg-type]
+                output_dir=scratch,
+                chunked=chunked,
+            )
+            if path is None:
+                raise RuntimeError("Music generation failed.")
+
+        return Workload(run, 1, "songs")
+
+    return build
+
+
+for _length in (95, 285):
+    for _chunked in (True, False):
+        case(f"music.script.{_length}.{'chunked' if _chunked else 'full'}")(
+            _music_script_case(_length, _chunked)
+        )
+
+
+def _music_engine_case(audio_length: int) -> Callable[[Path, Path], Workload]:
+    def build(root: Path, scratch: Path) -> Workload:
+        from ai_storyteller.music_generation.engine import DiffRhythmEngine
+
+        engine = DiffRhythmEngine(
+            standins.diffrhythm_vendor(root), audio_length=audio_length, device="cpu"  # type: ignore[arg-type]
+        )
+        lrc = _fitted_lrc(scratch, audio_length).read_text(encoding="utf-8")
+        return Workload(lambda: engine.generate(scratch / "engine.wav", lrc=lrc), 1, "songs")
+
+    return build
+
+
+for _length in (95, 285):
+    case(f"music.engine.{_length}")(_music_engine_case(_length))
+
+
+@case("lyrics.clean")
+def _lyrics_clean(root: Path, scratch: Path) -> Workload:
+    from ai_storyteller.utils.lrc import LyricSheet
+    from ai_storyteller.utils.text_utils import clean_lyric_lines
+
+    # Wrapped like model output, repeated to a corpus worth timing
+    sheets = [
+        f"```\n{path.read_text(encoding='utf-8')}\n```" for path in sorted(LRC_DIR.glob("*.lrc"))
+    ] * 200
+
+    def run() -> None:
+        for text in sheets:
+            cleaned = clean_lyric_lines(text)
+            if cleaned:
+                LyricSheet.parse(cleaned).fit(285).check(285).to_lrc()
+
+    return Workload(run, len(sheets), "sheets")
+
+
+@case("story.load")
+def _story_load(root: Path, scratch: Path) -> Workload:
+    from ai_storyteller.pipeline.story import list_story_dirs, load_story
+
+    repeats = 100
+
+    def run() -> None:
+        for _ in range(repeats):
+            for path in list_story_dirs(STORIES_DIR):
+                load_story(path)
+
+    return Workload(run, repeats * len(list_story_dirs(STORIES_DIR)), "stories")
+
+
+def _library(scratch: Path, copies: int = 1000) -> "StoryLibrary":
+    from ai_storyteller.library.store import StoryLibrary
+    from ai_storyteller.pipeline.story import list_story_dirs, load_story
+
+    library = StoryLibrary(scratch / "library" / "stories.db")
+    stories = []
+    for i in range(copies):
+        for path in list_story_dirs(STORIES_DIR):
+            story = load_story(path)
+            story.name, story.title, story.path = f"{story.name}_{i}", f"{story.title} {i}", None
+            stories.append(story)
+    library.add_stories(stories)
+    return library
+
+
+@case("library.list")
+def _library_list(root: Path, scratch: Path) -> Workload:
+    library = _library(scratch)
+    return Workload(library.list_stories, len(library), "stories")
+
+
+@case("library.search")
+def _library_search(root: Path, scratch: Path) -> Workload:
+    library = _library(scratch)
+    # Trigram index for the longer queries, a LIKE scan for the two-character ones
+    queries = ["大野狼", "珍珠奶茶", "小羊", "媽媽", "冰箱裡"]
+
+    def run() -> None:
+        for query in queries:
+            library.search(query, limit=20)
+
+    return Workload(run, len(queries), "queries")
+
+
+def _prompts(count: int) -> list[str]:
+    words = standins.CORPUS[1].split()
+    return [" ".join(words[i : i + 12]) + f" ({i})" for i in range(count)]
+
+
+def _transformers_case(quantization: str) -> Callable[[Path, Path], Workload]:
+    def build(root: Path, scratch: Path) -> Workload:
+        from ai_storyteller.text_generation.local_transformers import TransformersTextGeneration
+
+        model = TransformersTextGeneration(
+            str(standins.text_model(root)),
+            device="cpu",
+            quantization=quantization,  # type: ignore[arg-type]
+            max_new_tokens=32,
+            temperature=0.0,  # Greedy: every run does the same work
+            batch_wait=0.01,
+        )
+        prompts = _prompts(8)
+        return Workload(lambda: model.generate_text_batch(prompts), len(prompts), "prompts")
+
+    return build
+
+
+case("text.transformers")(_transformers_case("none"))
+case("text.transformers.int8")(_transformers_case("int8"))
+
+
+@case("text.chat_completions")
+def _chat_completions(root: Path, scratch: Path) -> Workload:
+    from ai_storyteller.text_generation.chat_completions import ChatCompletionsTextGeneration
+
+    # Local stand-in server: measures the client's request layer, not a remote model
+    server = standins.FakeChatServer().start()
+    model = ChatCompletionsTextGeneration("stand-in", server.url)
+    prompts = _prompts(32)
+    return Workload(lambda: model.generate_text_batch(prompts), len(prompts), "prompts")
+
+
+@case("image.flux")
+def _image_flux(root: Path, scratch: Path) -> Workload:
+    from ai_storyteller.image_generation.flux import FluxImageGeneration
+
+    model = FluxImageGeneration(
+        str(standins.flux_pipeline(root)),
+        offload="none",
+        style="watercolor",
+        device="cpu",
+        num_inference_steps=2,
+        height=64,
+        width=64,
+        max_sequence_length=32,
+        batch_wait=0.01,
+    )
+    prompts = [f"watercolor. {prompt}" for prompt in _prompts(4)]
+    paths = [scratch / f"page_{i}.png" for i in range(len(prompts))]
+    return Workload(lambda: model.generate_images(prompts, paths), len(prompts), "images")
+
+
+@case("tts.vits")
+def _tts_vits(root: Path, scratch: Path) -> Workload:
+    from ai_storyteller.pipeline.story import list_story_dirs, load_story
+    from ai_storyteller.tts.narration import NarrationEngine
+    from ai_storyteller.tts.vits import VitsTTS
+
+    story = load_story(list_story_dirs(STORIES_DIR)[0])
+    pages = {page.key: page.text for page in story.pages if page.text.strip()}
+    engine = NarrationEngine(VitsTTS(str(standins.vits_model(root))), cache=None)
+    return Workload(lambda: engine.narrate_pages(pages, scratch), len(pages), "pages")
+
+
+# --- Measurement ---
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; children covers the DiffRhythm shell script
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))]
+
+
+@app.command("case", hidden=True)
+def run_case(name: str, standin_dir: Path, result_file: Path, repeats: int) -> None:
+    """Runs one case in this process and writes its raw timings to `result_file`."""
+    scratch = Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        started = time.perf_counter()
+        workload = CASES[name](standin_dir, scratch)
+        workload.run()
+        cold = time.perf_counter() - started
+        warm = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            workload.run()
+            warm.append(time.perf_counter() - started)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    result_file.write_text(
+        json.dumps(
+            {
+                "cold_seconds": cold,
+                "warm_seconds": warm,
+                "items": workload.items,
+                "unit": workload.unit,
+                "peak_rss_mb": _peak_rss_mb(),
+            }
+        )
+    )
+
+
+def _summarize(raw: dict) -> dict:
+    warm = raw["warm_seconds"]
+    p50 = _percentile(warm, 0.5)
+    return {
+        "cold_seconds": raw["cold_seconds"],
+        "warm_p50_seconds": p50,
+        "warm_p90_seconds": _percentile(warm, 0.9),
+        "warm_p99_seconds": _percentile(warm, 0.99),
+        "warm_mean_seconds": sum(warm) / len(warm),
+        "warm_runs": len(warm),
+        "throughput": raw["items"] / p50 if p50 > 0 else None,
+        "unit": f"{raw['unit']}/s",
+        "peak_rss_mb": raw["peak_rss_mb"],
+    }
+
+
+def _metadata() -> dict:
+    import torch
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True
+    ).stdout.strip()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def _compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints the change against the baseline per case and returns the regressed cases."""
+    regressions = []
+    typer.echo(f"\nAgainst baseline from {baseline['metadata'].get('timestamp')} ({baseline['metadata'].get('commit')}):")
+    typer.echo(f"{'case':<30} {'warm p50':>10} {'cold':>10} {'peak RSS':>10}")
+    for name, result in results["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None or "error" in result or "error" in before:
+            continue
+        changes = []
+        regressed = False
+        for key in ("warm_p50_seconds", "cold_seconds", "peak_rss_mb"):
+            ratio = result[key] / before[key] if before[key] else 1.0
+            regressed |= ratio > 1 + tolerance
+            changes.append(f"{(ratio - 1) * 100:+9.1f}%")
+        typer.echo(f"{name:<30} {' '.join(changes)}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+@app.command("list")
+def list_cases() -> None:
+    """Lists the benchmark cases."""
+    for name in CASES:
+        typer.echo(name)
+
+
+@app.command("run")
+def run(
+    patterns: list[str] = typer.Argument(None, help="Case names or globs. All cases if omitted."),
+    repeats: int = typer.Option(5, help="Warm runs per case after the cold one."),
+    output: Path = typer.Option(DEFAULT_OUTPUT, help="Where to write the results JSON."),
+    baseline: Path = typer.Option(DEFAULT_BASELINE, help="Results JSON to compare against."),
+    save_baseline: bool = typer.Option(False, help="Also store these results as the baseline."),
+    tolerance: float = typer.Option(0.1, help="Slowdown or growth that counts as a regression."),
+    fail_on_regression: bool = typer.Option(False, help="Exit with code 1 on any regression."),
+    standin_dir: Path = typer.Option(DEFAULT_STANDINS, help="Where stand-in models are built."),
+) -> None:
+    """Runs the cases, each in a fresh process, and records the results."""
+    names = [
+        name
+        for name in CASES
+        if not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+    ]
+    if not names:
+        raise typer.BadParameter(f"No cases match {patterns}.")
+
+    results: dict = {"metadata": {}, "cases": {}}
+    typer.echo(f"{'case':<30} {'cold s':>8} {'p50 s':>8} {'p90 s':>8} {'throughput':>18} {'RSS MB':>8}")
+    for name in names:
+        with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+            process = subprocess.run(
+                [sys.executable, __file__, "case", name, str(standin_dir), result_file.name, str(repeats)],
+                capture_output=True,
+                text=True,
+                # Case output is noise here; the stand-in models get the same threads each run
+                env={**os.environ, "TOKENIZERS_PARALLELISM": "false"},
+            )
+            if process.returncode != 0:
+                error = (process.stderr.strip().splitlines() or ["failed"])[-1]
+                results["cases"][name] = {"error": error}
+                typer.echo(f"{name:<30} failed: {error}")
+                continue
+            summary = _summarize(json.loads(Path(result_file.name).read_text()))
+        results["cases"][name] = summary
+        typer.echo(
+            f"{name:<30} {summary['cold_seconds']:8.3f} {summary['warm_p50_seconds']:8.3f} "
+            f"{summary['warm_p90_seconds']:8.3f} {summary['throughput']:10.1f} {summary['unit']:<7} "
+            f"{summary['peak_rss_mb']:8.0f}"
+        )
+
+    # Collected after the cases: Linux keeps a parent's peak RSS across fork and exec, so
+    # importing torch here first would inflate every case's figure
+    results["metadata"] = _metadata()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    typer.echo(f"Results written to {output}")
+
+    regressions = []
+    if baseline.is_file() and not save_baseline:
+        regressions = _compare(results, json.loads(baseline.read_text()), tolerance)
+    if save_baseline:
+        baseline.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(output, baseline)
+        typer.echo(f"Baseline saved to {baseline}")
+    if regressions and fail_on_regression:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,108 @@
+"""
+Checks the OpenAI-compatible text client against a local fake server (see
+`standins.FakeChatServer`), without network access or API keys.
+
+Covers batch ordering, the concurrency limit, connection reuse, the prompt cache,
+retries on rate limits and server errors, no retries on client errors, and streaming:
+
+    uv run python scripts/benchmarks/check_chat_client.py
+"""
+
+import tempfile
+from collections.abc import Callable
+
+import httpx
+import typer
+
+import standins
+from ai_storyteller.text_generation.base import PromptCache, RetryPolicy
+from ai_storyteller.text_generation.chat_completions import ChatCompletionsTextGeneration
+
+FAST_RETRIES = RetryPolicy(max_attempts=3, initial_delay=0.01, max_delay=0.05)
+
+app = typer.Typer(help=__doc__, add_completion=False)
+
+
+def check_batch(cache_dir: str) -> None:
+    prompts = [f"prompt {i}" for i in range(16)]
+    with (
+        standins.FakeChatServer(latency=0.05) as server,
+        ChatCompletionsTextGeneration(
+            "stand-in", server.url, max_concurrency=4, cache=PromptCache(cache_dir)
+        ) as model,
+    ):
+        replies = model.generate_text_batch(prompts)
+        assert replies == [prompt[::-1] for prompt in prompts], replies
+        assert server.max_in_flight <= 4, f"{server.max_in_flight} requests in flight"
+        assert server.connections <= 4, f"{server.connections} connections for 4 slots"
+
+        requests = server.requests
+        assert model.generate_text_batch(prompts) == replies
+        assert server.requests == requests, "cached prompts were requested again"
+
+
+def check_retries(cache_dir: str) -> None:
+    with (
+        standins.FakeChatServer(failures=(429, 503)) as server,
+        ChatCompletionsTextGeneration("stand-in", server.url, retry_policy=FAST_RETRIES) as model,
+    ):
+        assert model.generate_text("retry me") == "em yrter"
+        assert server.requests == 3, f"{server.requests} requests for 2 failures"
+
+
+def check_client_errors(cache_dir: str) -> None:
+    with (
+        standins.FakeChatServer(failures=(400,)) as server,
+        ChatCompletionsTextGeneration("stand-in", server.url, retry_policy=FAST_RETRIES) as model,
+    ):
+        try:
+            model.generate_text("bad request")
+        except httpx.HTTPStatusError as e:
+            assert e.response.status_code == 400
+        else:
+            raise AssertionError("a 400 response did not raise")
+        assert server.requests == 1, f"a 400 response was retried {server.requests - 1} times"
+
+
+def check_stream(cache_dir: str) -> None:
+    prompt = "stream this reply in pieces"
+    with (
+        standins.FakeChatServer(failures=(503,)) as server,
+        ChatCompletionsTextGeneration(
+            "stand-in", server.url, retry_policy=FAST_RETRIES, cache=PromptCache(cache_dir)
+        ) as model,
+    ):
+        pieces = list(model.stream_text(prompt))
+        assert "".join(pieces) == prompt[::-1], pieces
+        assert len(pieces) > 1, "the reply was not streamed"
+        assert model.generate_text(prompt) == prompt[::-1]
+        assert server.requests == 2, "a streamed reply was not cached"
+
+
+CHECKS: dict[str, Callable[[str], None]] = {
+    "batch": check_batch,
+    "retries": check_retries,
+    "client_errors": check_client_errors,
+    "stream": check_stream,
+}
+
+
+@app.command()
+def main() -> None:
+    """Runs every check, printing one line each; exits non-zero if any fails."""
+    failed = 0
+    for name, check in CHECKS.items():
+        with tempfile.TemporaryDirectory(prefix="chat-client-") as cache_dir:
+            try:
+                check(cache_dir)
+            except Exception as e:
+                failed += 1
+                typer.echo(f"{name:<15} FAILED: {type(e).__name__}: {e}")
+                continue
+        typer.echo(f"{name:<15} ok")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
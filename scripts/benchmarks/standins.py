@@ -0,0 +1,444 @@
+"""
+Tiny local stand-ins for the models the benchmark suite drives.
+
+Each builder writes a randomly initialised model with the real architecture (or, for
+DiffRhythm, a vendor tree with the same entry points and tensor shapes) into a cache
+directory and returns its path. Nothing is downloaded, so the suite runs on a
+CPU-only box without network access; the numbers measure our code paths and the
+framework overhead around them, not model quality. Hosted text models are stood in
+for by `FakeChatServer`, a local OpenAI-compatible endpoint.
+"""
+
+import json
+import threading
+import time
+from collections.abc import Sequence
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SEED = 0
+CORPUS = [
+    "the quick brown fox jumps over the lazy dog and sings a song about the moon " * 20,
+    "once upon a time seven little goats lived with their mother in the forest " * 20,
+    "在一個涼爽的冰箱裡住著快樂的珍珠奶茶三兄弟 小羊 大野狼 媽媽 森林 唱歌 " * 20,
+]
+
+# Same entry points and shapes as DiffRhythm's infer/infer_utils.py: latents are
+# [batch, frames, 64] and the VAE turns each frame into 2048 stereo samples.
+INFER_UTILS = '''
+import torch
+
+LATENT_DIM = 64
+SAMPLES_PER_FRAME = 2048
+
+
+class CFM(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.net = torch.nn.Sequential(
+            torch.nn.Linear(LATENT_DIM * 2, 256), torch.nn.SiLU(), torch.nn.Linear(256, LATENT_DIM)
+        )
+
+    def sample(self, cond, text, duration, style_prompt, negative_style_prompt, steps, cfg_strength, start_time):
+        x = torch.randn_like(cond)
+        for step in range(steps):
+            t = torch.full_like(x, step / steps)
+            velocity = self.net(torch.cat([x, t], dim=-1))
+            x = x + velocity / steps
+        return x, None
+
+
+class VAE(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.up = torch.nn.ConvTranspose1d(LATENT_DIM, 2, SAMPLES_PER_FRAME, stride=SAMPLES_PER_FRAME)
+
+    def decode_export(self, z):  # [b d t] -> [b 2 t*2048]
+        return torch.tanh(self.up(z))
+
+
+def prepare_model(max_frames, device, repo_id=None):
+    torch.manual_seed(0)
+    return CFM().to(device), object(), object(), VAE().to(device)
+
+
+def get_negative_style_prompt(device):
+    return torch.zeros(1, 512, device=device).half()
+
+
+def get_lrc_token(max_frames, text, tokenizer, device):
+    tokens = torch.zeros(1, max_frames, dtype=torch.long, device=device)
+    for i, char in enumerate(text[:max_frames]):
+        tokens[0, i] = ord(char) % 363
+    return tokens, torch.tensor([0.0], device=device)
+
+
+def get_style_prompt(model, wav_path=None, prompt=None):
+    return torch.ones(1, 512).half()
+
+
+def decode_audio(latents, vae_model, chunked=False, overlap=32, chunk_size=128):
+    if not chunked:
+        return vae_model.decode_export(latents)
+    frames = latents.shape[2]
+    hop = chunk_size - overlap
+    pieces = []
+    for start in range(0, frames, hop):
+        end = min(frames, start + chunk_size)
+        audio = vae_model.decode_export(latents[:, :, start:end])
+        if end == frames:
+            pieces.append(audio)
+            break
+        pieces.append(audio[:, :, : hop * SAMPLES_PER_FRAME])
+    return torch.cat(pieces, dim=2)
+'''
+
+# Same command line as DiffRhythm's infer/infer.py, as called by run_diffrhythm.sh
+INFER_SCRIPT = '''
+import argparse
+import os
+import wave
+
+import torch
+
+from infer_utils import (
+    decode_audio,
+    get_lrc_token,
+    get_negative_style_prompt,
+    get_style_prompt,
+    prepare_model,
+)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--lrc-path")
+parser.add_argument("--ref-prompt")
+parser.add_argument("--ref-audio-path")
+parser.add_argument("--chunked", action="store_true")
+parser.add_argument("--audio-length", type=int, default=95)
+parser.add_argument("--repo-id", "--repo_id", dest="repo_id")
+parser.add_argument("--output-dir", default="infer/example/output")
+parser.add_argument("--output-file-name", default="output.wav")
+args = parser.parse_args()
+
+max_frames = {95: 2048, 285: 6144}[args.audio_length]
+cfm, tokenizer, muq, vae = prepare_model(max_frames, "cpu", repo_id=args.repo_id)
+lrc = open(args.lrc_path, encoding="utf-8").read() if args.lrc_path else ""
+with torch.inference_mode():
+    lrc_prompt, start_time = get_lrc_token(max_frames, lrc, tokenizer, "cpu")
+    style = get_style_prompt(muq, args.ref_audio_path, prompt=args.ref_prompt)
+    latents, _ = cfm.sample(
+        cond=torch.zeros(1, max_frames, 64),
+        text=lrc_prompt,
+        duration=max_frames,
+        style_prompt=style,
+        negative_style_prompt=get_negative_style_prompt("cpu"),
+        steps=32,
+        cfg_strength=4.0,
+        start_time=start_time,
+    )
+    audio = decode_audio(latents.transpose(1, 2), vae, chunked=args.chunked)[0]
+pcm = audio.clamp(-1, 1).mul(32767).to(torch.int16).T.contiguous().numpy()
+os.makedirs(args.output_dir, exist_ok=True)
+with wave.open(os.path.join(args.output_dir, args.output_file_name), "wb") as out:
+    out.setnchannels(2)
+    out.setsampwidth(2)
+    out.setframerate(44100)
+    out.writeframes(pcm.tobytes())
+print(f"Wrote {args.output_file_name}")
+'''
+
+def _done(path: Path) -> bool:
+    return (path / ".complete").is_file()
+
+
+def _mark_done(path: Path) -> Path:
+    (path / ".complete").touch()
+    return path
+
+
+def diffrhythm_vendor(root: Path) -> Path:
+    """
+    A DiffRhythm checkout stand-in, usable by both `DiffRhythm` and `DiffRhythmEngine`.
+
+    It is not a uv project, so run `DiffRhythm` on it with DIFFRHYTHM_PYTHON set.
+    """
+    path = root / "DiffRhythm"
+    if _done(path):
+        return path
+    (path / "infer").mkdir(parents=True, exist_ok=True)
+    (path / "infer" / "__init__.py").write_text("")
+    (path / "infer" / "infer_utils.py").write_text(INFER_UTILS.lstrip())
+    (path / "infer" / "infer.py").write_text(INFER_SCRIPT.lstrip())
+    return _mark_done(path)
+
+
+def _tokenizer() -> "object":
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast  # pyright: ignore[reportPrivateImportUsage]
+
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=1000,
+        special_tokens=["<unk>", "<|im_start|>", "<|im_end|>", "<pad>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(CORPUS, trainer)
+    fast = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, eos_token="<|im_end|>", pad_token="<pad>", unk_token="<unk>"
+    )
+    fast.chat_template = (
+        "{% for m in messages %}<|im_start|>{{ m.role }}\n{{ m.content }}<|im_end|>\n{% endfor %}"
+        "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+    )
+    return fast
+
+
+def text_model(root: Path) -> Path:
+    """A two-layer Qwen3 with a small BPE tokenizer and chat template."""
+    import torch
+    from transformers import Qwen3Config, Qwen3ForCausalLM  # pyright: ignore[reportPrivateImportUsage]
+
+    path = root / "text"
+    if _done(path):
+        return path
+    tokenizer = _tokenizer()
+    tokenizer.save_pretrained(path)  # type: ignore[attr-defined]
+    torch.manual_seed(SEED)
+    config = Qwen3Config(
+        vocab_size=len(tokenizer),  # type: ignore[arg-type]
+        hidden_size=128,
+        intermediate_size=256,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        head_dim=32,
+        eos_token_id=tokenizer.eos_token_id,  # type: ignore[attr-defined]
+        pad_token_id=tokenizer.pad_token_id,  # type: ignore[attr-defined]
+        tie_word_embeddings=False,
+    )
+    model = Qwen3ForCausalLM(config)
+    model.generation_config.eos_token_id = tokenizer.eos_token_id  # type: ignore[attr-defined]
+    model.save_pretrained(path)
+    return _mark_done(path)
+
+
+def vits_model(root: Path) -> Path:
+    """A small VITS voice over lowercase Latin and the CJK characters of the sample stories."""
+    import torch
+    from transformers import VitsConfig, VitsModel, VitsTokenizer  # pyright: ignore[reportPrivateImportUsage]
+
+    path = root / "vits"
+    if _done(path):
+        return path
+    path.mkdir(parents=True, exist_ok=True)
+    chars = sorted(set(" abcdefghijklmnopqrstuvwxyz.,!?'" + "".join(CORPUS)))
+    vocab = {char: i for i, char in enumerate(chars)}
+    vocab["<unk>"] = len(vocab)
+    (path / "vocab.json").write_text(json.dumps(vocab, ensure_ascii=False), encoding="utf-8")
+    tokenizer = VitsTokenizer(
+        str(path / "vocab.json"), add_blank=True, normalize=True, phonemize=False, is_uroman=False
+    )
+    tokenizer.save_pretrained(path)
+    torch.manual_seed(SEED)
+    config = VitsConfig(
+        vocab_size=len(tokenizer) + 2,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        ffn_dim=64,
+        flow_size=32,
+        spectrogram_bins=65,
+        upsample_initial_channel=32,
+        upsample_rates=[8, 8, 2, 2],
+        upsample_kernel_sizes=[16, 16, 4, 4],
+        prior_encoder_num_wavenet_layers=2,
+        posterior_encoder_num_wavenet_layers=2,
+        duration_predictor_filter_channels=32,
+        sampling_rate=16000,
+    )
+    VitsModel(config).save_pretrained(path)
+    return _mark_done(path)
+
+
+def flux_pipeline(root: Path) -> Path:
+    """A one-block FLUX pipeline with tiny CLIP and T5 encoders sharing the BPE tokenizer."""
+    import torch
+    from diffusers import (
+        AutoencoderKL,
+        FlowMatchEulerDiscreteScheduler,
+        FluxPipeline,
+        FluxTransformer2DModel,
+    )
+    from transformers import (  # pyright: ignore[reportPrivateImportUsage]
+        CLIPTextConfig,
+        CLIPTextModel,
+        T5Config,
+        T5EncoderModel,
+    )
+
+    path = root / "flux"
+    if _done(path):
+        return path
+    tokenizer = _tokenizer()
+    tokenizer.model_max_length = 77  # type: ignore[attr-defined]
+    vocab_size = len(tokenizer)  # type: ignore[arg-type]
+    torch.manual_seed(SEED)
+    pipe = FluxPipeline(
+        scheduler=FlowMatchEulerDiscreteScheduler(),
+        text_encoder=CLIPTextModel(
+            CLIPTextConfig(
+                vocab_size=vocab_size,
+                hidden_size=32,
+                intermediate_size=64,
+                num_hidden_layers=2,
+                num_attention_heads=4,
+                projection_dim=32,
+                bos_token_id=tokenizer.pad_token_id,  # type: ignore[attr-defined]
+                eos_token_id=tokenizer.eos_token_id,  # type: ignore[attr-defined]
+                pad_token_id=tokenizer.pad_token_id,  # type: ignore[attr-defined]
+            )
+        ),
+        tokenizer=tokenizer,
+        text_encoder_2=T5EncoderModel(
+            T5Config(vocab_size=vocab_size, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_heads=4)
+        ),
+        tokenizer_2=tokenizer,
+        vae=AutoencoderKL(
+            in_channels=3,
+            out_channels=3,
+            block_out_channels=(8, 16),
+            down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+            up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+            layers_per_block=1,
+            latent_channels=4,
+            norm_num_groups=4,
+            use_quant_conv=False,
+            use_post_quant_conv=False,
+            shift_factor=0.0609,
+            scaling_factor=1.5035,
+        ),
+        transformer=FluxTransformer2DModel(
+            patch_size=1,
+            in_channels=16,
+            num_layers=1,
+            num_single_layers=1,
+            attention_head_dim=16,
+            num_attention_heads=2,
+            joint_attention_dim=32,
+            pooled_projection_dim=32,
+            axes_dims_rope=[4, 4, 8],
+        ),
+    )
+    pipe.save_pretrained(path)
+    return _mark_done(path)
+
+
+class FakeChatServer:
+    """
+    A local OpenAI-compatible `/v1/chat/completions` server that replies with the last
+    message reversed.
+
+    Streaming requests get the reply as server-sent events, a few characters per event.
+    `failures` lists statuses to answer the first requests with, e.g. (429, 503) to
+    exercise retries. The server counts requests, TCP connections and the most requests
+    in flight at once, so a client's caching, keep-alive and concurrency limits can be
+    checked from the outside.
+
+        with FakeChatServer(latency=0.05) as server:
+            model = ChatCompletionsTextGeneration("stand-in", server.url)
+    """
+
+    def __init__(self, failures: Sequence[int] = (), latency: float = 0.0):
+        """
+        Args:
+            failures: Status codes for the first requests, in order, before any succeed.
+            latency: Seconds each request takes, so concurrent requests overlap.
+        """
+        self.failures = list(failures)
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _chat_handler(self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self) -> "FakeChatServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeChatServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def _chat_handler(fake: FakeChatServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so pooled connections are reused
+
+        def setup(self) -> None:
+            super().setup()
+            with fake._lock:
+                fake.connections += 1
+
+        def do_POST(self) -> None:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with fake._lock:
+                fake.requests += 1
+                fake._in_flight += 1
+                fake.max_in_flight = max(fake.max_in_flight, fake._in_flight)
+                status = fake.failures.pop(0) if fake.failures else 200
+            try:
+                time.sleep(fake.latency)
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"No route {self.path}"}})
+                elif status != 200:
+                    self._send_json(status, {"error": {"message": f"Injected {status}"}})
+                elif request.get("stream"):
+                    self._send_events(request["messages"][-1]["content"][::-1])
+                else:
+                    content = request["messages"][-1]["content"][::-1]
+                    self._send_json(200, {"choices": [{"message": {"content": content}}]})
+            finally:
+                with fake._lock:
+                    fake._in_flight -= 1
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_events(self, content: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")  # The stream ends when the socket does
+            self.end_headers()
+            for start in range(0, len(content), 4):
+                delta = {"choices": [{"delta": {"content": content[start : start + 4]}}]}
+                self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    return Handler
@@ -27,7 +27,7 @@ chunked_arg=$DEFAULT_CHUNKED # Boolean flag handling
 # and potentially call it as `gnu-getopt` or add it to PATH first.
 # Options ending with ':' expect an argument. 'chunked' is a flag.
 SHORT_OPTS="l:p:a:L:R:O:f:ch" # Added 'f' for output file name, 'a' for ref-audio, 'c' for chunked flag, 'h' for help
-LONG_OPTS="lrc-path:,ref-prompt:,ref-audio-path:,audio-length:,repo-id:,output-dir:,output-file-name:,chunked,help"
+LONG_OPTS="lrc-path:,ref-prompt:,ref-audio-path:,audio-length:,repo-id:,output-dir:,output-file-name:,chunked,no-chunked,help"
 
 # Check if getopt is available
 if ! command -v getopt &> /dev/null; then
@@ -82,10 +82,14 @@ while true; do
             ;;
         -c|--chunked)
             # If --chunked is present, set to true. If not, it remains default.
-            # If you want a --no-chunked option, that requires more logic.
             chunked_arg=true
             shift # Shift only 1 because it's a flag
             ;;
+        --no-chunked)
+            # Decode the whole song at once, e.g. when the GPU has room for it
+            chunked_arg=false
+            shift
+            ;;
         -h|--help)
             echo "Usage: $0 [options]"
             echo "Options:"
@@ -96,6 +100,7 @@ while true; do
             echo "  -R, --repo-id ID            Hugging Face model repo ID (Default: $DEFAULT_REPO_ID)"
             echo "  -O, --output-dir DIR        Output directory (Default: $DEFAULT_OUTPUT_DIR)"
             echo "  -c, --chunked               Enable chunked decoding (Default: $DEFAULT_CHUNKED)"
+            echo "      --no-chunked            Disable chunked decoding"
             echo "  -h, --help                  Show this help message"
             exit 0
             ;;
@@ -113,9 +118,8 @@ done
 # --- Set Working Directory and Environment ---
 # Get the directory containing this script
 SCRIPT_DIR=$(cd "$(dirname "$0")" && pwd)
-# Navigate to the expected DiffRhythm root relative to the script's parent
-# TARGET_DIR=$(cd "${SCRIPT_DIR}/../../vendor/DiffRhythm" && pwd)
-TARGET_DIR=$(cd "${SCRIPT_DIR}/../" && pwd)
+# The DiffRhythm checkout: DIFFRHYTHM_DIR if the caller sets it, else the vendored submodule
+TARGET_DIR=${DIFFRHYTHM_DIR:-"${SCRIPT_DIR}/../../vendor/DiffRhythm"}
 
 if [ ! -d "$TARGET_DIR" ]; then
     echo "Error: Target directory not found: $TARGET_DIR"
@@ -126,7 +130,7 @@ cd "$TARGET_DIR"
 echo "Changed working directory to: $PWD"
 
 export PYTHONPATH=$PYTHONPATH:$PWD
-export CUDA_VISIBLE_DEVICES=0 # Keep default or allow override via env var? Keeping default.
+export CUDA_VISIBLE_DEVICES=${CUDA_VISIBLE_DEVICES:-0} # GPU 0 unless the caller picks one, e.g. one GPU per worker
 export HF_HUB_ENABLE_HF_TRANSFER=1
 
 if [[ "$OSTYPE" =~ ^darwin ]]; then
@@ -205,7 +209,12 @@ printf "%b" "  Output File:    $OUTPUT_FILE_NAME\n"
 printf "%b" "  Chunked:        $CHUNKED\n"
 
 # --- Construct Python Command ---
-PYTHON_CMD=(uv run infer/infer.py) # Use array for safety with paths/args
+# DIFFRHYTHM_PYTHON runs the script with that interpreter instead of `uv run`
+if [ -n "$DIFFRHYTHM_PYTHON" ]; then
+    PYTHON_CMD=("$DIFFRHYTHM_PYTHON" infer/infer.py)
+else
+    PYTHON_CMD=(uv run infer/infer.py) # Use array for safety with paths/args
+fi
 
 if [ -n "$LRC_PATH" ]; then
     PYTHON_CMD+=(--lrc-path "$LRC_PATH")
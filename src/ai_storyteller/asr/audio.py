@@ -0,0 +1,72 @@
+import subprocess
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+ASR_SAMPLE_RATE = 16000
+
+
+def ffmpeg_exe() -> str:
+    """The ffmpeg binary bundled with imageio-ffmpeg, or the one on PATH."""
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return "ffmpeg"
+
+
+def read_audio_windows(
+    audio_path: str | Path,
+    sample_rate: int = ASR_SAMPLE_RATE,
+    window_seconds: float = 10.0,
+) -> Iterator["np.ndarray"]:
+    """
+    Decodes any audio file ffmpeg can read into mono float32 windows.
+
+    ffmpeg resamples and downmixes while it decodes and streams raw samples through a
+    pipe, so only one window is in memory at a time, however long the recording.
+
+    Args:
+        audio_path: The file to decode.
+        sample_rate: Output sample rate.
+        window_seconds: Length of each window; the last one may be shorter.
+
+    Yields:
+        1-D float32 arrays in [-1, 1].
+    """
+    import numpy as np
+
+    cmd = [
+        ffmpeg_exe(),
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        str(audio_path),
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "-",
+    ]
+    window_bytes = round(window_seconds * sample_rate) * 4
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert process.stdout is not None
+    try:
+        while data := process.stdout.read(window_bytes):
+            yield np.frombuffer(data[: len(data) // 4 * 4], dtype=np.float32)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()  # The consumer stopped early
+        _, stderr = process.communicate()
+    if process.returncode not in (0, -9):
+        raise RuntimeError(
+            f"ffmpeg could not decode {audio_path}: {stderr.decode(errors='replace').strip()}"
+        )
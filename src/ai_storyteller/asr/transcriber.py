@@ -0,0 +1,231 @@
+import multiprocessing as mp
+import os
+import re
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from ..interfaces.asr_interface import ASRModel
+from ..interfaces.text_generation_interface import ChatMessage
+from .audio import read_audio_windows
+from .vad import EnergyVAD, SpeechSegment
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Each process holds its own copy of the model, e.g. about 1 GiB for whisper-small in
+# float32, so the default pool stays small
+DEFAULT_PROCESSES = 2
+CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def join_texts(texts: Iterable[str]) -> str:
+    """Joins segment texts, with a space only between non-CJK neighbours."""
+    joined = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if joined and not (CJK_PATTERN.match(joined[-1]) or CJK_PATTERN.match(text[0])):
+            joined += " "
+        joined += text
+    return joined
+
+
+@dataclass
+class Hypothesis:
+    """Text for a stretch of speech; partial ones are revised until `is_final`."""
+
+    text: str
+    start: float  # Seconds from the start of the stream
+    end: float
+    is_final: bool
+
+
+@dataclass
+class Transcript:
+    """A whole recording's text, ready to use as a prompt for text generation."""
+
+    segments: list[Hypothesis] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return join_texts(segment.text for segment in self.segments)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def to_message(self, role: str = "user") -> ChatMessage:
+        return ChatMessage(role=role, content=self.text)
+
+
+class StreamingTranscriber:
+    """
+    Turns a live audio stream, e.g. from a microphone, into partial and final hypotheses.
+
+    The VAD cuts the stream at pauses. While someone is speaking, the segment so far is
+    re-transcribed every `partial_interval` seconds of new audio and yielded as a
+    partial hypothesis; when the speaker pauses the segment is transcribed once more
+    and yielded as final.
+    """
+
+    def __init__(
+        self,
+        model: ASRModel,
+        vad: EnergyVAD | None = None,
+        partial_interval: float | None = 1.0,
+    ):
+        """
+        Args:
+            model: The recognizer.
+            vad: Segmenter. Defaults to an `EnergyVAD` at the model's sample rate.
+            partial_interval: Seconds of new speech between partial hypotheses. None disables them.
+        """
+        self.model = model
+        self.vad = vad or EnergyVAD(sample_rate=model.sample_rate)
+        self.partial_interval = partial_interval
+        self._partial_at = 0  # Segment length when the last partial was made
+
+    def _hypothesis(self, segment: SpeechSegment, is_final: bool) -> Hypothesis:
+        text = self.model.transcribe_batch([segment.audio])[0]
+        sample_rate = self.model.sample_rate
+        return Hypothesis(
+            text, segment.start(sample_rate), segment.end(sample_rate), is_final
+        )
+
+    def feed(self, samples: "np.ndarray") -> Iterator[Hypothesis]:
+        """Feeds a chunk of mono float32 audio and yields the hypotheses it produced."""
+        for segment in self.vad.process(samples):
+            self._partial_at = 0
+            yield self._hypothesis(segment, is_final=True)
+        if self.partial_interval is None:
+            return
+        current = self.vad.current()
+        interval = self.partial_interval * self.model.sample_rate
+        if current is not None and len(current.audio) - self._partial_at >= interval:
+            self._partial_at = len(current.audio)
+            yield self._hypothesis(current, is_final=False)
+
+    def finish(self) -> Iterator[Hypothesis]:
+        """Ends the stream, yielding the final hypothesis for any speech still in progress."""
+        for segment in self.vad.flush():
+            yield self._hypothesis(segment, is_final=True)
+        self._partial_at = 0
+
+    def transcribe_stream(self, chunks: Iterable["np.ndarray"]) -> Iterator[Hypothesis]:
+        """Runs `feed` over every chunk, then `finish`."""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.finish()
+
+
+def transcribe_file(
+    model: ASRModel,
+    audio_path: str | Path,
+    batch_size: int = 8,
+    vad: EnergyVAD | None = None,
+) -> Transcript:
+    """
+    Transcribes a recording of any length in bounded memory.
+
+    Audio is decoded in windows, cut into speech segments by the VAD, and segments are
+    transcribed `batch_size` at a time, so at most one batch of segments is held.
+
+    Args:
+        model: The recognizer.
+        audio_path: Any file ffmpeg can decode.
+        batch_size: Segments transcribed together.
+        vad: Segmenter. Defaults to an `EnergyVAD` at the model's sample rate.
+
+    Returns:
+        The transcript, with one final hypothesis per speech segment.
+    """
+    vad = vad or EnergyVAD(sample_rate=model.sample_rate)
+    sample_rate = model.sample_rate
+    transcript = Transcript()
+    pending: list[SpeechSegment] = []
+
+    def flush() -> None:
+        texts = model.transcribe_batch([segment.audio for segment in pending])
+        for segment, text in zip(pending, texts):
+            transcript.segments.append(
+                Hypothesis(text, segment.start(sample_rate), segment.end(sample_rate), True)
+            )
+        pending.clear()
+
+    for window in read_audio_windows(audio_path, sample_rate=sample_rate):
+        for segment in vad.process(window):
+            pending.append(segment)
+            if len(pending) >= batch_size:
+                flush()
+    pending.extend(vad.flush())
+    if pending:
+        flush()
+    return transcript
+
+
+# Set in each pool process by `_init_worker`
+_worker_model: ASRModel | None = None
+
+
+def _init_worker(model_factory: Callable[[], ASRModel], num_threads: int) -> None:
+    global _worker_model
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _worker_model = model_factory()
+
+
+def _transcribe_in_worker(audio_path: str, batch_size: int) -> Transcript:
+    assert _worker_model is not None
+    return transcribe_file(_worker_model, audio_path, batch_size=batch_size)
+
+
+def transcribe_files(
+    audio_paths: Sequence[str | Path],
+    model_factory: Callable[[], ASRModel],
+    processes: int | None = None,
+    batch_size: int = 8,
+) -> list[Transcript | Exception]:
+    """
+    Transcribes many recordings in parallel, one model per process.
+
+    CPU cores are split evenly between processes, so the pool does not oversubscribe
+    threads. Each process loads its model once and keeps it for every file it handles.
+
+    Args:
+        audio_paths: Files to transcribe.
+        model_factory: Picklable callable that builds the model in each process,
+            e.g. `functools.partial(WhisperASR, "openai/whisper-small", language="zh")`.
+        processes: Pool size, capped at the number of files. Defaults to
+            `DEFAULT_PROCESSES`, or the CPU count if smaller.
+        batch_size: Segments transcribed together within a file.
+
+    Returns:
+        Per file, in order, its transcript or the error that stopped it.
+    """
+    if not audio_paths:
+        return []
+    cpus = os.cpu_count() or 1
+    processes = max(1, min(processes or min(DEFAULT_PROCESSES, cpus), len(audio_paths)))
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        # Spawn: the parent may already hold torch threads that must not be forked
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_factory, max(1, cpus // processes)),
+    ) as executor:
+        futures = [
+            executor.submit(_transcribe_in_worker, str(path), batch_size)
+            for path in audio_paths
+        ]
+        results: list[Transcript | Exception] = []
+        for path, future in zip(audio_paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Transcription of {path} failed: {e}")
+                results.append(e)
+    return results
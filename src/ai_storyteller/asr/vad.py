@@ -0,0 +1,173 @@
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .audio import ASR_SAMPLE_RATE
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+@dataclass
+class SpeechSegment:
+    audio: "np.ndarray"  # Mono float32
+    start_sample: int  # Offset within the stream
+
+    def start(self, sample_rate: int = ASR_SAMPLE_RATE) -> float:
+        return self.start_sample / sample_rate
+
+    def end(self, sample_rate: int = ASR_SAMPLE_RATE) -> float:
+        return (self.start_sample + len(self.audio)) / sample_rate
+
+
+class EnergyVAD:
+    """
+    Streaming voice activity detector that cuts audio into speech segments by frame energy.
+
+    Frames louder than the running noise floor by `threshold_db` count as speech. The
+    floor starts just below `min_level_db`, so speech at the very start is kept. A
+    segment ends after `min_silence` seconds of quiet, or at `max_segment` seconds so
+    it always fits one Whisper window. Feed audio in chunks of any size with
+    `process`; state carries over between calls, so memory is bounded by one segment.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = ASR_SAMPLE_RATE,
+        frame_ms: int = 30,
+        threshold_db: float = 12.0,
+        min_level_db: float = -50.0,
+        min_speech: float = 0.25,
+        min_silence: float = 0.6,
+        max_segment: float = 29.0,
+        padding: float = 0.2,
+    ):
+        """
+        Args:
+            sample_rate: Sample rate of the incoming audio.
+            frame_ms: Analysis frame length.
+            threshold_db: How far above the noise floor speech must be.
+            min_level_db: Quietest level (dBFS) ever treated as speech.
+            min_speech: Segments with less speech than this many seconds are dropped.
+            min_silence: Seconds of quiet that end a segment.
+            max_segment: Longest segment in seconds; longer speech is split.
+            padding: Seconds of audio kept before and after the speech.
+        """
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.threshold_db = threshold_db
+        self.min_level_db = min_level_db
+        self.min_speech_frames = max(1, round(min_speech * 1000 / frame_ms))
+        self.min_silence_frames = max(1, round(min_silence * 1000 / frame_ms))
+        self.max_segment_frames = round(max_segment * 1000 / frame_ms)
+        self.padding_frames = round(padding * 1000 / frame_ms)
+        self.reset()
+
+    def reset(self) -> None:
+        import numpy as np
+
+        self._pending = np.zeros(0, dtype=np.float32)  # Less than one frame
+        self._preroll: deque["np.ndarray"] = deque(maxlen=self.padding_frames or 1)
+        self._frames: list["np.ndarray"] = []  # Current segment
+        self._frame_index = 0
+        self._segment_start_frame = 0
+        self._speech_frames = 0
+        self._silent_run = 0
+        self._noise_db: float | None = None
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._frames)
+
+    def current(self) -> SpeechSegment | None:
+        """The segment being recorded so far, e.g. for a partial transcript."""
+        import numpy as np
+
+        if not self._frames:
+            return None
+        return SpeechSegment(
+            np.concatenate(self._frames), self._segment_start_frame * self.frame_length
+        )
+
+    def _is_speech(self, frame: "np.ndarray") -> bool:
+        import numpy as np
+
+        level_db = 10 * float(np.log10(np.mean(frame * frame) + 1e-10))
+        if self._noise_db is None:
+            # Push-to-talk audio starts with speech, so the floor cannot start at the
+            # first frame: start low enough that anything above `min_level_db` is speech
+            self._noise_db = self.min_level_db - self.threshold_db
+        is_speech = (
+            level_db > self._noise_db + self.threshold_db and level_db > self.min_level_db
+        )
+        # Frames too quiet to be clear speech also count as noise, so a steady hum above
+        # the starting floor raises it within a fraction of `min_speech`
+        if not is_speech or level_db < self.min_level_db + self.threshold_db:
+            # Follow the noise floor down quickly and up slowly
+            rate = 0.5 if level_db < self._noise_db else 0.1 if is_speech else 0.02
+            self._noise_db += rate * (level_db - self._noise_db)
+        return is_speech
+
+    def _emit(self) -> SpeechSegment | None:
+        import numpy as np
+
+        # Keep `padding` of the trailing silence
+        trailing = max(0, self._silent_run - self.padding_frames)
+        frames = self._frames[: len(self._frames) - trailing]
+        segment = None
+        if self._speech_frames >= self.min_speech_frames:
+            segment = SpeechSegment(
+                np.concatenate(frames), self._segment_start_frame * self.frame_length
+            )
+        self._frames = []
+        self._speech_frames = 0
+        self._silent_run = 0
+        return segment
+
+    def process(self, samples: "np.ndarray") -> Iterator[SpeechSegment]:
+        """
+        Feeds audio and yields every segment that ended within it.
+
+        Args:
+            samples: Mono float32 audio at `sample_rate`, any length.
+        """
+        import numpy as np
+
+        audio = np.concatenate([self._pending, np.asarray(samples, dtype=np.float32)])
+        n_frames = len(audio) // self.frame_length
+        self._pending = audio[n_frames * self.frame_length :]
+        for i in range(n_frames):
+            frame = audio[i * self.frame_length : (i + 1) * self.frame_length]
+            is_speech = self._is_speech(frame)
+            if self._frames:
+                self._frames.append(frame)
+                if is_speech:
+                    self._speech_frames += 1
+                    self._silent_run = 0
+                else:
+                    self._silent_run += 1
+                if self._silent_run >= self.min_silence_frames:
+                    if segment := self._emit():
+                        yield segment
+                elif len(self._frames) >= self.max_segment_frames:
+                    # Too long for one window: cut here; the next speech frame starts anew
+                    self._silent_run = 0
+                    if segment := self._emit():
+                        yield segment
+            elif is_speech:
+                preroll = list(self._preroll) if self.padding_frames else []
+                self._frames = [*preroll, frame]
+                self._segment_start_frame = self._frame_index - len(preroll)
+                self._speech_frames = 1
+                self._silent_run = 0
+                self._preroll.clear()
+            else:
+                self._preroll.append(frame)
+            self._frame_index += 1
+
+    def flush(self) -> Iterator[SpeechSegment]:
+        """Yields the segment in progress at the end of the stream, if any."""
+        if self._frames and (segment := self._emit()):
+            yield segment
+        self.reset()
@@ -0,0 +1,101 @@
+import threading
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any
+
+from .audio import ASR_SAMPLE_RATE
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_WHISPER_MODEL = "openai/whisper-small"
+
+
+class WhisperASR:
+    """
+    ASRModel running Whisper from transformers on CPU.
+
+    Clips are padded to Whisper's 30 s window and decoded together, so a batch of
+    short utterances costs little more than one. On CPU the linear layers are
+    quantized to int8 by default, which speeds up decoding roughly twofold.
+    """
+
+    sample_rate = ASR_SAMPLE_RATE
+
+    def __init__(
+        self,
+        model: str = DEFAULT_WHISPER_MODEL,
+        device: str = "cpu",
+        language: str | None = None,
+        int8: bool = True,
+        num_threads: int | None = None,
+        max_new_tokens: int = 440,
+    ):
+        """
+        Args:
+            model: Hugging Face id of a Whisper checkpoint.
+            device: Torch device to run on.
+            language: Spoken language, e.g. "zh" or "en". None lets Whisper detect it.
+            int8: Quantize linear layers to int8 (CPU only).
+            num_threads: Torch CPU threads. None keeps torch's default.
+            max_new_tokens: Most tokens decoded per clip.
+        """
+        self.model = model
+        self.device = device
+        self.language = language
+        self.int8 = int8 and device == "cpu"
+        self.num_threads = num_threads
+        self.max_new_tokens = max_new_tokens
+        self._model: Any = None
+        self._processor: Any = None
+        self._load_lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._model is not None:
+                return
+            import torch
+            from transformers import (
+                WhisperForConditionalGeneration,  # pyright: ignore[reportPrivateImportUsage]
+                WhisperProcessor,  # pyright: ignore[reportPrivateImportUsage]
+            )
+
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            print(f"Loading {self.model} on {self.device}{' (int8)' if self.int8 else ''}...")
+            processor = WhisperProcessor.from_pretrained(self.model)
+            model = WhisperForConditionalGeneration.from_pretrained(self.model).to(self.device)
+            if self.int8:
+                model = torch.ao.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            model.eval()
+            self._processor = processor
+            self._model = model
+
+    def transcribe_batch(self, audios: Sequence["np.ndarray"]) -> list[str]:
+        """
+        Transcribes up to 30 s clips in one batched decode.
+
+        Args:
+            audios: Mono float32 clips at 16 kHz.
+
+        Returns:
+            The text of each clip.
+        """
+        import torch
+
+        self.load()
+        if not audios:
+            return []
+        features = self._processor(
+            list(audios), sampling_rate=self.sample_rate, return_tensors="pt"
+        ).input_features.to(self.device)
+        kwargs: dict[str, Any] = {"task": "transcribe", "max_new_tokens": self.max_new_tokens}
+        if self.language:
+            kwargs["language"] = self.language
+        with torch.no_grad():
+            token_ids = self._model.generate(features, **kwargs)
+        return [
+            text.strip()
+            for text in self._processor.batch_decode(token_ids, skip_special_tokens=True)
+        ]
@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    project_base_dir: Path = Path(__file__).parent.parent
+    base_dir: Path = project_base_dir.parent.parent
+    data_dir: Path = base_dir / "data"
+    cache_dir: Path = data_dir / "cache"
+    music_cache_max_bytes: int = 10 * 1024**3
+    # Memory music generation is planned against; None uses the device's total memory
+    music_memory_budget_bytes: int | None = None
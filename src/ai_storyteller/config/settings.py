@@ -1,13 +1,31 @@
-from pathlib import Path
+from functools import cache
+from typing import TYPE_CHECKING, Any
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
+if TYPE_CHECKING:
+    from .schema import Settings
 
 
-class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
-    project_base_dir: Path = Path(__file__).parent.parent
-    base_dir: Path = project_base_dir.parent.parent
-    data_dir: Path = base_dir / "data"
+@cache
+def get_settings() -> "Settings":
+    """
+    Returns the project settings, reading the environment and `.env` once, on first use.
 
+    pydantic_settings is imported here rather than at module import, so importing the
+    package stays cheap for commands that never touch a setting.
+    """
+    from .schema import Settings
 
-settings = Settings()
+    return Settings()
+
+
+class _LazySettings:
+    """Stands in for the `Settings` instance and builds it on first attribute access."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+
+settings: "Settings" = _LazySettings()  # type: ignore[assignment]
@@ -0,0 +1,299 @@
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+
+from ..utils.telemetry import telemetry
+
+DEFAULT_FLUX_MODEL = "black-forest-labs/FLUX.1-schnell"
+
+Offload = Literal["none", "model", "sequential"]
+
+
+@dataclass
+class _Request:
+    prompt: str
+    output_path: Path
+    future: Future[Path | None] = field(default_factory=Future)
+
+
+class FluxImageGeneration:
+    """
+    ImageGenerationModel running a FLUX pipeline from diffusers, loaded once and kept resident.
+
+    Concurrent `generate_image` calls, such as the page images of one story, are
+    collected for `batch_wait` seconds and rendered in one batched denoising pass of up
+    to `max_batch_size` images. Each image gets its own seeded generator, so a page
+    looks the same whether it was rendered alone or in a batch.
+
+    Memory: the transformer can be loaded from a GGUF file (e.g. a Q4 quant from
+    city96/FLUX.1-schnell-gguf), and `offload="sequential"` streams weights to the GPU
+    layer by layer, trading speed for a much smaller footprint. `"model"` offloads
+    whole components, which is faster when they fit one at a time.
+
+    Prompt embeddings are cached. FLUX takes a pooled CLIP embedding and a T5 sequence;
+    the pooled embedding is computed from `style` alone, so a shared style prompt is
+    encoded once for every page, while each page's full prompt goes through T5.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_FLUX_MODEL,
+        gguf_file: str | None = None,
+        offload: Offload = "model",
+        style: str | None = None,
+        device: str | None = None,
+        num_inference_steps: int = 4,
+        guidance_scale: float = 0.0,
+        height: int = 768,
+        width: int = 768,
+        max_sequence_length: int = 256,
+        max_batch_size: int = 4,
+        batch_wait: float = 0.5,
+        seed: int = 0,
+        max_cached_prompts: int = 32,
+    ):
+        """
+        Args:
+            model: Diffusers repository of the FLUX pipeline.
+            gguf_file: Path or URL of GGUF transformer weights. None loads the repository's weights.
+            offload: "sequential" or "model" CPU offload (CUDA only), or "none".
+            style: Style prompt shared by every image, used for the pooled CLIP embedding.
+                None uses each image's own prompt.
+            device: "cuda" or "cpu". If None, CUDA is used when available.
+            num_inference_steps: Denoising steps; 4 suits FLUX.1-schnell.
+            guidance_scale: 0 for FLUX.1-schnell, about 3.5 for FLUX.1-dev.
+            height: Image height in pixels.
+            width: Image width in pixels.
+            max_sequence_length: T5 tokens per prompt.
+            max_batch_size: Most images rendered together.
+            batch_wait: Seconds to wait for more requests before starting a batch.
+            seed: Base seed; each image's seed also depends on its prompt.
+            max_cached_prompts: T5 and pooled CLIP embeddings kept in memory, each.
+        """
+        self.model = model
+        self.gguf_file = gguf_file
+        self.offload = offload
+        self.style = style
+        self.device = device
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.height = height
+        self.width = width
+        self.max_sequence_length = max_sequence_length
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+        self.seed = seed
+        self.max_cached_prompts = max_cached_prompts
+
+        self._pipe: Any = None
+        self._execution_device: Any = None
+        self._load_lock = threading.Lock()
+        self._queue: queue.Queue[_Request | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._t5_cache: OrderedDict[str, Any] = OrderedDict()
+        self._pooled_cache: OrderedDict[str, Any] = OrderedDict()
+
+    def load(self) -> None:
+        """Loads the pipeline and starts the batching thread. Called on first use."""
+        with self._load_lock:
+            if self._pipe is not None:
+                return
+            import torch
+            from diffusers import FluxPipeline, FluxTransformer2DModel
+
+            device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+            dtype = torch.bfloat16
+            kwargs: dict[str, Any] = {"torch_dtype": dtype}
+            print(f"Loading {self.model} on {device} (offload: {self.offload})...")
+            with telemetry.span(
+                "image.load", model=self.model, device=device, gguf=bool(self.gguf_file)
+            ):
+                if self.gguf_file:
+                    from diffusers import GGUFQuantizationConfig
+
+                    kwargs["transformer"] = FluxTransformer2DModel.from_single_file(
+                        self.gguf_file,
+                        quantization_config=GGUFQuantizationConfig(compute_dtype=dtype),
+                        config=self.model,
+                        subfolder="transformer",
+                        torch_dtype=dtype,
+                    )
+                pipe = FluxPipeline.from_pretrained(self.model, **kwargs)
+                if device.startswith("cuda") and self.offload == "sequential":
+                    pipe.enable_sequential_cpu_offload()
+                elif device.startswith("cuda") and self.offload == "model":
+                    pipe.enable_model_cpu_offload()
+                else:
+                    pipe.to(device)
+            pipe.set_progress_bar_config(disable=True)
+            self._execution_device = torch.device(device)
+            self._pipe = pipe
+            self._thread = threading.Thread(
+                target=self._serve, name="flux-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stops the batching thread once queued requests are done and frees the pipeline.
+        A later request loads it again.
+        """
+        with self._load_lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+            self._pipe = None
+            self._t5_cache.clear()
+            self._pooled_cache.clear()
+
+    # --- Prompt embeddings ---
+
+    def _pooled_embeds(self, prompt: str) -> Any:
+        if prompt in self._pooled_cache:
+            self._pooled_cache.move_to_end(prompt)
+            return self._pooled_cache[prompt]
+        # Private in diffusers, but lets CLIP and T5 be cached separately
+        embeds = self._pipe._get_clip_prompt_embeds(prompt, device=self._execution_device)
+        self._pooled_cache[prompt] = embeds
+        while len(self._pooled_cache) > self.max_cached_prompts:
+            self._pooled_cache.popitem(last=False)
+        return embeds
+
+    def _t5_embeds(self, prompt: str) -> Any:
+        if prompt in self._t5_cache:
+            telemetry.count("image_prompt_cache_hits")
+            self._t5_cache.move_to_end(prompt)
+            return self._t5_cache[prompt]
+        embeds = self._pipe._get_t5_prompt_embeds(
+            prompt,
+            max_sequence_length=self.max_sequence_length,
+            device=self._execution_device,
+        )
+        self._t5_cache[prompt] = embeds
+        while len(self._t5_cache) > self.max_cached_prompts:
+            self._t5_cache.popitem(last=False)
+        return embeds
+
+    def encode_prompts(self, prompts: Sequence[str]) -> tuple[Any, Any]:
+        """Returns batched T5 and pooled CLIP embeddings for the prompts, from the cache where possible."""
+        import torch
+
+        with telemetry.span("image.encode", batch=len(prompts)), torch.no_grad():
+            t5 = torch.cat([self._t5_embeds(prompt) for prompt in prompts])
+            pooled = torch.cat(
+                [self._pooled_embeds(self.style or prompt) for prompt in prompts]
+            )
+        return t5, pooled
+
+    # --- Rendering ---
+
+    def _generator(self, prompt: str) -> Any:
+        import torch
+
+        # Seeded per prompt, so batching does not change an image
+        return torch.Generator("cpu").manual_seed(
+            self.seed + zlib.crc32(prompt.encode("utf-8"))
+        )
+
+    def render(self, prompts: Sequence[str]) -> list[Any]:
+        """Renders the prompts in one denoising pass. Returns PIL images."""
+        import torch
+
+        self.load()
+        prompt_embeds, pooled_prompt_embeds = self.encode_prompts(prompts)
+        with (
+            telemetry.span(
+                "image.render", batch=len(prompts), steps=self.num_inference_steps
+            ),
+            torch.no_grad(),
+        ):
+            return self._pipe(
+                prompt_embeds=prompt_embeds,
+                pooled_prompt_embeds=pooled_prompt_embeds,
+                num_inference_steps=self.num_inference_steps,
+                guidance_scale=self.guidance_scale,
+                height=self.height,
+                width=self.width,
+                max_sequence_length=self.max_sequence_length,
+                generator=[self._generator(prompt) for prompt in prompts],
+            ).images
+
+    def _serve(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(request)
+
+            print(f"Rendering {len(batch)} image(s)...")
+            try:
+                images = self.render([request.prompt for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, image in zip(batch, images):
+                try:
+                    with telemetry.span("image.save"):
+                        request.output_path.parent.mkdir(parents=True, exist_ok=True)
+                        image.save(request.output_path)
+                    request.future.set_result(request.output_path)
+                except Exception as e:
+                    request.future.set_exception(e)
+
+    def generate_image(self, prompt: str, output_path: str | Path) -> Path | None:
+        """
+        Renders one image, batched with any other images requested at the same time.
+
+        Args:
+            prompt: What to draw.
+            output_path: Where to save the PNG.
+
+        Returns:
+            The saved image path, or None if rendering failed.
+        """
+        self.load()
+        request = _Request(prompt, Path(output_path))
+        self._queue.put(request)
+        try:
+            return request.future.result()
+        except Exception as e:
+            print(f"Image generation failed: {e}")
+            return None
+
+    def generate_images(
+        self, prompts: Sequence[str], output_paths: Sequence[str | Path]
+    ) -> list[Path | None]:
+        """Renders many images, `max_batch_size` at a time. Returns a path or None per prompt."""
+        self.load()
+        requests = [
+            _Request(prompt, Path(path)) for prompt, path in zip(prompts, output_paths)
+        ]
+        for request in requests:
+            self._queue.put(request)
+        results: list[Path | None] = []
+        for request in requests:
+            try:
+                results.append(request.future.result())
+            except Exception as e:
+                print(f"Image generation failed: {e}")
+                results.append(None)
+        return results
@@ -0,0 +1,13 @@
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class ASRModel(Protocol):
+    sample_rate: int
+
+    def transcribe_batch(self, audios: Sequence["np.ndarray"]) -> list[str]:
+        """Transcribes clips of mono float32 audio at `sample_rate`, each at most 30 seconds. Returns one text per clip."""
+        ...
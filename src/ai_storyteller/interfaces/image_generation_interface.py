@@ -0,0 +1,8 @@
+from pathlib import Path
+from typing import Protocol
+
+
+class ImageGenerationModel(Protocol):
+    def generate_image(self, prompt: str, output_path: str | Path) -> Path | None:
+        """Generates an image from the prompt and saves it to output_path. Returns the path to the image or None if generation fails."""
+        ...
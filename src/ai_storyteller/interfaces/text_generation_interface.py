@@ -1,4 +1,4 @@
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
 from dataclasses import dataclass
 from typing import Protocol
 
@@ -12,4 +12,10 @@ class ChatMessage:
 class TextGenerationModel(Protocol):
     def generate_text(self, prompt: str | Sequence[ChatMessage]) -> str:
         """Generates text based on the provided prompt. Returns the generated text."""
-        ...
\ No newline at end of file
+        ...
+
+
+class StreamingTextGenerationModel(TextGenerationModel, Protocol):
+    def stream_text(self, prompt: str | Sequence[ChatMessage]) -> Iterator[str]:
+        """Yields the generated text in pieces as it is produced."""
+        ...
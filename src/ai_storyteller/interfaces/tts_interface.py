@@ -0,0 +1,15 @@
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class TTSModel(Protocol):
+    sample_rate: int
+
+    def synthesize_batch(
+        self, texts: Sequence[str], voice: str | None = None
+    ) -> list["np.ndarray"]:
+        """Synthesizes speech for each text. Returns one mono float32 waveform per text, at `sample_rate`."""
+        ...
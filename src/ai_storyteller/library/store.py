@@ -0,0 +1,557 @@
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Any
+
+from ..config.settings import settings
+from ..music_generation.cache import hash_file
+from ..pipeline.manifest import fingerprint
+from ..pipeline.story import STORY_FILE_NAME, Story, StoryPage, list_story_dirs, load_story
+
+LIBRARY_FILE_NAME = "stories.db"
+SNIPPET_TOKENS = 12
+# Trigram full-text search needs queries of at least three characters; shorter
+# ones, such as two-character Chinese words, fall back to a LIKE scan
+MIN_FTS_QUERY_CHARS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    page_keys TEXT NOT NULL,  -- JSON list, in page order
+    source TEXT,  -- Story directory it was imported from
+    fingerprint TEXT NOT NULL,
+    imported_at REAL NOT NULL,
+    extra TEXT  -- JSON object of story.json fields without a column, e.g. style_guide
+);
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    path TEXT NOT NULL  -- Relative to the library directory if copied, else absolute
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    img TEXT,
+    asset_id INTEGER REFERENCES assets(id),
+    extra TEXT,  -- JSON object of page fields without a column, e.g. image_prompt
+    UNIQUE (story_id, position)
+);
+CREATE INDEX IF NOT EXISTS pages_by_key ON pages (story_id, key);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(
+    title, content='stories', content_rowid='id', tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    text, content='pages', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS stories_ai AFTER INSERT ON stories BEGIN
+    INSERT INTO stories_fts (rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS stories_ad AFTER DELETE ON stories BEGIN
+    INSERT INTO stories_fts (stories_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_ai AFTER INSERT ON pages BEGIN
+    INSERT INTO pages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_ad AFTER DELETE ON pages BEGIN
+    INSERT INTO pages_fts (pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _dump_extra(extra: dict[str, Any]) -> str | None:
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+def _page(key: str, text: str, img: str | None, extra: str | None) -> StoryPage:
+    return StoryPage(key, text, img, json.loads(extra) if extra else {})
+
+
+@dataclass
+class StorySummary:
+    """A library entry as listed, without its pages."""
+
+    name: str
+    title: str
+    page_count: int
+
+
+@dataclass
+class SearchHit:
+    """A story whose title, or one of whose pages, matches a search."""
+
+    name: str
+    title: str
+    page_key: str | None  # None for a title match
+    snippet: str  # Matched text with the match in [brackets]
+    score: float  # Lower is better, comparable within title or page hits
+
+
+class LibraryStory(Story):
+    """
+    A `Story` read from a `StoryLibrary`, loading page text only when asked for it.
+
+    `page(key)` reads a single page and `page_keys` none at all, so a pipeline stage
+    that renders one page image never touches the others. `pages` reads every page in
+    one query, and `text` has SQLite join them.
+    """
+
+    def __init__(
+        self,
+        library: "StoryLibrary",
+        story_id: int,
+        name: str,
+        title: str,
+        page_keys: list[str],
+        path: Path | None,
+        extra: dict[str, Any] | None = None,
+    ):
+        self.name = name
+        self.title = title
+        self.path = path
+        self.extra = extra or {}
+        self._library = library
+        self._story_id = story_id
+        self._page_keys = page_keys
+
+    def __repr__(self) -> str:
+        return f"LibraryStory({self.name!r}, {self.title!r}, {len(self._page_keys)} pages)"
+
+    @cached_property
+    def pages(self) -> list[StoryPage]:  # type: ignore[override]
+        return self._library._read_pages(self._story_id)
+
+    @property
+    def page_keys(self) -> list[str]:
+        return list(self._page_keys)
+
+    def page(self, key: str) -> StoryPage:
+        if "pages" in self.__dict__:
+            return super().page(key)
+        return self._library._read_page(self._story_id, key)
+
+    @cached_property
+    def text(self) -> str:  # type: ignore[override]
+        return self._library._read_text(self._story_id)
+
+    def image_path(self, key: str) -> Path | None:
+        return self._library.asset_path(self.name, key)
+
+
+class StoryLibrary:
+    """
+    Story library in one SQLite file, with full-text search over titles and pages.
+
+    Stories are imported from the `data/stories/<name>/story.json` layout (and can be
+    exported back to it). Listing reads one row per story and searching uses FTS5
+    trigram indexes, which match inside words and so also work for Chinese text
+    without a word segmenter. Stories come back as `LibraryStory`, whose pages load
+    on demand.
+
+    Page images are copied into a content-addressed `assets/` directory next to the
+    database (or, with `copy_assets=False`, referenced where they are) and read with
+    `asset`, which memory-maps the file instead of copying it into memory.
+
+    Each thread gets its own connection; the database runs in WAL mode, so readers
+    never wait for an import.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        """
+        Args:
+            path: The database file. Defaults to `settings.data_dir / "library" / "stories.db"`.
+        """
+        self.path = (
+            Path(path) if path else settings.data_dir / "library" / LIBRARY_FILE_NAME
+        ).resolve()
+        self.assets_dir = self.path.parent / "assets"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            for table in ("stories", "pages"):  # Libraries created before the extra columns
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if "extra" not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN extra TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Closes every thread's connection."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def __enter__(self) -> "StoryLibrary":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    # --- Import and export ---
+
+    def _store_asset(
+        self, conn: sqlite3.Connection, path: Path, copy_assets: bool
+    ) -> int:
+        digest = hash_file(path)
+        row = conn.execute("SELECT id FROM assets WHERE sha256 = ?", (digest,)).fetchone()
+        if row is not None:
+            return row[0]
+        if copy_assets:
+            target = self.assets_dir / digest[:2] / f"{digest}{path.suffix}"
+            stored = target.relative_to(self.path.parent)
+            if not target.is_file():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = target.with_suffix(f"{target.suffix}.tmp")
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, target)
+        else:
+            stored = path.resolve()
+        return conn.execute(
+            "INSERT INTO assets (sha256, size, path) VALUES (?, ?, ?)",
+            (digest, path.stat().st_size, str(stored)),
+        ).lastrowid  # type: ignore[return-value]
+
+    def _fingerprint(self, story: Story) -> str:
+        images = []
+        for page in story.pages:
+            if image_path := story.image_path(page.key):
+                stat = image_path.stat()
+                images.append((image_path.name, stat.st_size, stat.st_mtime_ns))
+        return fingerprint(
+            story.title,
+            story.extra,
+            [(page.key, page.text, page.img, page.extra) for page in story.pages],
+            images,
+        )
+
+    def _delete(self, conn: sqlite3.Connection, story_id: int) -> None:
+        conn.execute("DELETE FROM pages WHERE story_id = ?", (story_id,))
+        conn.execute("DELETE FROM stories WHERE id = ?", (story_id,))
+
+    def add_stories(self, stories: Iterable[Story], copy_assets: bool = True) -> int:
+        """
+        Adds or updates stories in one transaction. Stories whose content is unchanged are skipped.
+
+        Args:
+            stories: The stories, e.g. from `load_story`. Images are read from
+                `<story.path>/img` (see `Story.image_path`).
+            copy_assets: Copy page images into the library. If False, store their paths.
+
+        Returns:
+            How many stories were added or updated.
+        """
+        conn = self._connection()
+        changed = 0
+        with conn:
+            for story in stories:
+                story_fingerprint = self._fingerprint(story)
+                row = conn.execute(
+                    "SELECT id, fingerprint FROM stories WHERE name = ?", (story.name,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] == story_fingerprint:
+                        continue
+                    self._delete(conn, row[0])
+                story_id = conn.execute(
+                    "INSERT INTO stories"
+                    " (name, title, page_keys, source, fingerprint, imported_at, extra)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        story.name,
+                        story.title,
+                        json.dumps(story.page_keys, ensure_ascii=False),
+                        str(story.path) if story.path else None,
+                        story_fingerprint,
+                        time.time(),
+                        _dump_extra(story.extra),
+                    ),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO pages (story_id, position, key, text, img, asset_id, extra)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            story_id,
+                            position,
+                            page.key,
+                            page.text,
+                            page.img,
+                            self._store_asset(conn, image_path, copy_assets)
+                            if (image_path := story.image_path(page.key))
+                            else None,
+                            _dump_extra(page.extra),
+                        )
+                        for position, page in enumerate(story.pages)
+                    ],
+                )
+                changed += 1
+        return changed
+
+    def import_dir(self, stories_dir: str | Path | None = None, copy_assets: bool = True) -> int:
+        """
+        Imports every story directory under `stories_dir` (default data/stories).
+
+        Returns:
+            How many stories were added or updated.
+        """
+        return self.add_stories(
+            (load_story(path) for path in list_story_dirs(stories_dir)), copy_assets
+        )
+
+    def export_story(self, name: str, stories_dir: str | Path) -> Path:
+        """
+        Writes a story back out as `<stories_dir>/<name>/story.json` with its images in `img/`.
+
+        Returns:
+            The story directory.
+        """
+        story = self.story(name)
+        story_dir = Path(stories_dir) / name
+        (story_dir / "img").mkdir(parents=True, exist_ok=True)
+        pages = {}
+        for page in story.pages:
+            pages[page.key] = {"text": page.text}
+            if page.img:
+                pages[page.key]["img"] = page.img
+            pages[page.key].update(page.extra)
+            if asset_path := self.asset_path(name, page.key):
+                img = page.img or f"{page.key}{asset_path.suffix}"  # See Story.image_path
+                shutil.copyfile(asset_path, story_dir / "img" / img)
+        data = {"title": story.title, **story.extra, "pages": pages}
+        with open(story_dir / STORY_FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        return story_dir
+
+    def export_all(self, stories_dir: str | Path) -> list[Path]:
+        """Exports every story. Returns the story directories."""
+        return [self.export_story(name, stories_dir) for name in self.names()]
+
+    def remove(self, name: str) -> bool:
+        """Removes a story. Its assets stay, as other stories may share them."""
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT id FROM stories WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return False
+            self._delete(conn, row[0])
+        return True
+
+    # --- Reading ---
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM stories").fetchone()[0]
+
+    def __contains__(self, name: object) -> bool:
+        return (
+            self._connection()
+            .execute("SELECT 1 FROM stories WHERE name = ?", (name,))
+            .fetchone()
+            is not None
+        )
+
+    def names(self) -> list[str]:
+        return [
+            name
+            for (name,) in self._connection().execute("SELECT name FROM stories ORDER BY name")
+        ]
+
+    def list_stories(self, limit: int | None = None, offset: int = 0) -> list[StorySummary]:
+        """Lists stories by name, without reading any page."""
+        rows = self._connection().execute(
+            "SELECT name, title, json_array_length(page_keys) FROM stories"
+            " ORDER BY name LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset),
+        )
+        return [StorySummary(*row) for row in rows]
+
+    def story(self, name: str) -> LibraryStory:
+        """
+        Returns a story with its pages unread. Raises KeyError if there is none by that name.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT id, title, page_keys, source, extra FROM stories WHERE name = ?", (name,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(name)
+        story_id, title, page_keys, source, extra = row
+        return LibraryStory(
+            self,
+            story_id,
+            name,
+            title,
+            json.loads(page_keys),
+            Path(source) if source else None,
+            json.loads(extra) if extra else {},
+        )
+
+    def stories(self, names: Iterable[str] | None = None) -> list[LibraryStory]:
+        """Returns the named stories, or all of them, with their pages unread."""
+        return [self.story(name) for name in (self.names() if names is None else names)]
+
+    def _read_pages(self, story_id: int) -> list[StoryPage]:
+        rows = self._connection().execute(
+            "SELECT key, text, img, extra FROM pages WHERE story_id = ? ORDER BY position",
+            (story_id,),
+        )
+        return [_page(*row) for row in rows]
+
+    def _read_page(self, story_id: int, key: str) -> StoryPage:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT key, text, img, extra FROM pages WHERE story_id = ? AND key = ?",
+                (story_id, key),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(key)
+        return _page(*row)
+
+    def _read_text(self, story_id: int) -> str:
+        # Same as Story.text: non-empty page texts, stripped, in page order
+        row = (
+            self._connection()
+            .execute(
+                "SELECT group_concat(text, char(10)) FROM ("
+                " SELECT trim(text, ' ' || char(9, 10, 13)) AS text FROM pages"
+                " WHERE story_id = ? ORDER BY position"
+                ") WHERE text != ''",
+                (story_id,),
+            )
+            .fetchone()
+        )
+        return row[0] or ""
+
+    def asset_path(self, name: str, page_key: str) -> Path | None:
+        """The stored image file of a page, or None if it has none."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT assets.path FROM pages"
+                " JOIN stories ON stories.id = pages.story_id"
+                " JOIN assets ON assets.id = pages.asset_id"
+                " WHERE stories.name = ? AND pages.key = ?",
+                (name, page_key),
+            )
+            .fetchone()
+        )
+        return self.path.parent / row[0] if row else None  # Absolute paths stay as they are
+
+    def asset(self, name: str, page_key: str) -> mmap.mmap | None:
+        """
+        Memory-maps a page's image read-only, or returns None if the page has none.
+
+        The bytes are paged in by the OS as they are read and shared between processes
+        reading the same asset; pass the map to e.g. `PIL.Image.open(io.BytesIO(...))`
+        or slice it directly. Close it when done.
+        """
+        path = self.asset_path(name, page_key)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # --- Search ---
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        """
+        Finds stories whose title or pages contain `query`, case-insensitively.
+
+        Args:
+            query: Text to look for, matched as a phrase anywhere in a word.
+            limit: Most title hits and most page hits returned.
+
+        Returns:
+            Title hits, then page hits, each best match first.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if len(query) < MIN_FTS_QUERY_CHARS:
+            return self._search_like(query, limit)
+        phrase = '"' + query.replace('"', '""') + '"'
+        conn = self._connection()
+        titles = conn.execute(
+            "SELECT s.name, s.title, NULL,"
+            " highlight(stories_fts, 0, '[', ']'), bm25(stories_fts) FROM stories_fts"
+            " JOIN stories s ON s.id = stories_fts.rowid"
+            " WHERE stories_fts MATCH ? ORDER BY rank LIMIT ?",
+            (phrase, limit),
+        ).fetchall()
+        pages = conn.execute(
+            "SELECT s.name, s.title, p.key,"
+            f" snippet(pages_fts, 0, '[', ']', '…', {SNIPPET_TOKENS}), bm25(pages_fts)"
+            " FROM pages_fts"
+            " JOIN pages p ON p.id = pages_fts.rowid"
+            " JOIN stories s ON s.id = p.story_id"
+            " WHERE pages_fts MATCH ? ORDER BY rank LIMIT ?",
+            (phrase, limit),
+        ).fetchall()
+        return [SearchHit(*row) for row in titles + pages]
+
+    def _search_like(self, query: str, limit: int) -> list[SearchHit]:
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conn = self._connection()
+        titles = conn.execute(
+            "SELECT name, title FROM stories WHERE title LIKE ? ESCAPE '\\' ORDER BY name LIMIT ?",
+            (pattern, limit),
+        ).fetchall()
+        pages = conn.execute(
+            "SELECT s.name, s.title, p.key, p.text FROM pages p"
+            " JOIN stories s ON s.id = p.story_id"
+            " WHERE p.text LIKE ? ESCAPE '\\' ORDER BY s.name, p.position LIMIT ?",
+            (pattern, limit),
+        ).fetchall()
+        return [
+            SearchHit(name, title, None, _highlight(title, query), 0.0) for name, title in titles
+        ] + [
+            SearchHit(name, title, key, _highlight(text, query), 0.0)
+            for name, title, key, text in pages
+        ]
+
+
+def _highlight(text: str, query: str, context: int = 2 * SNIPPET_TOKENS) -> str:
+    """Brackets the first match of `query` in `text`, keeping `context` characters either side."""
+    start = text.lower().find(query.lower())
+    if start < 0:
+        return text[: 2 * context]
+    end = start + len(query)
+    prefix = "…" if start > context else ""
+    suffix = "…" if end + context < len(text) else ""
+    return (
+        f"{prefix}{text[max(0, start - context) : start]}[{text[start:end]}]"
+        f"{text[end : end + context]}{suffix}"
+    )
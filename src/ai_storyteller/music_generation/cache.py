@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from ..config.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only threads in this process are serialized
+    fcntl = None  # type: ignore[assignment]
+
+INDEX_FILE_NAME = "index.json"
+LOCK_FILE_NAME = "index.lock"
+
+
+def hash_file(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MusicCache:
+    """
+    Content-addressed cache of generated songs with size-bounded LRU eviction.
+
+    Songs are stored as `<key>.wav` under `cache_dir`, and `index.json` records each
+    entry's size and last access time. Keys are hashes of everything that determines
+    the output, see `make_key`.
+
+    Several processes may share one cache directory (the worker pool, the UI, the CLI):
+    every change re-reads the index under an exclusive lock on `index.lock`, so entries
+    written by others are kept. Hits are copied out, so a later eviction never deletes
+    a file a caller is still using.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path | None = None,
+        max_size_bytes: int | None = None,
+    ):
+        """
+        Args:
+            cache_dir: Where to store cached songs. Defaults to `settings.cache_dir / "music"`.
+            max_size_bytes: Evict least recently used songs beyond this total size.
+                Defaults to `settings.music_cache_max_bytes`.
+        """
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir else settings.cache_dir / "music"
+        ).resolve()
+        self.max_size_bytes = (
+            max_size_bytes
+            if max_size_bytes is not None
+            else settings.music_cache_max_bytes
+        )
+        self.index_path = self.cache_dir / INDEX_FILE_NAME
+        self.lock_path = self.cache_dir / LOCK_FILE_NAME
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index = self._load_index()
+
+    @staticmethod
+    def make_key(
+        lrc: str,
+        ref_prompt: str | None,
+        ref_audio_path: str | Path | None,
+        audio_length: int,
+        chunked: bool,
+        repo_id: str,
+        seed: int | None,
+    ) -> str:
+        """
+        Builds the cache key for one generation request.
+
+        Args:
+            lrc: The LRC lyrics content (not the path, so moved files still hit).
+            ref_prompt: Reference text prompt.
+            ref_audio_path: Reference audio file; its bytes are hashed.
+            audio_length: Audio length in seconds.
+            chunked: Whether chunked decoding is used.
+            repo_id: Model repository ID.
+            seed: Random seed. None means unseeded, which still caches the first result.
+
+        Returns:
+            A hex digest identifying the request.
+        """
+        fields = {
+            "lrc": hashlib.sha256(lrc.encode("utf-8")).hexdigest(),
+            "ref_prompt": ref_prompt or "",
+            "ref_audio": hash_file(ref_audio_path) if ref_audio_path else "",
+            "audio_length": audio_length,
+            "chunked": chunked,
+            "repo_id": repo_id,
+            "seed": seed,
+        }
+        return hashlib.sha256(
+            json.dumps(fields, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _load_index(self) -> dict[str, dict]:
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        # Forget entries whose files were removed behind our back
+        return {
+            key: entry
+            for key, entry in index.items()
+            if (self.cache_dir / entry["file"]).is_file()
+        }
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Holds the cache exclusively, across threads and processes, with a fresh index."""
+        with self._lock, open(self.lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file closes
+            self._index = self._load_index()
+            yield
+
+    def _save_index(self) -> None:
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._index, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)  # Atomic, readers never see a partial index
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(entry["size"] for entry in self._index.values())
+
+    def get(self, key: str, output_path: str | Path) -> Path | None:
+        """
+        Copies the cached song for `key` to `output_path` and marks it recently used.
+
+        The caller gets its own copy, which eviction leaves alone.
+
+        Returns:
+            `output_path` on a hit, or None on a miss.
+        """
+        output_path = Path(output_path)
+        with self._locked():
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            path = self.cache_dir / entry["file"]
+            if path.resolve() != output_path.resolve():
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.part")
+                try:
+                    shutil.copyfile(path, tmp_path)
+                    os.replace(tmp_path, output_path)
+                finally:
+                    tmp_path.unlink(missing_ok=True)
+            entry["last_access"] = time.time()
+            self._save_index()
+            return output_path
+
+    def put(self, key: str, source_path: str | Path) -> Path:
+        """Copies a generated song into the cache and evicts old entries if over budget."""
+        source_path = Path(source_path)
+        file_name = f"{key}{source_path.suffix or '.wav'}"
+        cached_path = self.cache_dir / file_name
+        with self._locked():
+            tmp_path = cached_path.with_suffix(f".{os.getpid()}.part")
+            try:
+                shutil.copyfile(source_path, tmp_path)
+                os.replace(tmp_path, cached_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+            self._index[key] = {
+                "file": file_name,
+                "size": cached_path.stat().st_size,
+                "last_access": time.time(),
+            }
+            self._evict(keep=key)
+            self._save_index()
+        return cached_path
+
+    def _evict(self, keep: str | None = None) -> None:
+        total = self.size_bytes
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self._index.pop(key)
+            (self.cache_dir / entry["file"]).unlink(missing_ok=True)
+            total -= entry["size"]
+            print(f"Evicted cached song {entry['file']} ({entry['size']} bytes)")
+
+    def clear(self) -> None:
+        with self._locked():
+            for entry in self._index.values():
+                (self.cache_dir / entry["file"]).unlink(missing_ok=True)
+            self._index = {}
+            self._save_index()
@@ -1,59 +1,94 @@
+import os
+import signal
 import subprocess
+import tempfile
+from collections import deque
+from collections.abc import Sequence
 from pathlib import Path  # Use pathlib for better path handling
 from typing import Literal
 
 from ..config.settings import settings
-
-PACKAGE_PATH = (
-    settings.base_dir / "vendor" / "DiffRhythm"
-)  # Adjusted to use settings.base_dir
-if not PACKAGE_PATH.exists():
-    raise FileNotFoundError(f"DiffRhythm package not found at {PACKAGE_PATH}")
+from ..utils.telemetry import telemetry
+from ..utils.workers import THREAD_ENV_VARS
+from .cache import MusicCache
+from .jobs import (
+    MusicJob,
+    MusicJobResult,
+    load_lyrics,
+    summarize_results,
+    validate_job,
+)
+from .planner import (
+    DEFAULT_CROSSFADE,
+    MemoryBudgetError,
+    check_lyrics,
+    join_segments,
+    plan_generation,
+    segment_lyrics,
+)
+from .streaming import AudioChunk, read_wav, write_wav
+
+
+def default_package_path() -> Path:
+    """The vendored DiffRhythm checkout. Resolved on use, so importing this module needs no checkout."""
+    return settings.base_dir / "vendor" / "DiffRhythm"
+
+
+OUTPUT_TAIL_LINES = 200  # Lines of script output kept for error reports
 
 
 class DiffRhythm:
-    def __init__(self, package_path: Path | None = None):  # Use Path | None
+    def __init__(
+        self,
+        package_path: Path | None = None,
+        cache: MusicCache | None = None,
+        cuda_visible_devices: str | None = None,
+        cpu_cores: Sequence[int] | None = None,
+    ):  # Use Path | None
         """
         Initializes the DiffRhythm wrapper.
 
         Args:
             package_path: Optional path to the root directory of the DiffRhythm code.
-                          If None, defaults to PACKAGE_PATH defined above.
+                          If None, defaults to `default_package_path()`.
+            cache: Optional cache of generated songs, checked before running the script.
+            cuda_visible_devices: GPUs the script may use, e.g. "1". If None, the
+                script's own default (GPU 0) applies unless the environment sets one.
+            cpu_cores: CPU cores the script is pinned to, with one torch thread per core.
+                None leaves it unpinned.
         """
         self.data_dir = settings.data_dir
-        # Use default from global scope if None
-        resolved_package_path = (
-            Path(package_path).resolve() if package_path else PACKAGE_PATH
-        )
-
-        if not resolved_package_path.is_dir():
-            # Check the default if package_path was None and failed, or raise if specified path failed
-            if package_path is None and not PACKAGE_PATH.is_dir():
+        self.cache = cache
+        self.cuda_visible_devices = cuda_visible_devices
+        self.cpu_cores = tuple(cpu_cores) if cpu_cores else None
+        self._process: subprocess.Popen | None = None
+        if package_path is None:
+            self.package_path = default_package_path()
+            if not self.package_path.is_dir():
                 raise FileNotFoundError(
-                    f"DiffRhythm package root not found at default location: {PACKAGE_PATH}"
+                    f"DiffRhythm package root not found at default location: {self.package_path}"
                 )
-            elif package_path is not None:
+        else:
+            self.package_path = Path(package_path).resolve()
+            if not self.package_path.is_dir():
                 raise FileNotFoundError(
-                    f"DiffRhythm package root not found at specified path: {resolved_package_path}"
+                    f"DiffRhythm package root not found at specified path: {self.package_path}"
                 )
-            else:  # Should technically be covered, but for safety
-                self.package_path = PACKAGE_PATH  # Fallback just in case
-        else:
-            self.package_path = resolved_package_path
 
         print(f"DiffRhythm package path set to: {self.package_path}")
 
-        # Determine absolute path to the shell script
-        # *** Adjust the relative path if your script is located differently ***
+        # Our wrapper script, run inside the checkout (see DIFFRHYTHM_DIR below)
         self.shell_script_path = (
-            # settings.base_dir / "scripts" / "music_generation" / "run_diffrhythm.sh"
-            self.package_path / "scripts" / "run_diffrhythm.sh"
+            settings.base_dir / "scripts" / "music_generation" / "run_diffrhythm.sh"
         ).resolve()
         if not self.shell_script_path.is_file():
             raise FileNotFoundError(
                 f"DiffRhythm shell script not found at {self.shell_script_path}"
             )
-        print(f"Using DiffRhythm shell script: {self.shell_script_path.relative_to(settings.base_dir)}")
+        shown_path = self.shell_script_path
+        if shown_path.is_relative_to(settings.base_dir):
+            shown_path = shown_path.relative_to(settings.base_dir)
+        print(f"Using DiffRhythm shell script: {shown_path}")
 
     def _call_diffrhythm_bash_script(
         self,
@@ -73,7 +108,7 @@ class DiffRhythm:
             lrc_path: Optional path to the lyrics file (--lrc-path).
             ref_prompt: Optional reference text prompt (--ref-prompt).
             ref_audio_path: Optional path to reference audio (--ref-audio-path).
-            chunked: If True, pass --chunked flag.
+            chunked: Pass --chunked if True, else --no-chunked, since the script chunks by default.
             audio_length: Pass --audio-length {95|285}.
             repo_id: Pass --repo-id REPO_ID.
             output_dir: Optional path to output directory (--output-dir). If None, script uses its default.
@@ -91,8 +126,7 @@ class DiffRhythm:
                 cmd.extend(["--ref-prompt", ref_prompt])
             if ref_audio_path:
                 cmd.extend(["--ref-audio-path", str(Path(ref_audio_path).resolve())])
-            if chunked:
-                cmd.append("--chunked")
+            cmd.append("--chunked" if chunked else "--no-chunked")
             cmd.extend(["--audio-length", str(audio_length)])
             cmd.extend(["--repo-id", repo_id])
             if output_dir:
@@ -100,19 +134,53 @@ class DiffRhythm:
             cmd.extend(["--output-file-name", output_file_name])
 
             print(f"Executing shell script: {' '.join(cmd)}")
+            env = os.environ.copy()
+            env["DIFFRHYTHM_DIR"] = str(self.package_path)
+            if self.cuda_visible_devices is not None:
+                env["CUDA_VISIBLE_DEVICES"] = self.cuda_visible_devices
+            if self.cpu_cores:
+                for var in THREAD_ENV_VARS:
+                    env[var] = str(len(self.cpu_cores))
 
             # --- Execute ---
-            result = subprocess.run(
-                cmd,
-                check=True,
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-            )
+            # Echo output as it is produced instead of buffering the whole run in memory;
+            # only the last lines are kept for the error report.
+            output_tail: deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+            with (
+                telemetry.span(
+                    "music.script", audio_length=audio_length, repo_id=repo_id
+                ) as span,
+                subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                    start_new_session=True,  # Own process group, so terminate() reaches uv/python too
+                    env=env,
+                    # Inherited by uv and python, so the whole run stays on these cores
+                    preexec_fn=(
+                        (lambda: os.sched_setaffinity(0, self.cpu_cores))  # type: ignore[arg-type]
+                        if self.cpu_cores
+                        else None
+                    ),
+                ) as process,
+            ):
+                self._process = process
+                assert process.stdout is not None
+                for line in process.stdout:
+                    output_tail.append(line)
+                    print(line, end="")
+                process.wait()
+                span.attributes["returncode"] = process.returncode
+                if process.returncode != 0:
+                    span.fail(f"exit code {process.returncode}")
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    process.returncode, cmd, output="".join(output_tail)
+                )
             print("\n--- Shell Script Execution Successful ---")
-            print("stdout:\n", result.stdout)
-            if result.stderr:
-                print("stderr:\n", result.stderr)
             return True
 
         except FileNotFoundError as e:
@@ -124,12 +192,19 @@ class DiffRhythm:
             print(
                 f"\nError: Shell script execution failed (return code {e.returncode})"
             )
-            print("stdout:\n", e.stdout)
-            print("stderr:\n", e.stderr)
+            print("output (last lines):\n", e.output)
             return False
         except Exception as e:
             print(f"\nAn unexpected Python error occurred: {e}")
             return False
+        finally:
+            self._process = None
+
+    def terminate(self) -> None:
+        """Kills a running shell script and everything it started, e.g. to cancel a job."""
+        process = self._process
+        if process is not None and process.poll() is None:
+            os.killpg(process.pid, signal.SIGKILL)
 
     def generate_music(
         self,
@@ -139,7 +214,7 @@ class DiffRhythm:
         ref_audio_path: str | Path | None = None,
         output_dir: str | Path | None = None,
         output_file_name: str = "output.wav",
-        chunked: bool = True,
+        chunked: bool | None = None,
         repo_id: str = "ASLP-lab/DiffRhythm-full",
     ) -> Path | None:
         """
@@ -152,7 +227,8 @@ class DiffRhythm:
              ref_audio_path: Optional path to reference audio file (--ref-audio-path).
              instrumental_only: If True and lrc_path not given, ensures --lrc-path is omitted.
              output_dir: Directory to save output. If None, script uses its internal default.
-             chunked: Whether to use chunked decoding (--chunked).
+             chunked: Whether to use chunked decoding (--chunked). None decodes in full
+                 only if the memory budget allows (see `planner`).
              repo_id: Model repository ID (--repo-id).
 
         Returns:
@@ -201,8 +277,35 @@ class DiffRhythm:
         if audio_length not in [95, 285]:
             raise ValueError("audio_length must be either 95 or 285 seconds.")
 
+        # Fail on bad lyrics here rather than after the script has run the model
+        lrc = load_lyrics(None, actual_lrc_path, audio_length)
+
+        if chunked is None:
+            try:
+                plan = plan_generation(audio_length, audio_lengths=[audio_length])
+                print(f"Plan: {plan.describe()}")
+                chunked = plan.chunked
+            except MemoryBudgetError as e:
+                print(f"Warning: {e} Falling back to chunked decoding.")
+                chunked = True
+
         expected_output_file = effective_output_dir / output_file_name
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = MusicCache.make_key(
+                lrc=lrc,
+                ref_prompt=ref_prompt,
+                ref_audio_path=ref_audio_path,
+                audio_length=audio_length,
+                chunked=chunked,
+                repo_id=repo_id,
+                seed=None,  # The shell script does not take a seed
+            )
+            if cached_file := self.cache.get(cache_key, expected_output_file):
+                print(f"Using cached song: {cached_file}")
+                return cached_file
+
         success = self._call_diffrhythm_bash_script(
             lrc_path=actual_lrc_path,
             ref_prompt=ref_prompt,
@@ -217,6 +320,11 @@ class DiffRhythm:
         if success:
             if expected_output_file.is_file():
                 print(f"Successfully generated: {expected_output_file}")
+                if cache_key is not None:
+                    try:
+                        self.cache.put(cache_key, expected_output_file)  # type: ignore[union-attr]
+                    except OSError as e:
+                        print(f"Warning: could not cache {expected_output_file}: {e}")
                 return expected_output_file
             else:
                 print(
@@ -237,6 +345,123 @@ class DiffRhythm:
             print("Music generation via shell script failed.")
             return None
 
+    def generate_long_music(
+        self,
+        duration: float,
+        lrc_path: str | Path,
+        ref_prompt: str | None = None,
+        ref_audio_path: str | Path | None = None,
+        output_dir: str | Path | None = None,
+        output_file_name: str = "output.wav",
+        repo_id: str = "ASLP-lab/DiffRhythm-full",
+        crossfade: float = DEFAULT_CROSSFADE,
+        budget_bytes: int | None = None,
+    ) -> Path | None:
+        """
+        Generates a song of any duration within the memory budget, e.g. a whole story soundtrack.
+
+        The song is planned with `plan_generation` and the plan printed before anything
+        runs. Each planned segment is one shell script run with its share of the lyrics;
+        the segments are then crossfaded. The script only decodes in full or in its fixed
+        128-frame windows, so a plan with other windows runs chunked.
+
+        Args:
+            duration: Seconds of audio wanted.
+            lrc_path: Path to the lyrics file, timed against the whole song.
+            ref_prompt: The reference text prompt.
+            ref_audio_path: Optional path to reference audio file. Ignored if ref_prompt is given.
+            output_dir: Directory to save output. Defaults to the script's output directory.
+            output_file_name: Name of the generated WAV file.
+            repo_id: Model repository ID (--repo-id).
+            crossfade: Seconds neighbouring segments overlap.
+            budget_bytes: Memory available. Defaults to `settings.music_memory_budget_bytes`,
+                then the device's memory.
+
+        Returns:
+            The absolute path to the generated music file if successful, otherwise None.
+
+        Raises:
+            LrcValidationError: If the lyrics would not fit the song, before any script run.
+            MemoryBudgetError: If no plan fits the budget.
+        """
+        sheet = check_lyrics(Path(lrc_path).read_text(encoding="utf-8"), duration)
+        if ref_prompt and ref_audio_path:
+            print("Both prompt and reference audio path provided, using prompt only.")
+            ref_audio_path = None
+        plan = plan_generation(duration, budget_bytes=budget_bytes, crossfade=crossfade)
+        print(f"Plan: {plan.describe()}")
+
+        output_path = (
+            Path(output_dir).resolve()
+            if output_dir
+            else self.package_path / "infer" / "example" / "output"
+        ) / output_file_name
+        with tempfile.TemporaryDirectory(prefix="diffrhythm-segments-") as tmp:
+            segments = []
+            for i, (length, lyrics) in enumerate(zip(plan.lengths, segment_lyrics(sheet, plan))):
+                segment_lrc = Path(tmp) / f"segment_{i}.lrc"
+                segment_lrc.write_text(lyrics.to_lrc(), encoding="utf-8")
+                print(f"Rendering segment {i + 1}/{plan.segments}...")
+                if not self._call_diffrhythm_bash_script(
+                    lrc_path=segment_lrc,
+                    ref_prompt=ref_prompt,
+                    ref_audio_path=ref_audio_path,
+                    chunked=plan.chunked,
+                    audio_length=length,  # type: ignore[arg-type]
+                    repo_id=repo_id,
+                    output_dir=tmp,
+                    output_file_name=f"segment_{i}.wav",
+                ):
+                    print("Music generation via shell script failed.")
+                    return None
+                pcm, sample_rate = read_wav(Path(tmp) / f"segment_{i}.wav")
+                segments.append(pcm)
+            pcm = join_segments(segments, plan, sample_rate)
+        write_wav([AudioChunk(pcm, sample_rate, 0, is_last=True)], output_path)
+        print(f"Successfully generated: {output_path}")
+        return output_path
+
+    def generate_music_batch(
+        self, jobs: Sequence[MusicJob], max_batch_size: int | None = None
+    ) -> list[MusicJobResult]:
+        """
+        Generates many songs, one shell script run per job.
+
+        The shell script loads the model for every run, so jobs cannot share a sampling
+        pass here; use `DiffRhythmWorker.generate_music_batch` for batched sampling.
+
+        Args:
+            jobs: The songs to generate.
+            max_batch_size: Unused, accepted for API compatibility with `DiffRhythmWorker`.
+
+        Returns:
+            One result per job, in order, holding either the output path or the error.
+        """
+        results = []
+        for job in jobs:
+            result = MusicJobResult(job, error=validate_job(job))
+            if result.error is None and job.lrc is not None:
+                result.error = "The shell script only reads lyrics from lrc_path."
+            if result.error is None:
+                try:
+                    result.path = self.generate_music(
+                        ref_prompt=job.ref_prompt,
+                        lrc_path=job.lrc_path,
+                        audio_length=job.audio_length,
+                        ref_audio_path=job.ref_audio_path,
+                        output_dir=job.output_dir,
+                        output_file_name=job.output_file_name,
+                        chunked=job.chunked,
+                        repo_id=job.repo_id,
+                    )
+                except Exception as e:
+                    result.error = f"{type(e).__name__}: {e}"
+                if result.path is None and result.error is None:
+                    result.error = "Music generation via shell script failed."
+            results.append(result)
+        print(summarize_results(results))
+        return results
+
 
 # class DiffRhythm:
 #     def __init__(self, package_path: Path | None = PACKAGE_PATH):
@@ -0,0 +1,488 @@
+import contextlib
+import os
+import sys
+from collections.abc import Callable, Iterator, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal
+
+from ..config.settings import settings
+from ..utils.lrc import LyricSheet
+from ..utils.telemetry import telemetry
+from .streaming import AudioChunk, chunk_spans
+from .style_cache import StyleEmbeddingStore
+
+if TYPE_CHECKING:
+    from .planner import GenerationPlan
+
+DEFAULT_REPO_ID = "ASLP-lab/DiffRhythm-full"
+DEFAULT_REF_PROMPT = "classical genres, hopeful mood, piano."
+SAMPLE_RATE = 44100
+# Audio samples produced per latent frame by the DiffRhythm VAE.
+SAMPLES_PER_FRAME = 2048
+# Style encoder loaded by DiffRhythm's prepare_model; embeddings are cached per encoder.
+STYLE_ENCODER_ID = "OpenMuQ/MuQ-MuLan-large"
+# Number of latent frames DiffRhythm samples for each supported song length.
+MAX_FRAMES: dict[int, int] = {95: 2048, 285: 6144}
+SAMPLE_STEPS = 32
+
+
+class DiffRhythmEngine:
+    """
+    Runs DiffRhythm inference in the current process with the models kept resident.
+
+    The vendored DiffRhythm code resolves its config and example files relative to
+    the current working directory, so the engine temporarily changes directory while
+    it calls into it. It is meant to be owned by a dedicated worker process (see
+    `DiffRhythmWorker`) rather than shared with unrelated code.
+    """
+
+    def __init__(
+        self,
+        package_path: str | Path | None = None,
+        repo_id: str = DEFAULT_REPO_ID,
+        audio_length: Literal[95, 285] = 95,
+        device: str | None = None,
+        style_store: StyleEmbeddingStore | None = None,
+        share_weights: bool = False,
+    ):
+        """
+        Args:
+            package_path: Root directory of the DiffRhythm code. Defaults to vendor/DiffRhythm.
+            repo_id: Model repository ID to load.
+            audio_length: Song length in seconds, 95 or 285.
+            device: Torch device. If None, picks cuda, then mps, then cpu.
+            style_store: Optional persistent store of reference-audio style embeddings.
+            share_weights: On CPU, memory-map the CFM and style encoder weights from files
+                shared with other processes instead of keeping private copies.
+        """
+        if audio_length not in MAX_FRAMES:
+            raise ValueError("audio_length must be either 95 or 285 seconds.")
+        self.package_path = (
+            Path(package_path).resolve()
+            if package_path
+            else settings.base_dir / "vendor" / "DiffRhythm"
+        )
+        if not self.package_path.is_dir():
+            raise FileNotFoundError(
+                f"DiffRhythm package root not found at {self.package_path}"
+            )
+        self.repo_id = repo_id
+        self.audio_length = audio_length
+        self.max_frames = MAX_FRAMES[audio_length]
+        self.device = device
+        self.style_store = style_store
+        self.share_weights = share_weights
+        self._cfm: Any = None
+        self._tokenizer: Any = None
+        self._muq: Any = None
+        self._vae: Any = None
+        self._negative_style_prompt: Any = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._cfm is not None
+
+    @contextlib.contextmanager
+    def _vendor_context(self) -> Iterator[None]:
+        """Makes the vendored `infer` package importable and its relative paths resolvable."""
+        package_path = str(self.package_path)
+        if package_path not in sys.path:
+            sys.path.insert(0, package_path)
+        previous_cwd = os.getcwd()
+        os.chdir(package_path)
+        try:
+            yield
+        finally:
+            os.chdir(previous_cwd)
+
+    def load(self) -> None:
+        """Loads the CFM, tokenizer, MuQ style encoder and VAE once."""
+        if self.is_loaded:
+            return
+
+        import torch
+
+        if self.device is None:
+            if torch.cuda.is_available():
+                self.device = "cuda"
+            elif torch.backends.mps.is_available():
+                self.device = "mps"
+            else:
+                self.device = "cpu"
+
+        print(
+            f"Loading DiffRhythm ({self.repo_id}, {self.audio_length}s) on {self.device}..."
+        )
+        with (
+            telemetry.span("music.load", repo_id=self.repo_id, device=self.device),
+            self._vendor_context(),
+        ):
+            from infer.infer_utils import (  # type: ignore
+                get_negative_style_prompt,
+                prepare_model,
+            )
+
+            self._cfm, self._tokenizer, self._muq, self._vae = prepare_model(
+                self.max_frames, self.device, repo_id=self.repo_id
+            )
+            self._negative_style_prompt = get_negative_style_prompt(self.device)
+            if self.share_weights and self.device == "cpu":
+                from ..utils.workers import share_weights
+
+                # The VAE is TorchScript, whose weights cannot be reassigned, so it stays private
+                repo = self.repo_id.replace("/", "--")
+                share_weights(self._cfm, f"diffrhythm-{repo}-{self.audio_length}-cfm")
+                share_weights(self._muq, f"diffrhythm-{STYLE_ENCODER_ID.replace('/', '--')}")
+
+    def warm_up(self, ref_prompt: str = DEFAULT_REF_PROMPT) -> None:
+        """Loads the models and runs the lyric and style encoders once."""
+        self.load()
+        self.lrc_tokens("")
+        self.style_prompt(ref_prompt=ref_prompt)
+
+    def lrc_tokens(self, lrc: str) -> tuple[Any, Any]:
+        """Tokenizes LRC text into the frame-aligned lyric prompt and its start time."""
+        self.load()
+        with (
+            telemetry.span("music.lrc_tokens", chars=len(lrc)),
+            self._vendor_context(),
+        ):
+            from infer.infer_utils import get_lrc_token  # type: ignore
+
+            return get_lrc_token(self.max_frames, lrc, self._tokenizer, self.device)
+
+    def style_prompt(
+        self,
+        ref_prompt: str | None = None,
+        ref_audio_path: str | Path | None = None,
+    ) -> Any:
+        """Encodes the style prompt from reference audio or, failing that, text."""
+        import torch
+
+        self.load()
+        with telemetry.span("music.style_prompt", audio=bool(ref_audio_path)):
+            if ref_audio_path and self.style_store is not None:
+                embedding = self.style_store.get_or_compute(
+                    ref_audio_path, STYLE_ENCODER_ID, self._encode_audio_style
+                )
+                return torch.tensor(embedding, device=self.device).half()
+
+            with self._vendor_context():
+                from infer.infer_utils import get_style_prompt  # type: ignore
+
+                if ref_audio_path:
+                    return get_style_prompt(self._muq, str(Path(ref_audio_path).resolve()))
+                return get_style_prompt(self._muq, prompt=ref_prompt or DEFAULT_REF_PROMPT)
+
+    def _encode_audio_style(self, audio_path: Path) -> Any:
+        """Decodes reference audio and runs the style encoder, returning a numpy array."""
+        with self._vendor_context():
+            from infer.infer_utils import get_style_prompt  # type: ignore
+
+            embedding = get_style_prompt(self._muq, str(audio_path.resolve()))
+        return embedding.cpu().numpy()
+
+    def precompute_styles(self, folder: str | Path) -> list[Path]:
+        """Stores style embeddings for every audio file in `folder` (requires a `style_store`)."""
+        if self.style_store is None:
+            raise ValueError("precompute_styles requires a style_store.")
+        self.load()
+        return self.style_store.precompute(
+            folder, STYLE_ENCODER_ID, self._encode_audio_style
+        )
+
+    def sample(
+        self,
+        lrc_prompt: Any,
+        start_time: Any,
+        style_prompt: Any,
+        seed: int | None = None,
+    ) -> Any:
+        """Runs the diffusion sampler and returns latents shaped [batch, frames, dim]."""
+        import torch
+
+        self.load()
+        if seed is not None:
+            torch.manual_seed(seed)
+        batch_size = lrc_prompt.shape[0]
+        cond = torch.zeros(
+            batch_size, self.max_frames, 64, device=self.device
+        )  # No reference latent, generate from scratch
+        negative_style_prompt = self._negative_style_prompt.expand(batch_size, -1)
+        with (
+            telemetry.span("music.sample", batch=batch_size, steps=SAMPLE_STEPS) as span,
+            torch.inference_mode(),
+        ):
+            latents, _ = self._cfm.sample(
+                cond=cond,
+                text=lrc_prompt,
+                duration=self.max_frames,
+                style_prompt=style_prompt,
+                negative_style_prompt=negative_style_prompt,
+                steps=SAMPLE_STEPS,
+                cfg_strength=4.0,
+                start_time=start_time,
+            )
+            if self.device == "cuda":
+                torch.cuda.synchronize()  # Time the kernels, not their launch
+        # The sampler runs its steps internally; record the mean step time
+        telemetry.observe("music_sample_step_seconds", span.duration / SAMPLE_STEPS)
+        if isinstance(latents, list | tuple):  # Newer DiffRhythm returns one per sample
+            latents = latents[0]
+        return latents
+
+    def decode(
+        self, latents: Any, chunked: bool = True, chunk_size: int = 128, overlap: int = 32
+    ) -> list[Any]:
+        """
+        Decodes latents into peak-normalized int16 waveforms, one [channels, samples] tensor per item.
+
+        Chunked decoding runs the VAE over windows of `chunk_size` latent frames that
+        overlap by `overlap` frames, so its memory use depends on the window, not the song.
+        """
+        import torch
+
+        with (
+            telemetry.span(
+                "music.decode", batch=latents.shape[0], chunked=chunked, chunk_size=chunk_size
+            ),
+            self._vendor_context(),
+            torch.inference_mode(),
+        ):
+            from infer.infer_utils import decode_audio  # type: ignore
+
+            audio = decode_audio(
+                latents.to(torch.float32).transpose(1, 2),  # [b d t]
+                self._vae,
+                chunked=chunked,
+                overlap=overlap,
+                chunk_size=chunk_size,
+            )
+            return [
+                item.to(torch.float32)
+                .div(torch.max(torch.abs(item)).clamp_min(1e-8))  # Silence stays silent
+                .clamp(-1, 1)
+                .mul(32767)
+                .to(torch.int16)
+                .cpu()
+                for item in audio
+            ]
+
+    def stream(
+        self,
+        lrc: str = "",
+        ref_prompt: str | None = None,
+        ref_audio_path: str | Path | None = None,
+        seed: int | None = None,
+        chunk_size: int = 128,
+        overlap: int = 32,
+    ) -> Iterator[AudioChunk]:
+        """
+        Generates one song and yields its audio as each VAE decode window finishes.
+
+        Unlike `generate`, the whole waveform is never held in memory, so audio cannot be
+        peak-normalized against the full song; samples are clipped to [-1, 1] instead.
+
+        Args:
+            lrc: LRC lyrics text. Empty for an instrumental.
+            ref_prompt: Reference text prompt, used when `ref_audio_path` is not given.
+            ref_audio_path: Optional reference audio file.
+            seed: Optional random seed for reproducible sampling.
+            chunk_size: Latent frames decoded per window.
+            overlap: Latent frames shared by neighbouring windows to hide seams.
+
+        Yields:
+            `AudioChunk`s in playback order.
+        """
+        import torch
+
+        lrc_prompt, start_time = self.lrc_tokens(lrc)
+        style_prompt = self.style_prompt(ref_prompt, ref_audio_path)
+        latents = self.sample(lrc_prompt, start_time, style_prompt, seed=seed)
+        latents = latents.to(torch.float32).transpose(1, 2)  # [b d t]
+
+        spans = list(chunk_spans(latents.shape[2], chunk_size, overlap))
+        for i, (start, end, keep_start, keep_end) in enumerate(spans):
+            with (
+                telemetry.span("music.decode", window=i, frames=end - start),
+                torch.inference_mode(),
+            ):
+                audio = self._vae.decode_export(latents[:, :, start:end])[0]
+                audio = audio[
+                    :,
+                    (keep_start - start) * SAMPLES_PER_FRAME : (keep_end - start)
+                    * SAMPLES_PER_FRAME,
+                ]
+                pcm = audio.clamp(-1, 1).mul(32767).to(torch.int16).cpu().numpy()
+            yield AudioChunk(
+                pcm=pcm.T.copy(),  # [samples, channels], contiguous for tobytes()
+                sample_rate=SAMPLE_RATE,
+                start_sample=keep_start * SAMPLES_PER_FRAME,
+                is_last=i == len(spans) - 1,
+            )
+
+    @staticmethod
+    def save(audio: Any, output_path: str | Path) -> Path:
+        """Writes an int16 [channels, samples] waveform to a WAV file."""
+        import torchaudio
+
+        output_path = Path(output_path)
+        with telemetry.span("music.save", samples=audio.shape[-1]):
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            torchaudio.save(str(output_path), audio, sample_rate=SAMPLE_RATE)
+        return output_path
+
+    def generate(
+        self,
+        output_path: str | Path,
+        lrc: str = "",
+        ref_prompt: str | None = None,
+        ref_audio_path: str | Path | None = None,
+        chunked: bool = True,
+        seed: int | None = None,
+        chunk_size: int = 128,
+    ) -> Path:
+        """
+        Generates one song and writes it to `output_path`.
+
+        Args:
+            output_path: Where to write the WAV file.
+            lrc: LRC lyrics text. Empty for an instrumental.
+            ref_prompt: Reference text prompt, used when `ref_audio_path` is not given.
+            ref_audio_path: Optional reference audio file.
+            chunked: Whether to use chunked VAE decoding.
+            seed: Optional random seed for reproducible sampling.
+            chunk_size: Latent frames per decode window when chunked.
+
+        Returns:
+            The path to the written WAV file.
+        """
+        (result,) = self.generate_batch(
+            [
+                {
+                    "output_path": output_path,
+                    "lrc": lrc,
+                    "ref_prompt": ref_prompt,
+                    "ref_audio_path": ref_audio_path,
+                    "chunked": chunked,
+                    "chunk_size": chunk_size,
+                }
+            ],
+            seed=seed,
+        )
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def generate_batch(
+        self, items: Sequence[dict[str, Any]], seed: int | None = None
+    ) -> list[Path | Exception]:
+        """
+        Generates several songs with a single batched sampling pass.
+
+        Each item takes the same keyword arguments as `generate` except `seed`, which
+        applies to the whole batch. Items whose lyrics or style fail to encode are
+        reported individually and left out of the batch instead of failing it.
+
+        Returns:
+            For each item, in order, the written WAV path or the exception that stopped it.
+        """
+        import torch
+
+        results: list[Path | Exception] = [
+            RuntimeError("Song was not generated.") for _ in items
+        ]
+        prepared = []
+        for index, item in enumerate(items):
+            try:
+                lrc_prompt, start_time = self.lrc_tokens(item.get("lrc", ""))
+                style_prompt = self.style_prompt(
+                    item.get("ref_prompt"), item.get("ref_audio_path")
+                )
+                prepared.append((index, lrc_prompt, start_time, style_prompt))
+            except Exception as e:
+                results[index] = e
+        if not prepared:
+            return results
+
+        indices, lrc_prompts, start_times, style_prompts = zip(*prepared)
+        try:
+            latents = self.sample(
+                torch.cat(lrc_prompts),
+                torch.cat(start_times),
+                torch.cat(style_prompts),
+                seed=seed,
+            )
+        except Exception as e:
+            for index in indices:
+                results[index] = e
+            return results
+
+        for row, index in enumerate(indices):
+            item = items[index]
+            try:
+                (audio,) = self.decode(
+                    latents[row : row + 1],
+                    chunked=item.get("chunked", True),
+                    chunk_size=item.get("chunk_size", 128),
+                )
+                results[index] = self.save(audio, item["output_path"])
+            except Exception as e:
+                results[index] = e
+        return results
+
+    def generate_planned(
+        self,
+        output_path: str | Path,
+        plan: "GenerationPlan",
+        lrc: str | LyricSheet = "",
+        ref_prompt: str | None = None,
+        ref_audio_path: str | Path | None = None,
+        seed: int | None = None,
+        engine_for: Callable[[int], "DiffRhythmEngine"] | None = None,
+    ) -> Path:
+        """
+        Generates a song of any duration from a plan made by `plan_generation`.
+
+        Segments are sampled and decoded one at a time, with the plan's decode windows,
+        then crossfaded. Only one segment's latents and activations are alive at once,
+        so peak memory is that of a single segment whatever the duration.
+
+        Args:
+            output_path: Where to write the WAV file.
+            plan: The plan; its main segment length must match this engine's `audio_length`.
+            lrc: Lyrics timed against the whole song. Empty for an instrumental.
+            ref_prompt: Reference text prompt, used when `ref_audio_path` is not given.
+            ref_audio_path: Optional reference audio file, shared by every segment.
+            seed: Optional random seed; segment i is sampled with `seed + i`.
+            engine_for: Returns the engine for segments of another length, e.g. a shorter
+                final segment. Without it, every segment must be this engine's length.
+
+        Returns:
+            The path to the written WAV file.
+        """
+        from .planner import join_segments, segment_lyrics
+        from .streaming import write_wav
+
+        for length in {plan.audio_length, *plan.lengths}:
+            if length != self.audio_length and engine_for is None:
+                raise ValueError(
+                    f"Plan needs {length}s segments, this engine renders {self.audio_length}s."
+                )
+        sheet = lrc if isinstance(lrc, LyricSheet) else LyricSheet.parse(lrc)
+        style_prompt = self.style_prompt(ref_prompt, ref_audio_path)
+        segments = []
+        with telemetry.span("music.planned", duration=plan.duration, segments=plan.segments):
+            for i, (length, lyrics) in enumerate(zip(plan.lengths, segment_lyrics(sheet, plan))):
+                engine = self if length == self.audio_length else engine_for(length)  # type: ignore[misc]
+                lrc_prompt, start_time = engine.lrc_tokens(lyrics.to_lrc())
+                latents = engine.sample(
+                    lrc_prompt, start_time, style_prompt, seed=None if seed is None else seed + i
+                )
+                (audio,) = engine.decode(
+                    latents, chunked=plan.chunked, chunk_size=plan.chunk_size, overlap=plan.overlap
+                )
+                del latents
+                segments.append(audio.numpy().T)  # [samples, channels]
+            pcm = join_segments(segments, plan, SAMPLE_RATE)
+        return write_wav([AudioChunk(pcm, SAMPLE_RATE, 0, is_last=True)], output_path)
@@ -0,0 +1,124 @@
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+from ..utils.lrc import LyricSheet
+from ..utils.telemetry import telemetry
+from .engine import DEFAULT_REPO_ID
+
+
+@dataclass
+class MusicJob:
+    """One song to generate as part of a batch. Lyrics come from `lrc` if given, else `lrc_path`."""
+
+    lrc_path: str | Path | None
+    output_dir: str | Path
+    output_file_name: str = "output.wav"
+    ref_prompt: str | None = None
+    ref_audio_path: str | Path | None = None
+    audio_length: Literal[95, 285] = 95
+    chunked: bool = True
+    repo_id: str = DEFAULT_REPO_ID
+    seed: int | None = None
+    lrc: str | LyricSheet | None = None
+
+    @property
+    def output_path(self) -> Path:
+        return Path(self.output_dir).resolve() / self.output_file_name
+
+    @property
+    def group_key(self) -> tuple[str, int, int | None]:
+        """Jobs with the same key can share one batched sampling pass."""
+        return (self.repo_id, self.audio_length, self.seed)
+
+
+@dataclass
+class MusicJobResult:
+    """Outcome of a `MusicJob`: either the generated file or the error that stopped it."""
+
+    job: MusicJob
+    path: Path | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
+
+
+@dataclass
+class MusicJobGroup:
+    """Indices into the original job list that share a sampling pass."""
+
+    key: tuple[str, int, int | None]
+    indices: list[int] = field(default_factory=list)
+
+
+def group_jobs(
+    jobs: Sequence[MusicJob], max_batch_size: int | None = None
+) -> list[MusicJobGroup]:
+    """
+    Groups jobs that can be sampled together, preserving submission order within a group.
+
+    Args:
+        jobs: The jobs to group.
+        max_batch_size: Split groups larger than this. None means no limit.
+
+    Returns:
+        The groups, each holding indices into `jobs`.
+    """
+    groups: dict[tuple[str, int, int | None], list[int]] = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(job.group_key, []).append(index)
+
+    result = []
+    for key, indices in groups.items():
+        step = max_batch_size or len(indices)
+        for start in range(0, len(indices), step):
+            result.append(MusicJobGroup(key, indices[start : start + step]))
+    return result
+
+
+def load_lyrics(
+    lrc: str | LyricSheet | None, lrc_path: str | Path | None, audio_length: int
+) -> str:
+    """
+    Returns the LRC text to sing, checked so bad lyrics fail before a diffusion run.
+
+    Empty lyrics are accepted and give an instrumental.
+
+    Args:
+        lrc: Lyrics as text or a parsed sheet. Takes precedence over `lrc_path`.
+        lrc_path: Path to the lyrics file.
+        audio_length: Song length the lyrics must fit in.
+
+    Returns:
+        The timed lines, normalized by `LyricSheet.to_lrc`.
+
+    Raises:
+        LrcValidationError: If the lyrics are out of order or overrun the song.
+    """
+    with telemetry.span("lyrics.validate", audio_length=audio_length):
+        if lrc is None:
+            if not lrc_path:
+                raise ValueError("LRC text or path must be provided for music generation.")
+            lrc = Path(lrc_path).read_text(encoding="utf-8")
+        sheet = lrc if isinstance(lrc, LyricSheet) else LyricSheet.parse(lrc)
+        return sheet.check(audio_length, allow_empty=True).to_lrc()
+
+
+def validate_job(job: MusicJob) -> str | None:
+    """Returns why a job cannot run, or None if it looks runnable."""
+    if job.audio_length not in [95, 285]:
+        return "audio_length must be either 95 or 285 seconds."
+    if job.lrc is None and (not job.lrc_path or not Path(job.lrc_path).is_file()):
+        return f"LRC file not found: {job.lrc_path}"
+    if job.ref_audio_path and not Path(job.ref_audio_path).is_file():
+        return f"Reference audio file not found: {job.ref_audio_path}"
+    return None
+
+
+def summarize_results(results: Iterable[MusicJobResult]) -> str:
+    results = list(results)
+    failed = [result for result in results if not result.ok]
+    return f"{len(results) - len(failed)}/{len(results)} songs generated, {len(failed)} failed"
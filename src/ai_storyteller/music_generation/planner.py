@@ -0,0 +1,318 @@
+import math
+import os
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Literal
+
+from ..config.settings import settings
+from ..utils.lrc import SONG_LENGTHS, LrcValidationError, LyricSheet, format_timestamp
+from .engine import MAX_FRAMES, SAMPLE_RATE, SAMPLES_PER_FRAME
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_CROSSFADE = 5.0  # Seconds shared by neighbouring segments
+DEFAULT_CHUNK_OVERLAP = 32  # Latent frames shared by neighbouring decode windows
+# Decode window sizes tried, largest first; DiffRhythm's own default is 128
+CHUNK_SIZES = (1024, 512, 256, 128, 64)
+# Share of the budget kept free for the CUDA context, allocator fragmentation and
+# the estimates' error
+HEADROOM = 0.1
+
+
+class MemoryBudgetError(ValueError):
+    """Raised when no generation plan fits the memory budget."""
+
+
+@dataclass(frozen=True)
+class MemoryModel:
+    """
+    Approximate memory use of a DiffRhythm run, per component.
+
+    The defaults are rough figures for DiffRhythm-full in half precision, in line with
+    its stated minimum of 8 GB of VRAM for a chunked decode. Decoding dominates: the VAE
+    turns every latent frame into 2048 stereo samples, so an unchunked 285 s decode needs
+    far more than sampling does. Measure a run on your own nodes and pass a calibrated
+    model for tighter plans.
+    """
+
+    weights_bytes: int = 5 * 1024**3  # CFM, MuQ-MuLan style encoder, VAE and tokenizer
+    sample_bytes_per_frame: int = 192 * 1024  # Per song in the batch, guidance included
+    decode_bytes_per_frame: int = 3 * 1024**2  # VAE activations for one frame's samples
+
+    def sample_bytes(self, frames: int, batch_size: int = 1) -> int:
+        return self.sample_bytes_per_frame * frames * batch_size
+
+    def decode_bytes(self, frames: int) -> int:
+        return self.decode_bytes_per_frame * frames
+
+    def peak_bytes(self, frames: int, decode_frames: int, batch_size: int = 1) -> int:
+        """Weights plus the larger of sampling and decoding, which never overlap."""
+        return self.weights_bytes + max(
+            self.sample_bytes(frames, batch_size), self.decode_bytes(decode_frames)
+        )
+
+
+def segment_seconds(audio_length: int) -> float:
+    """Exact length of the audio DiffRhythm produces for a 95 or 285 s song."""
+    return MAX_FRAMES[audio_length] * SAMPLES_PER_FRAME / SAMPLE_RATE
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+@dataclass
+class GenerationPlan:
+    """How to render a song of any duration within a memory budget."""
+
+    duration: float  # Seconds of finished audio
+    audio_length: Literal[95, 285]  # DiffRhythm length of the segments
+    starts: list[float] = field(default_factory=lambda: [0.0])  # Segment starts in the song
+    # DiffRhythm length of each segment; the last may be shorter. Defaults to `audio_length`
+    lengths: list[int] = field(default_factory=list)
+    chunked: bool = True
+    chunk_size: int = 128  # Latent frames per decode window
+    overlap: int = DEFAULT_CHUNK_OVERLAP
+    crossfade: float = DEFAULT_CROSSFADE
+    peak_bytes: int = 0  # Estimated
+    budget_bytes: int | None = None
+
+    def __post_init__(self) -> None:
+        if not self.lengths:
+            self.lengths = [self.audio_length] * len(self.starts)
+
+    @property
+    def segments(self) -> int:
+        return len(self.starts)
+
+    def describe(self) -> str:
+        decode = f"chunked decode ({self.chunk_size} frames)" if self.chunked else "full decode"
+        layout = f"1 x {self.audio_length}s segment"
+        if self.segments > 1:
+            counts = {length: self.lengths.count(length) for length in self.lengths}
+            layout = " + ".join(f"{count} x {length}s" for length, count in counts.items())
+            layout += f" segments with {self.crossfade:g}s crossfades"
+        budget = f" of {format_bytes(self.budget_bytes)} budget" if self.budget_bytes else ""
+        return (
+            f"{self.duration:g}s song: {layout}, {decode}, "
+            f"estimated peak memory {format_bytes(self.peak_bytes)}{budget}"
+        )
+
+
+def detect_memory_budget(device: str | None = None) -> int:
+    """
+    The memory DiffRhythm may use: `settings.music_memory_budget_bytes` if set, else the
+    total memory of the CUDA device it will run on, else physical RAM.
+    """
+    if settings.music_memory_budget_bytes:
+        return settings.music_memory_budget_bytes
+    if device is None or device.startswith("cuda"):
+        import torch
+
+        if torch.cuda.is_available():
+            return torch.cuda.get_device_properties(torch.device(device or "cuda")).total_memory
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        # Unknown: assume the smallest node a 285 s chunked render fits on
+        return MemoryModel().peak_bytes(MAX_FRAMES[285], 128)
+
+
+def _plan_decode(
+    frames: int, budget: int, memory: MemoryModel, batch_size: int, overlap: int
+) -> tuple[bool, int, int] | None:
+    """The largest decode window that fits: (chunked, chunk_size, peak bytes), or None."""
+    peak = memory.peak_bytes(frames, frames, batch_size)
+    if peak <= budget:
+        return False, frames, peak
+    for chunk_size in CHUNK_SIZES:
+        if chunk_size >= frames or chunk_size <= 2 * overlap:
+            continue
+        peak = memory.peak_bytes(frames, chunk_size, batch_size)
+        if peak <= budget:
+            return True, chunk_size, peak
+    return None
+
+
+def plan_generation(
+    duration: float,
+    budget_bytes: int | None = None,
+    device: str | None = None,
+    batch_size: int = 1,
+    crossfade: float = DEFAULT_CROSSFADE,
+    overlap: int = DEFAULT_CHUNK_OVERLAP,
+    audio_lengths: Sequence[int] = SONG_LENGTHS,
+    memory: MemoryModel | None = None,
+) -> GenerationPlan:
+    """
+    Plans a song of `duration` seconds so the estimated peak memory stays within budget,
+    less `HEADROOM`.
+
+    DiffRhythm only renders 95 or 285 s songs. Shorter durations are cut from one segment;
+    longer ones, or ones whose 285 s segment would not fit, are rendered as overlapping
+    segments crossfaded together. The last segment is the shortest length that covers
+    what is left, e.g. 285 + 95 s for a 300 s song, if both models fit the budget at
+    once. Each segment is decoded in full if that fits, else in the largest decode
+    windows that do.
+
+    Args:
+        duration: Seconds of audio wanted.
+        budget_bytes: Memory available. Defaults to `detect_memory_budget(device)`.
+        device: Device DiffRhythm runs on, used to detect the budget.
+        batch_size: Songs sampled together.
+        crossfade: Seconds neighbouring segments overlap.
+        overlap: Latent frames neighbouring decode windows overlap.
+        audio_lengths: Segment lengths allowed, e.g. only the length a loaded model supports.
+        memory: Memory estimates. Defaults to `MemoryModel()`.
+
+    Returns:
+        The plan, with its estimated peak memory.
+
+    Raises:
+        MemoryBudgetError: If no plan fits the budget.
+    """
+    if duration <= 0:
+        raise ValueError("duration must be positive.")
+    memory = memory or MemoryModel()
+    budget = budget_bytes or detect_memory_budget(device)
+    usable = int(budget * (1 - HEADROOM))
+
+    # Fewest seams and least compute first: the shortest segment that covers the duration
+    # on its own, then segments from the longest down
+    candidates = sorted(
+        (length for length in audio_lengths if length in MAX_FRAMES),
+        key=lambda length: (0, length) if segment_seconds(length) >= duration else (1, -length),
+    )
+    if not candidates:
+        raise ValueError(f"audio_lengths must include one of {SONG_LENGTHS}.")
+    smallest_peak = None
+    for audio_length in candidates:
+        frames = MAX_FRAMES[audio_length]
+        decode = _plan_decode(frames, usable, memory, batch_size, overlap)
+        if decode is None:
+            peak = memory.peak_bytes(frames, min(CHUNK_SIZES), batch_size)
+            smallest_peak = min(peak, smallest_peak or peak)
+            continue
+        chunked, chunk_size, peak = decode
+
+        length = segment_seconds(audio_length)
+        count = 1
+        if duration > length:
+            if not 0 < crossfade < length / 2:
+                raise ValueError(f"crossfade must be between 0 and {length / 2:g} seconds.")
+            count = math.ceil((duration - crossfade) / (length - crossfade))
+        starts = [i * (length - crossfade) for i in range(count)]
+        lengths = [audio_length] * count
+        if count > 1:
+            remaining = duration - starts[-1]
+            for last in sorted(candidates):
+                if last >= audio_length or segment_seconds(last) < remaining:
+                    continue
+                if not crossfade < segment_seconds(last) / 2:
+                    continue
+                # Decoded like the others, while the worker keeps the longer model loaded
+                frames = MAX_FRAMES[last]
+                last_peak = memory.weights_bytes + memory.peak_bytes(
+                    frames, min(chunk_size, frames) if chunked else frames, batch_size
+                )
+                if last_peak <= usable:
+                    lengths[-1] = last
+                    peak = max(peak, last_peak)
+                    break
+        return GenerationPlan(
+            duration=duration,
+            audio_length=audio_length,  # type: ignore[arg-type]
+            starts=starts,
+            lengths=lengths,
+            chunked=chunked,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            crossfade=crossfade,
+            peak_bytes=peak,
+            budget_bytes=budget,
+        )
+    raise MemoryBudgetError(
+        f"No plan for a {duration:g}s song fits {format_bytes(budget)} "
+        f"({format_bytes(usable)} after headroom); "
+        f"the smallest needs about {format_bytes(smallest_peak or 0)}."
+    )
+
+
+def check_lyrics(lrc: str | LyricSheet, duration: float) -> LyricSheet:
+    """
+    Checks lyrics against a song of any duration, like `LyricSheet.check`.
+
+    Empty lyrics are allowed and make an instrumental.
+
+    Raises:
+        LrcValidationError: If the lyrics are out of order or overrun the song.
+    """
+    sheet = lrc if isinstance(lrc, LyricSheet) else LyricSheet.parse(lrc)
+    problems = sheet.validate(allow_empty=True)
+    if sheet.times and sheet.end_seconds >= duration:
+        problems.append(
+            f"lyrics run past the {duration:g}s song (last at {format_timestamp(max(sheet.times))})"
+        )
+    if problems:
+        raise LrcValidationError(problems)
+    return sheet
+
+
+def segment_lyrics(sheet: LyricSheet, plan: GenerationPlan) -> list[LyricSheet]:
+    """
+    Splits lyrics across the plan's segments, each retimed to start at its segment.
+
+    A line belongs to the segment playing at full volume when it starts, so lines in
+    a crossfade go to whichever side of its midpoint they fall on. Segments without
+    lines get an empty sheet and are rendered as instrumentals.
+    """
+    bounds = [0.0] + [start + plan.crossfade / 2 for start in plan.starts[1:]] + [math.inf]
+    return [
+        LyricSheet(
+            (time - round(start * 100), text)
+            for time, text in zip(sheet.times, sheet.texts)
+            if low * 100 <= time < high * 100
+        )
+        for start, low, high in zip(plan.starts, bounds, bounds[1:])
+    ]
+
+
+def join_segments(
+    segments: Sequence["np.ndarray"], plan: GenerationPlan, sample_rate: int = SAMPLE_RATE
+) -> "np.ndarray":
+    """
+    Crossfades rendered segments and trims the result to the planned duration.
+
+    Args:
+        segments: int16 audio per segment, shaped [samples, channels].
+        plan: The plan they were rendered from.
+        sample_rate: Sample rate of the segments.
+
+    Returns:
+        int16 audio shaped [samples, channels].
+    """
+    import numpy as np
+
+    fade = round(plan.crossfade * sample_rate)
+    positions = [0]
+    for pcm in segments[:-1]:
+        positions.append(positions[-1] + len(pcm) - fade)
+    total = positions[-1] + len(segments[-1])
+    out = np.zeros((total, segments[0].shape[1]), dtype=np.float32)
+
+    # Equal-power fades: the two segments are unrelated takes, so keep the loudness steady
+    ramp = np.linspace(0.0, np.pi / 2, fade, dtype=np.float32)[:, None]
+    for i, (pcm, position) in enumerate(zip(segments, positions)):
+        audio = pcm.astype(np.float32)
+        if i > 0:
+            audio[:fade] *= np.sin(ramp)
+        if i < len(segments) - 1:
+            audio[-fade:] *= np.cos(ramp)
+        out[position : position + len(audio)] += audio
+    out = out[: round(plan.duration * sample_rate)]
+    return np.clip(out, -32768, 32767).astype(np.int16)
@@ -0,0 +1,436 @@
+import os
+import subprocess
+import threading
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Literal
+
+from ..asr.audio import ffmpeg_exe
+from ..utils.telemetry import telemetry
+from .streaming import AudioChunk
+
+Codec = Literal["opus", "mp3", "aac"]
+
+
+@dataclass(frozen=True)
+class _CodecSpec:
+    encoder: str
+    muxer: str
+    extension: str
+    sample_rate: int
+    options: tuple[str, ...] = ()
+
+
+_CODECS: dict[str, _CodecSpec] = {
+    # libopus only takes 48 kHz and below; 48 kHz keeps the full band
+    "opus": _CodecSpec("libopus", "ogg", "opus", 48000, ("-application", "audio")),
+    "mp3": _CodecSpec("libmp3lame", "mp3", "mp3", 44100),
+    # Index at the front, so players can start before the whole file is downloaded
+    "aac": _CodecSpec("aac", "ipod", "m4a", 44100, ("-movflags", "+faststart")),
+}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """One encoded version of a song: a codec at a bitrate."""
+
+    codec: Codec
+    bitrate_kbps: int
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rendition":
+        """Parses "CODEC:KBPS", e.g. "opus:96"."""
+        codec, _, bitrate = spec.partition(":")
+        codec = codec.strip().lower()
+        if codec not in _CODECS or not bitrate.strip().isdigit():
+            raise ValueError(
+                f"Invalid rendition {spec!r}: expected CODEC:KBPS with CODEC one of "
+                f"{', '.join(_CODECS)}."
+            )
+        return cls(codec, int(bitrate))  # type: ignore[arg-type]
+
+    @property
+    def extension(self) -> str:
+        return _CODECS[self.codec].extension
+
+    def file_name(self, stem: str) -> str:
+        return f"{stem}.{self.bitrate_kbps}k.{self.extension}"
+
+    def __str__(self) -> str:
+        return f"{self.codec}:{self.bitrate_kbps}"
+
+
+# Small and large Opus for streaming, plus MP3 and AAC for players without Opus
+DEFAULT_RENDITIONS = (
+    Rendition("opus", 64),
+    Rendition("opus", 128),
+    Rendition("mp3", 128),
+    Rendition("aac", 128),
+)
+
+
+@dataclass(frozen=True)
+class Mastering:
+    """
+    Loudness normalization and silence trimming applied before encoding.
+
+    Loudness is normalized in one streaming pass with ffmpeg's `loudnorm`, which looks a
+    few seconds ahead rather than measuring the whole song first. Silence is trimmed at
+    the start and end only, down to `keep_silence`; rests within the song are kept, so
+    the vocals stay on their LRC timestamps. ffmpeg trims the start as it streams. The
+    end of a decoded stream is trimmed before ffmpeg by `trim_end`, which only holds
+    back the current run of silence. For a file, ffmpeg trims the reversed song instead,
+    which buffers it in memory (about 100 MB for 285 s of stereo float audio).
+    """
+
+    loudness: float = -16.0  # Integrated loudness in LUFS
+    true_peak: float = -1.5  # dBTP, leaving room for lossy encoders' overshoot
+    loudness_range: float = 11.0  # LU
+    silence_threshold: float = -50.0  # dBFS below which audio counts as silence
+    keep_silence: float = 0.5  # Seconds left before the first and after the last sound
+
+    def filter_graph(self, outputs: int, trim_end: bool = True) -> str:
+        """
+        An ffmpeg filter graph from input 0 to `outputs` labelled outputs, [out0] on.
+
+        Args:
+            outputs: Number of outputs.
+            trim_end: Also trim the end, which makes ffmpeg hold the whole song. Off for
+                streams already passed through `trim_end`.
+        """
+        trim = (
+            f"silenceremove=start_periods=1:start_threshold={self.silence_threshold}dB"
+            f":start_silence={self.keep_silence}"
+        )
+        if trim_end:
+            trim = f"{trim},areverse,{trim},areverse"
+        loudnorm = f"loudnorm=I={self.loudness}:TP={self.true_peak}:LRA={self.loudness_range}"
+        labels = "".join(f"[out{i}]" for i in range(outputs))
+        return f"[0:a]{trim},{loudnorm},asplit={outputs}{labels}"
+
+    def trim_end(self, chunks: Iterable[AudioChunk]) -> Iterator[AudioChunk]:
+        """
+        Passes a decoded song through, cutting its trailing silence down to `keep_silence`.
+
+        Audio after the last sound so far is held back until more sound follows or the
+        song ends, so only the current run of silence is ever in memory.
+        """
+        import numpy as np
+
+        # int16 amplitude of `silence_threshold`
+        threshold = 32768 * 10 ** (self.silence_threshold / 20)
+        held: list["np.ndarray"] = []
+        sample_rate = 0
+        start_sample = 0
+        for chunk in chunks:
+            sample_rate = chunk.sample_rate
+            loud = np.flatnonzero(np.abs(chunk.pcm).max(axis=1) > threshold)
+            if len(loud) == 0:
+                held.append(chunk.pcm)
+                continue
+            end = int(loud[-1]) + 1
+            pcm = np.concatenate([*held, chunk.pcm[:end]]) if held else chunk.pcm[:end]
+            held = [chunk.pcm[end:]]
+            yield AudioChunk(pcm, sample_rate, start_sample)
+            start_sample += len(pcm)
+        keep = round(self.keep_silence * sample_rate)
+        tail = np.concatenate(held)[:keep] if held else None
+        if tail is not None and len(tail):
+            yield AudioChunk(tail, sample_rate, start_sample, is_last=True)
+
+
+def _command(
+    input_args: list[str],
+    output_paths: dict[Rendition, Path],
+    mastering: Mastering,
+    threads: int,
+    trim_end: bool = True,
+) -> list[str]:
+    cmd = [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", *input_args]
+    cmd += ["-filter_complex", mastering.filter_graph(len(output_paths), trim_end)]
+    for i, (rendition, path) in enumerate(output_paths.items()):
+        spec = _CODECS[rendition.codec]
+        cmd += [
+            "-map",
+            f"[out{i}]",
+            "-c:a",
+            spec.encoder,
+            "-b:a",
+            f"{rendition.bitrate_kbps}k",
+            "-ar",
+            str(spec.sample_rate),
+            "-threads",
+            str(threads),
+            *spec.options,
+            "-f",
+            spec.muxer,
+            str(path),
+        ]
+    return cmd
+
+
+def _partial_paths(output_paths: dict[Rendition, Path]) -> dict[Rendition, Path]:
+    return {
+        rendition: path.with_name(path.name + ".part") for rendition, path in output_paths.items()
+    }
+
+
+def _finish(
+    process: subprocess.Popen, partial_paths: dict[Rendition, Path], source: str
+) -> None:
+    """Waits for ffmpeg, then moves its outputs into place, or removes them if it failed."""
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        for path in partial_paths.values():
+            path.unlink(missing_ok=True)
+        raise RuntimeError(
+            f"ffmpeg could not encode {source}: {stderr.decode(errors='replace').strip()}"
+        )
+    # Renamed only once every rendition is complete, so readers never see a partial file
+    for path in partial_paths.values():
+        os.replace(path, path.with_name(path.name.removesuffix(".part")))
+
+
+def output_paths(
+    output_dir: str | Path, stem: str, renditions: Sequence[Rendition] = DEFAULT_RENDITIONS
+) -> dict[Rendition, Path]:
+    """Where `encode_file` and `encode_stream` write each rendition."""
+    output_dir = Path(output_dir)
+    return {rendition: output_dir / rendition.file_name(stem) for rendition in renditions}
+
+
+def encode_file(
+    audio_path: str | Path,
+    output_dir: str | Path | None = None,
+    stem: str | None = None,
+    renditions: Sequence[Rendition] = DEFAULT_RENDITIONS,
+    mastering: Mastering | None = None,
+    threads: int = 1,
+) -> dict[Rendition, Path]:
+    """
+    Masters a song and writes every rendition in one ffmpeg pass.
+
+    The file is decoded, trimmed and normalized once, and the result is split to one
+    encoder per rendition. Trimming the end makes ffmpeg hold the decoded song in
+    memory before it encodes (see `Mastering`).
+
+    Args:
+        audio_path: The song, e.g. DiffRhythm's WAV.
+        output_dir: Where to write the renditions. Defaults to the song's directory.
+        stem: File name stem of the renditions. Defaults to the song's.
+        renditions: Codecs and bitrates to write.
+        mastering: Loudness and trimming settings. Defaults to `Mastering()`.
+        threads: Threads per encoder.
+
+    Returns:
+        The path of each rendition.
+
+    Raises:
+        RuntimeError: If ffmpeg fails; no rendition is left behind.
+    """
+    audio_path = Path(audio_path)
+    paths = output_paths(output_dir or audio_path.parent, stem or audio_path.stem, renditions)
+    partial_paths = _partial_paths(paths)
+    next(iter(paths.values())).parent.mkdir(parents=True, exist_ok=True)
+    cmd = _command(
+        ["-nostdin", "-i", str(audio_path)], partial_paths, mastering or Mastering(), threads
+    )
+    with telemetry.span("music.postprocess", renditions=len(paths), source="file"):
+        process = subprocess.Popen(cmd, stderr=subprocess.PIPE)
+        _finish(process, partial_paths, str(audio_path))
+    return paths
+
+
+def encode_stream(
+    chunks: Iterable[AudioChunk],
+    output_dir: str | Path,
+    stem: str,
+    renditions: Sequence[Rendition] = DEFAULT_RENDITIONS,
+    mastering: Mastering | None = None,
+    threads: int = 1,
+) -> dict[Rendition, Path]:
+    """
+    Masters and encodes a song while it is being decoded, without writing a WAV.
+
+    Each chunk, e.g. from `DiffRhythmWorker.stream_music`, is piped to ffmpeg as soon as
+    it arrives, so encoding overlaps decoding. Trailing silence is trimmed here rather
+    than in ffmpeg (see `Mastering.trim_end`), so memory holds one chunk plus any run of
+    silence not yet known to be the end.
+
+    Args:
+        chunks: The song's decoded chunks, in order.
+        output_dir: Where to write the renditions.
+        stem: File name stem of the renditions.
+        renditions: Codecs and bitrates to write.
+        mastering: Loudness and trimming settings. Defaults to `Mastering()`.
+        threads: Threads per encoder.
+
+    Returns:
+        The path of each rendition.
+
+    Raises:
+        RuntimeError: If ffmpeg fails or there are no chunks; no rendition is left behind.
+    """
+    paths = output_paths(output_dir, stem, renditions)
+    partial_paths = _partial_paths(paths)
+    mastering = mastering or Mastering()
+    process: subprocess.Popen | None = None
+    stdin: IO[bytes] | None = None
+    with telemetry.span("music.postprocess", renditions=len(paths), source="stream"):
+        try:
+            for chunk in mastering.trim_end(chunks):
+                if process is None:
+                    # The format is only known once the first chunk arrives
+                    Path(output_dir).mkdir(parents=True, exist_ok=True)
+                    input_args = [
+                        "-f",
+                        "s16le",
+                        "-ar",
+                        str(chunk.sample_rate),
+                        "-ac",
+                        str(chunk.pcm.shape[1]),
+                        "-i",
+                        "pipe:0",
+                    ]
+                    cmd = _command(input_args, partial_paths, mastering, threads, trim_end=False)
+                    process = subprocess.Popen(
+                        cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE
+                    )
+                    stdin = process.stdin
+                assert stdin is not None
+                try:
+                    stdin.write(chunk.pcm.astype("<i2", copy=False).tobytes())
+                except BrokenPipeError:
+                    break  # ffmpeg exited; `_finish` reports why
+        except BaseException:
+            if process is not None:
+                process.kill()
+                process.communicate()
+                for path in partial_paths.values():
+                    path.unlink(missing_ok=True)
+            raise
+        if process is None:
+            raise RuntimeError(f"No audio to encode for {stem}.")
+        assert stdin is not None
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+        process.stdin = None  # Closed above; keeps `communicate` from flushing it again
+        _finish(process, partial_paths, stem)
+    return paths
+
+
+class PostProcessor:
+    """
+    Masters and encodes finished songs in the background, several at a time.
+
+    Each song is encoded by its own ffmpeg process, driven from a small thread pool, so
+    up to `processes` songs encode in parallel on separate cores while the caller moves
+    on to the next song. CPU cores are split evenly between the processes.
+    """
+
+    def __init__(
+        self,
+        renditions: Sequence[Rendition] = DEFAULT_RENDITIONS,
+        mastering: Mastering | None = None,
+        processes: int | None = None,
+    ):
+        """
+        Args:
+            renditions: Codecs and bitrates to write for every song.
+            mastering: Loudness and trimming settings. Defaults to `Mastering()`.
+            processes: Songs encoded at once. Defaults to the CPU count.
+        """
+        if not renditions:
+            raise ValueError("renditions must not be empty.")
+        self.renditions = tuple(renditions)
+        self.mastering = mastering or Mastering()
+        cpus = os.cpu_count() or 1
+        self.processes = max(1, processes or cpus)
+        self.threads = max(1, cpus // self.processes)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.processes, thread_name_prefix="postprocess"
+                )
+            return self._executor
+
+    def output_paths(self, output_dir: str | Path, stem: str) -> dict[Rendition, Path]:
+        return output_paths(output_dir, stem, self.renditions)
+
+    def submit(
+        self,
+        audio_path: str | Path,
+        output_dir: str | Path | None = None,
+        stem: str | None = None,
+    ) -> Future[dict[Rendition, Path]]:
+        """Queues a song file for encoding. See `encode_file`."""
+        return self._pool().submit(
+            encode_file,
+            audio_path,
+            output_dir,
+            stem,
+            self.renditions,
+            self.mastering,
+            self.threads,
+        )
+
+    def submit_stream(
+        self, chunks: Iterable[AudioChunk], output_dir: str | Path, stem: str
+    ) -> Future[dict[Rendition, Path]]:
+        """Encodes streamed chunks in the background, pulling them from `chunks`. See `encode_stream`."""
+        return self._pool().submit(
+            encode_stream,
+            chunks,
+            output_dir,
+            stem,
+            self.renditions,
+            self.mastering,
+            self.threads,
+        )
+
+    def process(
+        self,
+        audio_path: str | Path,
+        output_dir: str | Path | None = None,
+        stem: str | None = None,
+    ) -> dict[Rendition, Path]:
+        """Encodes a song file in the pool and waits for it."""
+        return self.submit(audio_path, output_dir, stem).result()
+
+    def process_many(self, audio_paths: Sequence[str | Path]) -> list[dict[Rendition, Path] | Exception]:
+        """
+        Encodes many song files next to themselves.
+
+        Returns:
+            Per file, in order, its renditions or the error that stopped it.
+        """
+        futures = [self.submit(path) for path in audio_paths]
+        results: list[dict[Rendition, Path] | Exception] = []
+        for path, future in zip(audio_paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Encoding {path} failed: {e}")
+                results.append(e)
+        return results
+
+    def close(self) -> None:
+        """Waits for queued songs, then stops the pool."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def __enter__(self) -> "PostProcessor":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
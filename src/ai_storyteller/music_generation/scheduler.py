@@ -0,0 +1,402 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from .jobs import MusicJob, validate_job
+
+DEFAULT_MEMORY_PER_WORKER_BYTES = 8 * 1024**3
+DEFAULT_THREADS_PER_WORKER = 4
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+
+    @property
+    def is_final(self) -> bool:
+        return self not in (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+class JobNotFinishedError(RuntimeError):
+    """Raised when asking for the result of a job that failed, was cancelled or timed out."""
+
+
+@dataclass
+class ScheduledJob:
+    """A `MusicJob` submitted to a `MusicJobManager`, with its scheduling state."""
+
+    job: MusicJob
+    user: str
+    priority: int
+    timeout: float | None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    path: Path | None = None
+    error: str | None = None
+    slot: int | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def finish(
+        self, status: JobStatus, path: Path | None = None, error: str | None = None
+    ) -> None:
+        self.status = status
+        self.path = path
+        self.error = error
+        self.finished_at = time.time()
+        self.done.set()
+
+
+class FairQueue:
+    """
+    Priority queue that round-robins between users within a priority level.
+
+    Higher `priority` values run first. Among jobs of equal priority, each user with
+    queued jobs gets one job started before any user gets a second one.
+    """
+
+    def __init__(self) -> None:
+        self._levels: dict[int, OrderedDict[str, deque[ScheduledJob]]] = {}
+
+    def __len__(self) -> int:
+        return sum(
+            len(jobs) for users in self._levels.values() for jobs in users.values()
+        )
+
+    def push(self, scheduled: ScheduledJob) -> None:
+        users = self._levels.setdefault(scheduled.priority, OrderedDict())
+        users.setdefault(scheduled.user, deque()).append(scheduled)
+
+    def pop(self) -> ScheduledJob:
+        priority = max(self._levels)
+        users = self._levels[priority]
+        user, jobs = users.popitem(last=False)
+        scheduled = jobs.popleft()
+        if jobs:
+            users[user] = jobs  # Back of the line for this user's next job
+        if not users:
+            del self._levels[priority]
+        return scheduled
+
+    def position(self, scheduled: ScheduledJob) -> int | None:
+        """
+        How many queued jobs `pop` returns before this one, or None if it is not queued.
+
+        Users take turns in their current order, so a user's k-th job waits for up to
+        k jobs of every other user at its priority, plus all higher-priority jobs.
+        """
+        users = self._levels.get(scheduled.priority, {})
+        jobs = users.get(scheduled.user)
+        if jobs is None or scheduled not in jobs:
+            return None
+        depth = jobs.index(scheduled)
+        ahead = sum(
+            len(jobs)
+            for priority, others in self._levels.items()
+            if priority > scheduled.priority
+            for jobs in others.values()
+        )
+        before = True  # Users ahead of this one in the current round
+        for user, jobs in users.items():
+            if user == scheduled.user:
+                before = False
+                ahead += depth
+                continue
+            ahead += min(len(jobs), depth + before)
+        return ahead
+
+    def remove(self, scheduled: ScheduledJob) -> bool:
+        users = self._levels.get(scheduled.priority, {})
+        jobs = users.get(scheduled.user)
+        if jobs is None or scheduled not in jobs:
+            return False
+        jobs.remove(scheduled)
+        if not jobs:
+            del users[scheduled.user]
+        if not users:
+            del self._levels[scheduled.priority]
+        return True
+
+
+def default_max_workers(
+    memory_per_worker_bytes: int = DEFAULT_MEMORY_PER_WORKER_BYTES,
+    threads_per_worker: int = DEFAULT_THREADS_PER_WORKER,
+) -> int:
+    """Number of concurrent renders that fit in the available cores and physical RAM."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    try:
+        ram = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        ram = memory_per_worker_bytes
+    return max(1, min(cores // threads_per_worker, ram // memory_per_worker_bytes))
+
+
+class MusicJobManager:
+    """
+    Asyncio job manager for music generation.
+
+    Jobs are queued with `submit` and run on a bounded pool of model instances, one per
+    worker slot, each rendering in its own thread so the event loop is never blocked.
+    Cancelling or timing out a running job kills that slot's model (via its `terminate`
+    method) and the slot builds a fresh one for its next job.
+
+    Finished jobs stay available to `get`, `status` and `result` for `finished_ttl`
+    seconds, and only the `max_finished_jobs` most recent ones are kept, so a
+    long-running server's job table stays bounded.
+
+    Example:
+        async with MusicJobManager(lambda: DiffRhythmWorker(cache=MusicCache())) as manager:
+            job_id = await manager.submit(MusicJob("song.lrc", "output"), user="alice")
+            path = await manager.result(job_id)
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], Any],
+        max_workers: int | None = None,
+        default_timeout: float | None = None,
+        memory_per_worker_bytes: int = DEFAULT_MEMORY_PER_WORKER_BYTES,
+        threads_per_worker: int = DEFAULT_THREADS_PER_WORKER,
+        max_queued_jobs: int | None = None,
+        finished_ttl: float | None = 3600.0,
+        max_finished_jobs: int = 1000,
+    ):
+        """
+        Args:
+            model_factory: Builds a model with a `generate_music` method, such as
+                `DiffRhythm` or `DiffRhythmWorker`. Called once per worker slot, lazily.
+            max_workers: Concurrent renders. Defaults to what cores and RAM allow.
+            default_timeout: Seconds a job may run before it is killed. None means no limit.
+            memory_per_worker_bytes: RAM budgeted per render when sizing the pool.
+            threads_per_worker: Cores budgeted per render when sizing the pool.
+            max_queued_jobs: Reject submissions beyond this many queued jobs. None means no limit.
+            finished_ttl: Seconds a finished job is kept after it ends. None keeps it
+                until `max_finished_jobs` pushes it out.
+            max_finished_jobs: Most finished jobs kept.
+        """
+        self.model_factory = model_factory
+        self.max_workers = max_workers or default_max_workers(
+            memory_per_worker_bytes, threads_per_worker
+        )
+        self.default_timeout = default_timeout
+        self.max_queued_jobs = max_queued_jobs
+        self.finished_ttl = finished_ttl
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: dict[str, ScheduledJob] = {}
+        self._queue = FairQueue()
+        self._models: list[Any] = [None] * self.max_workers
+        self._workers: list[asyncio.Task] = []
+        self._wakeup: asyncio.Condition | None = None
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._wakeup = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(slot), name=f"music-worker-{slot}")
+            for slot in range(self.max_workers)
+        ]
+        print(f"Music job manager started with {self.max_workers} worker slot(s)")
+
+    async def stop(self) -> None:
+        """Stops the worker slots, cancelling queued jobs and killing running ones."""
+        for scheduled in self._jobs.values():
+            if not scheduled.status.is_final:
+                await self.cancel(scheduled.id)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for slot, model in enumerate(self._models):
+            if model is not None and hasattr(model, "stop"):
+                await asyncio.to_thread(model.stop)
+            self._models[slot] = None
+
+    async def __aenter__(self) -> "MusicJobManager":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.stop()
+
+    async def submit(
+        self,
+        job: MusicJob,
+        user: str = "anonymous",
+        priority: int = 0,
+        timeout: float | None = None,
+    ) -> str:
+        """
+        Queues a job and returns its id immediately.
+
+        Args:
+            job: The song to generate.
+            user: Who submitted it; users take turns within a priority level.
+            priority: Higher values run first.
+            timeout: Seconds the job may run. Defaults to the manager's `default_timeout`.
+
+        Raises:
+            ValueError: If the job is invalid or the queue is full.
+        """
+        if error := validate_job(job):
+            raise ValueError(error)
+        if self.max_queued_jobs is not None and len(self._queue) >= self.max_queued_jobs:
+            raise ValueError("Music generation queue is full, try again later.")
+        await self.start()
+        self._forget_finished()
+        scheduled = ScheduledJob(
+            job,
+            user,
+            priority,
+            timeout if timeout is not None else self.default_timeout,
+        )
+        self._jobs[scheduled.id] = scheduled
+        assert self._wakeup is not None
+        async with self._wakeup:
+            self._queue.push(scheduled)
+            self._wakeup.notify()
+        return scheduled.id
+
+    def _forget_finished(self) -> None:
+        """Drops finished jobs past their TTL, then the oldest beyond `max_finished_jobs`."""
+        finished = sorted(
+            (job for job in self._jobs.values() if job.status.is_final),
+            key=lambda job: job.finished_at or 0.0,
+        )
+        expired = len(finished) - self.max_finished_jobs
+        if self.finished_ttl is not None:
+            cutoff = time.time() - self.finished_ttl
+            expired = max(expired, sum((job.finished_at or 0.0) < cutoff for job in finished))
+        for job in finished[: max(expired, 0)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> ScheduledJob:
+        try:
+            return self._jobs[job_id]
+        except KeyError:
+            raise KeyError(f"Unknown music job: {job_id}") from None
+
+    def status(self, job_id: str) -> JobStatus:
+        return self.get(job_id).status
+
+    def queue_position(self, job_id: str) -> int | None:
+        """
+        Number of jobs that start before a queued job, or None if it is not queued.
+
+        Follows the fair queue's order; jobs submitted later at a higher priority, or
+        by users without queued jobs, can still move ahead of it.
+        """
+        return self._queue.position(self.get(job_id))
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns False if it had already finished."""
+        scheduled = self.get(job_id)
+        if scheduled.status is JobStatus.QUEUED:
+            assert self._wakeup is not None
+            async with self._wakeup:
+                self._queue.remove(scheduled)
+            scheduled.finish(JobStatus.CANCELLED, error="Cancelled before it started")
+            return True
+        if scheduled.status is JobStatus.RUNNING:
+            scheduled.finish(JobStatus.CANCELLED, error="Cancelled while running")
+            await self._kill_slot(scheduled.slot)
+            return True
+        return False
+
+    async def result(self, job_id: str, timeout: float | None = None) -> Path:
+        """
+        Waits for a job and returns the generated file.
+
+        Raises:
+            JobNotFinishedError: If the job failed, was cancelled or timed out.
+        """
+        scheduled = self.get(job_id)
+        await asyncio.wait_for(scheduled.done.wait(), timeout)
+        if scheduled.status is not JobStatus.SUCCEEDED or scheduled.path is None:
+            raise JobNotFinishedError(
+                f"Music job {job_id} {scheduled.status.value}: {scheduled.error}"
+            )
+        return scheduled.path
+
+    async def _kill_slot(self, slot: int | None) -> None:
+        if slot is None:
+            return
+        model = self._models[slot]
+        self._models[slot] = None  # The slot builds a fresh model for its next job
+        if model is not None and hasattr(model, "terminate"):
+            await asyncio.to_thread(model.terminate)
+            if hasattr(model, "stop"):
+                # Reap the killed process and close its pipe, so kills leave no zombies
+                await asyncio.to_thread(model.stop, 1.0)
+
+    async def _worker_loop(self, slot: int) -> None:
+        assert self._wakeup is not None
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: len(self._queue) > 0)
+                scheduled = self._queue.pop()
+
+            scheduled.status = JobStatus.RUNNING
+            scheduled.started_at = time.time()
+            scheduled.slot = slot
+            try:
+                if self._models[slot] is None:
+                    self._models[slot] = await asyncio.to_thread(self.model_factory)
+                path = await asyncio.wait_for(
+                    asyncio.to_thread(self._run, self._models[slot], scheduled.job),
+                    scheduled.timeout,
+                )
+            except asyncio.TimeoutError:
+                if not scheduled.status.is_final:
+                    scheduled.finish(
+                        JobStatus.TIMED_OUT,
+                        error=f"Timed out after {scheduled.timeout}s",
+                    )
+                    await self._kill_slot(slot)
+                continue
+            except Exception as e:
+                if not scheduled.status.is_final:
+                    scheduled.finish(JobStatus.FAILED, error=f"{type(e).__name__}: {e}")
+                continue
+
+            if scheduled.status.is_final:  # Cancelled while running
+                continue
+            if path is None:
+                scheduled.finish(JobStatus.FAILED, error="Music generation failed.")
+            else:
+                scheduled.finish(JobStatus.SUCCEEDED, path=Path(path))
+
+    @staticmethod
+    def _run(model: Any, job: MusicJob) -> Path | None:
+        kwargs: dict[str, Any] = {
+            "ref_prompt": job.ref_prompt,
+            "lrc_path": job.lrc_path,
+            "audio_length": job.audio_length,
+            "ref_audio_path": job.ref_audio_path,
+            "output_dir": job.output_dir,
+            "output_file_name": job.output_file_name,
+            "chunked": job.chunked,
+            "repo_id": job.repo_id,
+        }
+        if job.seed is not None:
+            kwargs["seed"] = job.seed
+        if job.lrc is not None:  # Takes precedence over lrc_path
+            kwargs["lrc"] = job.lrc
+        return model.generate_music(**kwargs)
+
@@ -0,0 +1,118 @@
+import wave
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+@dataclass
+class AudioChunk:
+    """A decoded piece of a song, in playback order."""
+
+    pcm: "np.ndarray"  # int16, shaped [samples, channels]
+    sample_rate: int
+    start_sample: int  # Offset of the first sample within the song
+    is_last: bool = False
+
+    @property
+    def duration(self) -> float:
+        return self.pcm.shape[0] / self.sample_rate
+
+
+def chunk_spans(
+    total_frames: int, chunk_size: int = 128, overlap: int = 32
+) -> Iterator[tuple[int, int, int, int]]:
+    """
+    Splits a latent sequence into overlapping decode windows, like DiffRhythm's chunked decoding.
+
+    Yields, per window, `(frame_start, frame_end, keep_start, keep_end)`: the latent frames
+    to decode and the frame range of the decoded audio to keep. Kept ranges are contiguous
+    and non-overlapping, so they can be emitted as soon as each window is decoded.
+    """
+    if total_frames <= chunk_size:
+        yield 0, total_frames, 0, total_frames
+        return
+
+    hop = chunk_size - overlap
+    starts = list(range(0, total_frames - chunk_size + 1, hop))
+    if starts[-1] + chunk_size != total_frames:
+        starts.append(total_frames - chunk_size)  # Final window is aligned to the end
+
+    half_overlap = overlap // 2
+    kept_until = 0
+    for i, start in enumerate(starts):
+        end = start + chunk_size
+        keep_end = total_frames if i == len(starts) - 1 else end - half_overlap
+        yield start, end, kept_until, keep_end
+        kept_until = keep_end
+
+
+def record_wav(
+    chunks: Iterable[AudioChunk], output_path: str | Path
+) -> Iterator[AudioChunk]:
+    """
+    Passes chunks through while writing them to a WAV file, e.g. to save a song as it plays.
+
+    The file is complete once the chunks are exhausted. If the consumer stops early, the
+    partial file is removed.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    complete = False
+    try:
+        with wave.open(str(output_path), "wb") as f:
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    f.setnchannels(chunk.pcm.shape[1])
+                    f.setsampwidth(2)
+                    f.setframerate(chunk.sample_rate)
+                f.writeframes(chunk.pcm.tobytes())
+                yield chunk
+        complete = True
+    finally:
+        if not complete:
+            output_path.unlink(missing_ok=True)
+
+
+def write_wav(
+    chunks: Iterable[AudioChunk], output_path: str | Path
+) -> Path:
+    """Writes streamed chunks to a WAV file as they arrive, without holding the whole song."""
+    for _ in record_wav(chunks, output_path):
+        pass
+    return Path(output_path)
+
+
+def read_wav_chunks(path: str | Path, seconds: float = 5.0) -> Iterator[AudioChunk]:
+    """Reads a 16-bit PCM WAV file `seconds` at a time, e.g. to stream a cached song."""
+    import numpy as np
+
+    with wave.open(str(path), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path} is not 16-bit PCM.")
+        channels = f.getnchannels()
+        sample_rate = f.getframerate()
+        total = f.getnframes()
+        window = max(1, round(seconds * sample_rate))
+        start = 0
+        while start < total:
+            pcm = np.frombuffer(f.readframes(window), dtype="<i2").reshape(-1, channels)
+            if not len(pcm):
+                break
+            yield AudioChunk(pcm, sample_rate, start, is_last=start + len(pcm) >= total)
+            start += len(pcm)
+
+
+def read_wav(path: str | Path) -> tuple["np.ndarray", int]:
+    """Reads a 16-bit PCM WAV file. Returns int16 audio shaped [samples, channels] and its sample rate."""
+    import numpy as np
+
+    with wave.open(str(path), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path} is not 16-bit PCM.")
+        frames = f.readframes(f.getnframes())
+        pcm = np.frombuffer(frames, dtype="<i2").reshape(-1, f.getnchannels())
+        return pcm, f.getframerate()
@@ -0,0 +1,112 @@
+import os
+import re
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from ..config.settings import settings
+from .cache import hash_file
+
+if TYPE_CHECKING:
+    import numpy as np
+
+AUDIO_PATTERNS = ("*.mp3", "*.wav", "*.flac", "*.ogg", "*.m4a")
+
+
+class StyleEmbeddingStore:
+    """
+    Persistent store of reference-audio style embeddings.
+
+    Embeddings are saved as `.npy` files under `<cache_dir>/<model id>/<audio sha256>.npy`
+    and memory-mapped on read, so reusing a reference track skips decoding, resampling
+    and running the style encoder.
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None):
+        """
+        Args:
+            cache_dir: Where to store embeddings. Defaults to `settings.cache_dir / "style_embeddings"`.
+        """
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir else settings.cache_dir / "style_embeddings"
+        ).resolve()
+        # (path, size, mtime) -> sha256, so unchanged files are only hashed once per process
+        self._hashes: dict[tuple[str, int, int], str] = {}
+
+    def audio_hash(self, audio_path: str | Path) -> str:
+        audio_path = Path(audio_path).resolve()
+        stat = audio_path.stat()
+        key = (str(audio_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = hash_file(audio_path)
+        return self._hashes[key]
+
+    def path_for(self, audio_path: str | Path, model_id: str) -> Path:
+        model_dir = re.sub(r"[^\w.-]+", "--", model_id)
+        return self.cache_dir / model_dir / f"{self.audio_hash(audio_path)}.npy"
+
+    def get(self, audio_path: str | Path, model_id: str) -> "np.ndarray | None":
+        """Returns the memory-mapped embedding for `audio_path`, or None if not stored."""
+        import numpy as np
+
+        path = self.path_for(audio_path, model_id)
+        if not path.is_file():
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def put(
+        self, audio_path: str | Path, model_id: str, embedding: "np.ndarray"
+    ) -> Path:
+        import numpy as np
+
+        path = self.path_for(audio_path, model_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, embedding)
+        os.replace(tmp_path, path)
+        return path
+
+    def get_or_compute(
+        self,
+        audio_path: str | Path,
+        model_id: str,
+        compute: Callable[[Path], "np.ndarray"],
+    ) -> "np.ndarray":
+        """Returns the stored embedding, computing and storing it with `compute` on a miss."""
+        embedding = self.get(audio_path, model_id)
+        if embedding is None:
+            embedding = compute(Path(audio_path))
+            self.put(audio_path, model_id, embedding)
+        return embedding
+
+    def precompute(
+        self,
+        folder: str | Path,
+        model_id: str,
+        compute: Callable[[Path], "np.ndarray"],
+        patterns: Iterable[str] = AUDIO_PATTERNS,
+    ) -> list[Path]:
+        """
+        Computes and stores embeddings for every audio file in a folder.
+
+        Args:
+            folder: Folder to scan, e.g. data/music_generation/music.
+            model_id: Style encoder the embeddings belong to.
+            compute: Function returning the embedding for an audio file.
+            patterns: Glob patterns of audio files to include.
+
+        Returns:
+            The audio files that now have a stored embedding.
+        """
+        audio_paths = sorted(
+            {path for pattern in patterns for path in Path(folder).glob(pattern)}
+        )
+        done = []
+        for audio_path in audio_paths:
+            try:
+                self.get_or_compute(audio_path, model_id, compute)
+                done.append(audio_path)
+            except Exception as e:
+                print(f"Warning: Could not compute style embedding for {audio_path}: {e}")
+        print(f"Style embeddings ready for {len(done)}/{len(audio_paths)} files in {folder}")
+        return done
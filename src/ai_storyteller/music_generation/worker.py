@@ -0,0 +1,794 @@
+import contextvars
+import multiprocessing as mp
+import queue
+import threading
+import time
+import traceback
+from collections.abc import Iterator, Sequence
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Literal
+
+from ..config.settings import settings
+from ..utils.lrc import LrcValidationError, LyricSheet
+from ..utils.telemetry import telemetry
+from ..utils.workers import (
+    ModelPool,
+    WorkerCrashedError,
+    pin_current_process,
+    split_cores,
+    worker_devices,
+)
+from .cache import MusicCache
+from .engine import DEFAULT_REPO_ID, DiffRhythmEngine
+from .jobs import (
+    MusicJob,
+    MusicJobResult,
+    group_jobs,
+    load_lyrics,
+    summarize_results,
+    validate_job,
+)
+from .planner import (
+    DEFAULT_CROSSFADE,
+    MemoryBudgetError,
+    check_lyrics,
+    plan_generation,
+)
+from .streaming import AudioChunk, read_wav_chunks, record_wav
+from .style_cache import StyleEmbeddingStore
+
+
+def _worker_main(
+    conn: Connection,
+    package_path: str,
+    repo_id: str,
+    audio_length: Literal[95, 285],
+    device: str | None,
+    max_resident_models: int,
+    style_store: StyleEmbeddingStore | None,
+    profile_stages: tuple[str, ...] = (),
+    profile_dir: str | None = None,
+    cpu_cores: tuple[int, ...] | None = None,
+    num_threads: int | None = None,
+    share_weights: bool = False,
+) -> None:
+    """Entry point of the worker process: load, warm up, then serve requests until shutdown."""
+    # Before torch is imported, so its thread pools are sized for these cores
+    pin_current_process(cpu_cores, num_threads)
+    engines: dict[tuple[str, int], DiffRhythmEngine] = {}
+    telemetry.configure(profile_stages=profile_stages, profile_dir=profile_dir)
+
+    def reply(message: dict[str, Any]) -> None:
+        # Spans finished since the last reply travel with it to the parent
+        conn.send({**message, "spans": telemetry.drain()})
+
+    def get_engine(repo_id: str, audio_length: Literal[95, 285]) -> DiffRhythmEngine:
+        key = (repo_id, audio_length)
+        if key not in engines:
+            while len(engines) >= max_resident_models:
+                # Drop the oldest model before loading another so RAM stays bounded
+                del engines[next(iter(engines))]
+            engines[key] = DiffRhythmEngine(
+                package_path, repo_id, audio_length, device, style_store, share_weights
+            )
+        engine = engines.pop(key)
+        engines[key] = engine  # Move to the end: most recently used
+        return engine
+
+    def handle(op: str, request: dict[str, Any]) -> Any:
+        if op == "generate":
+            engine = get_engine(request.pop("repo_id"), request.pop("audio_length"))
+            return engine.generate(**request)
+        if op == "generate_batch":
+            engine = get_engine(request.pop("repo_id"), request.pop("audio_length"))
+            return [
+                {"path": outcome}
+                if isinstance(outcome, Path)
+                else {"error": f"{type(outcome).__name__}: {outcome}"}
+                for outcome in engine.generate_batch(**request)
+            ]
+        if op == "generate_planned":
+            repo_id = request.pop("repo_id")
+            engine = get_engine(repo_id, request["plan"].audio_length)
+            return engine.generate_planned(
+                **request, engine_for=lambda length: get_engine(repo_id, length)
+            )
+        if op == "stream":
+            engine = get_engine(request.pop("repo_id"), request.pop("audio_length"))
+            for chunk in engine.stream(**request):
+                conn.send({"ok": True, "chunk": chunk})
+            return None  # The final reply marks the end of the stream
+        if op == "precompute_styles":
+            return next(reversed(engines.values())).precompute_styles(**request)
+        if op == "ping":
+            return "pong"
+        raise ValueError(f"Unknown worker operation: {op}")
+
+    try:
+        started = time.perf_counter()
+        with telemetry.span("music.warm_up", repo_id=repo_id, audio_length=audio_length):
+            get_engine(repo_id, audio_length).warm_up()
+        reply({"ok": True, "result": f"warm-up took {time.perf_counter() - started:.2f}s"})
+    except Exception as e:
+        reply({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        return
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        op = request.pop("op")
+        if op == "shutdown":
+            break
+        try:
+            with telemetry.span(f"worker.{op}", parent=request.pop("trace_parent", None)):
+                result = handle(op, request)
+            reply({"ok": True, "result": result})
+        except Exception as e:
+            reply(
+                {
+                    "ok": False,
+                    "error": f"{type(e).__name__}: {e}",
+                    "traceback": traceback.format_exc(),
+                }
+            )
+    conn.close()
+
+
+class DiffRhythmWorker:
+    """
+    Long-lived DiffRhythm worker process that keeps the models resident.
+
+    The worker loads and warms up the model once on start, then serves generation
+    requests over a local pipe, so every request after the first only pays for
+    inference. If the process crashes it is restarted and the request retried.
+    Implements the same `generate_music` signature as `DiffRhythm`.
+
+    Several workers can share a CPU host: `worker_pool` starts one per core subset,
+    each pinned with its own torch thread count, with weights shared between them.
+    """
+
+    def __init__(
+        self,
+        package_path: str | Path | None = None,
+        repo_id: str = DEFAULT_REPO_ID,
+        audio_length: Literal[95, 285] = 95,
+        device: str | None = None,
+        max_resident_models: int = 1,
+        max_restarts: int = 3,
+        startup_timeout: float | None = None,
+        autostart: bool = True,
+        cache: MusicCache | None = None,
+        style_store: StyleEmbeddingStore | None = None,
+        cpu_cores: Sequence[int] | None = None,
+        num_threads: int | None = None,
+        share_weights: bool = False,
+        name: str = "diffrhythm-worker",
+    ):
+        """
+        Args:
+            package_path: Root directory of the DiffRhythm code. Defaults to vendor/DiffRhythm.
+            repo_id: Model repository ID loaded and warmed up on start.
+            audio_length: Song length the warm-up model is loaded for, 95 or 285.
+            device: Torch device for the worker. If None, the worker picks one.
+            max_resident_models: How many (repo_id, audio_length) models to keep loaded.
+            max_restarts: How many times in a row to restart a crashed worker before giving
+                up. A request the worker answers resets the count.
+            startup_timeout: Seconds to wait for load and warm-up. None waits forever.
+            autostart: Whether to start the worker process immediately rather than on the first request.
+            cache: Optional cache of generated songs, checked before sampling.
+            style_store: Optional persistent store of reference-audio style embeddings.
+            cpu_cores: CPU cores the worker process may run on. None leaves it unpinned.
+            num_threads: Torch threads in the worker. Defaults to one per core in `cpu_cores`.
+            share_weights: On CPU, memory-map the weights from a file shared with other
+                workers instead of keeping a private copy (see `share_weights`).
+            name: Process name, shown in logs and process listings.
+        """
+        self.package_path = (
+            Path(package_path).resolve()
+            if package_path
+            else settings.base_dir / "vendor" / "DiffRhythm"
+        )
+        self.repo_id = repo_id
+        self.audio_length = audio_length
+        self.device = device
+        self.max_resident_models = max_resident_models
+        self.max_restarts = max_restarts
+        self.startup_timeout = startup_timeout
+        self.cache = cache
+        self.style_store = style_store
+        self.cpu_cores = tuple(cpu_cores) if cpu_cores else None
+        self.num_threads = num_threads
+        self.share_weights = share_weights
+        self.name = name
+        self.restarts = 0
+        self._terminated = False
+        self._process: Any = None
+        self._conn: Connection | None = None
+        # Held for each request; re-entrant because restarting a crashed worker stops it
+        self._lock = threading.RLock()
+        if autostart:
+            self.start()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        """Starts the worker process and waits until the model is loaded and warmed up."""
+        if self.is_alive:
+            return
+        self._terminated = False
+        ctx = mp.get_context("spawn")  # Fresh interpreter: no inherited CUDA/fork state
+        parent_conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                str(self.package_path),
+                self.repo_id,
+                self.audio_length,
+                self.device,
+                self.max_resident_models,
+                self.style_store,
+                telemetry.profile_stages,
+                str(telemetry.profile_dir),
+                self.cpu_cores,
+                self.num_threads,
+                self.share_weights,
+            ),
+            name=self.name,
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        cores = f" on cores {list(self.cpu_cores)}" if self.cpu_cores else ""
+        print(f"Started {self.name} (pid {self._process.pid}){cores}, warming up...")
+        reply = self._receive(self.startup_timeout)
+        if not reply["ok"]:
+            self.stop()
+            raise RuntimeError(f"DiffRhythm worker failed to start: {reply['error']}")
+        print(f"DiffRhythm worker ready: {reply['result']}")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Asks the worker to shut down once the request in flight is done, killing it if it
+        does not exit in time.
+        """
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send({"op": "shutdown"})
+                except (BrokenPipeError, OSError):
+                    pass
+                self._conn.close()
+                self._conn = None
+            if self._process is not None:
+                self._process.join(timeout)
+                if self._process.is_alive():
+                    self._process.kill()
+                    self._process.join()
+                self._process = None
+
+    def terminate(self) -> None:
+        """Kills the worker immediately, abandoning the request in flight without restarting."""
+        self._terminated = True
+        if self._process is not None:
+            self._process.kill()
+
+    def restart(self) -> None:
+        self.stop(timeout=1.0)
+        self.start()
+
+    def __enter__(self) -> "DiffRhythmWorker":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def _receive(self, timeout: float | None = None) -> dict[str, Any]:
+        """Waits for a reply, noticing if the worker process dies in the meantime."""
+        assert self._conn is not None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._conn.poll(1.0):
+            if not self._process.is_alive():
+                raise WorkerCrashedError(
+                    f"DiffRhythm worker exited with code {self._process.exitcode}"
+                )
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Timed out waiting for the DiffRhythm worker.")
+        try:
+            reply = self._conn.recv()
+        except EOFError as e:
+            raise WorkerCrashedError("DiffRhythm worker closed the pipe.") from e
+        telemetry.ingest(reply.pop("spans", ()))
+        return reply
+
+    def _send(self, op: str, **payload: Any) -> None:
+        if self._process is None and not self._terminated:
+            self.start()  # Not started yet (autostart=False) or stopped: start on demand
+        if not self.is_alive:
+            raise WorkerCrashedError("DiffRhythm worker is not running.")
+        assert self._conn is not None
+        self._conn.send({"op": op, "trace_parent": telemetry.current_span_id(), **payload})
+
+    def _recover(self, error: Exception) -> None:
+        """Restarts a crashed worker, re-raising once the restart budget is spent."""
+        if self._terminated or self.restarts >= self.max_restarts:
+            raise error
+        self.restarts += 1
+        print(f"Warning: {error} Restarting ({self.restarts}/{self.max_restarts})...")
+        self.restart()
+
+    def _request(self, op: str, **payload: Any) -> Any:
+        """Sends a request to the worker, restarting it and retrying if it crashed."""
+        with self._lock:
+            while True:
+                try:
+                    self._send(op, **payload)
+                    reply = self._receive()
+                    break
+                except (WorkerCrashedError, BrokenPipeError, OSError) as e:
+                    self._recover(e)
+            self.restarts = 0  # Only consecutive crashes count against the budget
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply["result"]
+
+    def _stream(self, op: str, **payload: Any) -> Iterator[Any]:
+        """
+        Sends a streaming request and yields chunks until the worker's final reply.
+
+        A pump thread owns the pipe while the worker produces the stream and queues the
+        chunks, so the worker is free for the next request as soon as it finishes, even
+        if this generator is abandoned without being closed.
+        """
+        replies: queue.Queue[tuple[str, Any]] = queue.Queue()
+        stopped = threading.Event()
+
+        def pump() -> None:
+            try:
+                with self._lock:
+                    while True:
+                        try:
+                            self._send(op, **payload)
+                            break
+                        except (WorkerCrashedError, BrokenPipeError, OSError) as e:
+                            self._recover(e)
+                    while True:
+                        reply = self._receive()
+                        if "chunk" not in reply:
+                            break
+                        if not stopped.is_set():  # The consumer stopped early: just drain
+                            replies.put(("chunk", reply["chunk"]))
+                    self.restarts = 0
+            except BaseException as e:
+                replies.put(("error", e))
+                return
+            replies.put(("done", reply))
+
+        # In this context, so the request is traced under the caller's span
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(pump,), name=f"{self.name}-stream", daemon=True
+        ).start()
+        try:
+            while True:
+                kind, value = replies.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    if not value["ok"]:
+                        raise RuntimeError(value["error"])
+                    return
+        finally:
+            stopped.set()
+
+    def generate_music(
+        self,
+        ref_prompt: str | None = None,
+        lrc_path: str | Path | None = None,
+        audio_length: Literal[95, 285] = 95,
+        ref_audio_path: str | Path | None = None,
+        output_dir: str | Path | None = None,
+        output_file_name: str = "output.wav",
+        chunked: bool | None = None,
+        repo_id: str = DEFAULT_REPO_ID,
+        seed: int | None = None,
+        lrc: str | LyricSheet | None = None,
+    ) -> Path | None:
+        """
+        Generates music with the resident model.
+
+        Args:
+             ref_prompt: The reference text prompt.
+             lrc_path: Path to the lyrics file.
+             audio_length: Audio length, 95 or 285.
+             ref_audio_path: Optional path to reference audio file. Ignored if ref_prompt is given.
+             output_dir: Directory to save output. Defaults to the DiffRhythm example output directory.
+             output_file_name: Name of the generated WAV file.
+             chunked: Whether to use chunked decoding. None decodes in full if the memory
+                 budget allows and otherwise in windows sized to fit (see `planner`).
+             repo_id: Model repository ID.
+             seed: Optional random seed for reproducible sampling.
+             lrc: Lyrics as text or a `LyricSheet`, used instead of reading `lrc_path`.
+
+        Returns:
+            The absolute path to the generated music file if successful, otherwise None.
+
+        Raises:
+            LrcValidationError: If the lyrics would not fit the song, before any sampling.
+        """
+        if lrc is None and not lrc_path:
+            raise ValueError("LRC path must be provided for music generation.")
+        if audio_length not in [95, 285]:
+            raise ValueError("audio_length must be either 95 or 285 seconds.")
+
+        if ref_prompt and ref_audio_path:
+            print("Both prompt and reference audio path provided, using prompt only.")
+            ref_audio_path = None
+
+        if output_dir:
+            effective_output_dir = Path(output_dir).resolve()
+        else:
+            effective_output_dir = self.package_path / "infer" / "example" / "output"
+
+        chunk_size = 128
+        if chunked is None:
+            chunked, chunk_size = self._plan_decode(audio_length)
+
+        try:
+            lrc = load_lyrics(lrc, lrc_path, audio_length)
+            cache_key = self._cache_key(
+                lrc, ref_prompt, ref_audio_path, audio_length, chunked, repo_id, seed
+            )
+            output_path = effective_output_dir / output_file_name
+            if cache_key and (cached_file := self.cache.get(cache_key, output_path)):  # type: ignore[union-attr]
+                print(f"Using cached song: {cached_file}")
+                return cached_file
+            output_path = self._request(
+                "generate",
+                output_path=output_path,
+                lrc=lrc,
+                ref_prompt=ref_prompt,
+                ref_audio_path=ref_audio_path,
+                chunked=chunked,
+                chunk_size=chunk_size,
+                seed=seed,
+                repo_id=repo_id,
+                audio_length=audio_length,
+            )
+        except LrcValidationError:
+            raise
+        except Exception as e:
+            print(f"Music generation via DiffRhythm worker failed: {e}")
+            return None
+
+        print(f"Successfully generated: {output_path}")
+        if cache_key:
+            self._remember(cache_key, output_path)
+        return Path(output_path)
+
+    def _plan_decode(self, audio_length: int) -> tuple[bool, int]:
+        """Picks chunked decoding and its window for the memory budget: (chunked, chunk_size)."""
+        try:
+            plan = plan_generation(audio_length, device=self.device, audio_lengths=[audio_length])
+        except MemoryBudgetError as e:
+            print(f"Warning: {e} Falling back to chunked decoding.")
+            return True, 128
+        print(f"Plan: {plan.describe()}")
+        return plan.chunked, plan.chunk_size
+
+    def generate_long_music(
+        self,
+        duration: float,
+        ref_prompt: str | None = None,
+        lrc_path: str | Path | None = None,
+        ref_audio_path: str | Path | None = None,
+        output_dir: str | Path | None = None,
+        output_file_name: str = "output.wav",
+        repo_id: str = DEFAULT_REPO_ID,
+        seed: int | None = None,
+        lrc: str | LyricSheet | None = None,
+        crossfade: float = DEFAULT_CROSSFADE,
+        budget_bytes: int | None = None,
+    ) -> Path | None:
+        """
+        Generates a song of any duration within the memory budget, e.g. a whole story soundtrack.
+
+        The song is planned with `plan_generation` and the plan printed before anything
+        runs. Songs longer than DiffRhythm's 95 or 285 s, or too big for the budget in
+        one piece, are rendered as overlapping segments and crossfaded.
+
+        Args:
+             duration: Seconds of audio wanted.
+             ref_prompt: The reference text prompt.
+             lrc_path: Path to the lyrics file, timed against the whole song.
+             ref_audio_path: Optional path to reference audio file. Ignored if ref_prompt is given.
+             output_dir: Directory to save output. Defaults to the DiffRhythm example output directory.
+             output_file_name: Name of the generated WAV file.
+             repo_id: Model repository ID.
+             seed: Optional random seed for reproducible sampling.
+             lrc: Lyrics as text or a `LyricSheet`, used instead of reading `lrc_path`.
+             crossfade: Seconds neighbouring segments overlap.
+             budget_bytes: Memory available. Defaults to `settings.music_memory_budget_bytes`,
+                 then the device's memory.
+
+        Returns:
+            The absolute path to the generated music file if successful, otherwise None.
+
+        Raises:
+            LrcValidationError: If the lyrics would not fit the song, before any sampling.
+            MemoryBudgetError: If no plan fits the budget.
+        """
+        if lrc is None:
+            if not lrc_path:
+                raise ValueError("LRC path must be provided for music generation.")
+            lrc = Path(lrc_path).read_text(encoding="utf-8")
+        sheet = check_lyrics(lrc, duration)
+        if ref_prompt and ref_audio_path:
+            print("Both prompt and reference audio path provided, using prompt only.")
+            ref_audio_path = None
+        plan = plan_generation(
+            duration, budget_bytes=budget_bytes, device=self.device, crossfade=crossfade
+        )
+        print(f"Plan: {plan.describe()}")
+
+        if output_dir:
+            effective_output_dir = Path(output_dir).resolve()
+        else:
+            effective_output_dir = self.package_path / "infer" / "example" / "output"
+        try:
+            output_path = self._request(
+                "generate_planned",
+                output_path=effective_output_dir / output_file_name,
+                plan=plan,
+                lrc=sheet,
+                ref_prompt=ref_prompt,
+                ref_audio_path=ref_audio_path,
+                seed=seed,
+                repo_id=repo_id,
+            )
+        except Exception as e:
+            print(f"Music generation via DiffRhythm worker failed: {e}")
+            return None
+        print(f"Successfully generated: {output_path}")
+        return Path(output_path)
+
+    def _cache_key(
+        self,
+        lrc: str,
+        ref_prompt: str | None,
+        ref_audio_path: str | Path | None,
+        audio_length: int,
+        chunked: bool,
+        repo_id: str,
+        seed: int | None,
+    ) -> str | None:
+        if self.cache is None:
+            return None
+        return MusicCache.make_key(
+            lrc, ref_prompt, ref_audio_path, audio_length, chunked, repo_id, seed
+        )
+
+    def _remember(self, cache_key: str, path: str | Path) -> None:
+        """Caches a generated song. The song is already made, so a failure only warns."""
+        try:
+            self.cache.put(cache_key, path)  # type: ignore[union-attr]
+        except OSError as e:
+            print(f"Warning: could not cache {path}: {e}")
+
+    def stream_music(
+        self,
+        ref_prompt: str | None = None,
+        lrc_path: str | Path | None = None,
+        audio_length: Literal[95, 285] = 95,
+        ref_audio_path: str | Path | None = None,
+        repo_id: str = DEFAULT_REPO_ID,
+        seed: int | None = None,
+        chunk_size: int = 128,
+        overlap: int = 32,
+        lrc: str | LyricSheet | None = None,
+    ) -> Iterator[AudioChunk]:
+        """
+        Generates music and yields decoded audio as soon as each decode window is ready.
+
+        Playback can start after sampling and the first window instead of after the whole
+        song is decoded and written. Use `streaming.write_wav` to save the chunks. With a
+        cache, a cached song is streamed from disk without sampling, and a fully streamed
+        song is cached for next time.
+
+        Args:
+             ref_prompt: The reference text prompt.
+             lrc_path: Path to the lyrics file.
+             audio_length: Audio length, 95 or 285.
+             ref_audio_path: Optional path to reference audio file. Ignored if ref_prompt is given.
+             repo_id: Model repository ID.
+             seed: Optional random seed for reproducible sampling.
+             chunk_size: Latent frames decoded per window (about 6 s of audio at 128).
+             overlap: Latent frames shared by neighbouring windows.
+             lrc: Lyrics as text or a `LyricSheet`, used instead of reading `lrc_path`.
+
+        Yields:
+            `AudioChunk`s in playback order.
+        """
+        if lrc is None and not lrc_path:
+            raise ValueError("LRC path must be provided for music generation.")
+        if audio_length not in [95, 285]:
+            raise ValueError("audio_length must be either 95 or 285 seconds.")
+        if ref_prompt and ref_audio_path:
+            print("Both prompt and reference audio path provided, using prompt only.")
+            ref_audio_path = None
+
+        lrc = load_lyrics(lrc, lrc_path, audio_length)
+        # Streaming decodes in windows, so it shares cache entries with chunked decoding
+        cache_key = self._cache_key(
+            lrc, ref_prompt, ref_audio_path, audio_length, True, repo_id, seed
+        )
+        if cache_key:
+            assert self.cache is not None
+            replay = self.cache.cache_dir / f"{cache_key}.{threading.get_ident()}.replay.wav"
+            try:
+                if cached_file := self.cache.get(cache_key, replay):
+                    print(f"Streaming cached song for {cache_key}")
+                    yield from read_wav_chunks(cached_file)
+                    return
+            finally:
+                replay.unlink(missing_ok=True)
+
+        chunks = self._stream(
+            "stream",
+            lrc=lrc,
+            ref_prompt=ref_prompt,
+            ref_audio_path=ref_audio_path,
+            seed=seed,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            repo_id=repo_id,
+            audio_length=audio_length,
+        )
+        if not cache_key:
+            yield from chunks
+            return
+        assert self.cache is not None
+        recording = self.cache.cache_dir / f"{cache_key}.{threading.get_ident()}.stream.wav"
+        yield from record_wav(chunks, recording)
+        try:
+            self._remember(cache_key, recording)
+        finally:
+            recording.unlink(missing_ok=True)
+
+    def generate_music_batch(
+        self, jobs: Sequence[MusicJob], max_batch_size: int | None = None
+    ) -> list[MusicJobResult]:
+        """
+        Generates many songs, sampling jobs that share `repo_id` and `audio_length` together.
+
+        Args:
+            jobs: The songs to generate.
+            max_batch_size: Largest number of songs sampled in one pass. None means no limit.
+
+        Returns:
+            One result per job, in order, holding either the output path or the error.
+        """
+        results = [MusicJobResult(job, error=validate_job(job)) for job in jobs]
+        items: dict[int, dict[str, Any]] = {}
+        cache_keys: dict[int, str | None] = {}
+        for index, job in enumerate(jobs):
+            if results[index].error:
+                continue
+            # Prompt wins over reference audio, as in generate_music
+            ref_audio_path = None if job.ref_prompt else job.ref_audio_path
+            try:
+                lrc = load_lyrics(job.lrc, job.lrc_path, job.audio_length)
+            except (OSError, UnicodeDecodeError) as e:
+                results[index].error = f"Could not read LRC file: {e}"
+                continue
+            except LrcValidationError as e:
+                results[index].error = str(e)
+                continue
+            cache_keys[index] = cache_key = self._cache_key(
+                lrc,
+                job.ref_prompt,
+                ref_audio_path,
+                job.audio_length,
+                job.chunked,
+                job.repo_id,
+                job.seed,
+            )
+            if cache_key and (cached_file := self.cache.get(cache_key, job.output_path)):  # type: ignore[union-attr]
+                results[index].path = cached_file
+                continue
+            items[index] = {
+                "output_path": job.output_path,
+                "lrc": lrc,
+                "ref_prompt": job.ref_prompt,
+                "ref_audio_path": ref_audio_path,
+                "chunked": job.chunked,
+            }
+
+        runnable = list(items)
+        for group in group_jobs([jobs[index] for index in runnable], max_batch_size):
+            indices = [runnable[i] for i in group.indices]
+            repo_id, audio_length, seed = group.key
+            print(
+                f"Sampling {len(indices)} song(s) with {repo_id} ({audio_length}s)..."
+            )
+            try:
+                outcomes = self._request(
+                    "generate_batch",
+                    items=[items[index] for index in indices],
+                    seed=seed,
+                    repo_id=repo_id,
+                    audio_length=audio_length,
+                )
+            except Exception as e:
+                outcomes = [{"error": str(e)}] * len(indices)
+            for index, outcome in zip(indices, outcomes):
+                if "path" in outcome:
+                    results[index].path = Path(outcome["path"])
+                    if cache_key := cache_keys[index]:
+                        self._remember(cache_key, outcome["path"])
+                else:
+                    results[index].error = outcome["error"]
+
+        print(summarize_results(results))
+        return results
+
+    def precompute_style_embeddings(self, folder: str | Path) -> list[Path]:
+        """
+        Stores style embeddings for every audio file in `folder`, e.g. data/music_generation/music.
+
+        Returns:
+            The audio files that now have a stored embedding.
+        """
+        if self.style_store is None:
+            raise ValueError("precompute_style_embeddings requires a style_store.")
+        return self._request("precompute_styles", folder=Path(folder).resolve())
+
+
+def worker_pool(
+    workers: int,
+    cores: Sequence[int] | None = None,
+    share_weights: bool = True,
+    **kwargs: Any,
+) -> ModelPool:
+    """
+    Starts `workers` DiffRhythm workers on one host, each pinned to its own share of the cores.
+
+    Songs go to the least busy worker. Workers start on their first song, so one that is
+    never needed never loads, and loads are staggered rather than all at once. With CUDA,
+    each worker gets its own GPU and there are at most as many workers as GPUs.
+
+    Args:
+        workers: Number of workers.
+        cores: CPU cores to split between them. Defaults to every core this process may use.
+        share_weights: Share CPU weights between workers through one memory-mapped file.
+        **kwargs: Passed to every `DiffRhythmWorker`, e.g. `audio_length` or `cache`.
+
+    Returns:
+        A pool with the same methods as `DiffRhythmWorker`.
+    """
+    kwargs.setdefault("autostart", False)
+    devices = worker_devices(workers)
+    return ModelPool(
+        [
+            DiffRhythmWorker(
+                device=device,
+                cpu_cores=subset,
+                share_weights=share_weights,
+                name=f"diffrhythm-worker-{i}",
+                **kwargs,
+            )
+            for i, (device, subset) in enumerate(
+                zip(devices, split_cores(len(devices), cores))
+            )
+        ],
+        name="music",
+    )
@@ -0,0 +1,727 @@
+from pathlib import Path
+from typing import Annotated, Any
+
+import typer
+
+from .story import Story, list_story_dirs, load_story
+
+app = typer.Typer(help="Build lyrics, songs and images for the story library.")
+
+# Options shared by `run` and `build`
+StoriesArg = Annotated[
+    list[str] | None,
+    typer.Argument(help="Story names under the stories directory. All if omitted."),
+]
+StoriesDirOpt = Annotated[Path | None, typer.Option(help="Defaults to data/stories.")]
+LibraryOpt = Annotated[
+    Path | None,
+    typer.Option(help="Read stories from this library database instead of the stories directory."),
+]
+AudioLengthOpt = Annotated[int, typer.Option(help="Song length, 95 or 285.")]
+RefPromptOpt = Annotated[str, typer.Option(help="Style prompt for the songs.")]
+MusicOpt = Annotated[bool, typer.Option(help="Generate songs.")]
+MusicBackendOpt = Annotated[
+    str, typer.Option(help="'worker' keeps DiffRhythm loaded, 'script' runs it per song.")
+]
+TextBackendOpt = Annotated[
+    str,
+    typer.Option(
+        help="Lyrics backend: 'gemini', 'huggingchat', 'openai' (any compatible server) "
+        "or 'transformers' (a local model)."
+    ),
+]
+TextModelOpt = Annotated[
+    str | None, typer.Option(help="Model for lyrics. Defaults to the backend's default.")
+]
+TextBaseUrlOpt = Annotated[
+    str | None, typer.Option(help="API root for the 'openai' backend, e.g. http://127.0.0.1:8000/v1.")
+]
+ImagesOpt = Annotated[bool, typer.Option(help="Render page images with FLUX.")]
+ImageModelOpt = Annotated[str | None, typer.Option(help="Diffusers FLUX repository.")]
+ImageGgufOpt = Annotated[
+    str | None, typer.Option(help="GGUF transformer weights (path or URL) to save memory.")
+]
+ImageOffloadOpt = Annotated[
+    str, typer.Option(help="CPU offload on CUDA: 'none', 'model' or 'sequential' (least memory).")
+]
+SimplifiedOpt = Annotated[bool, typer.Option(help="Convert lyrics to Simplified Chinese.")]
+InFlightOpt = Annotated[int, typer.Option(help="Stories processed at once.")]
+TelemetryFileOpt = Annotated[
+    Path | None, typer.Option(help="Append a JSON line per finished stage span to this file.")
+]
+MetricsFileOpt = Annotated[
+    Path | None, typer.Option(help="Write Prometheus metrics here when the build ends.")
+]
+ProfileStageOpt = Annotated[
+    list[str] | None,
+    typer.Option(help="Profile spans matching this name or glob with cProfile, e.g. 'music.sample'. Repeatable."),
+]
+ProfileDirOpt = Annotated[Path, typer.Option(help="Where to write .prof files.")]
+WorkersOpt = Annotated[
+    int,
+    typer.Option(
+        help="Instances of each local model (DiffRhythm, transformers text, FLUX), each pinned "
+        "to its own share of the CPU cores, or with CUDA to its own GPU (at most one per "
+        "GPU); requests go to the least busy one."
+    ),
+]
+TtsModelOpt = Annotated[
+    list[str] | None,
+    typer.Option(
+        help="VITS checkpoint per story language as LANG=CHECKPOINT, e.g. 'zh=<checkpoint>'; "
+        "a bare CHECKPOINT reads every language. Repeatable. Defaults to "
+        "en=facebook/mms-tts-eng; stories in a language without a voice are not narrated."
+    ),
+]
+EncodeOpt = Annotated[
+    list[str] | None,
+    typer.Option(
+        help="Normalize, trim and encode songs to CODEC:KBPS, e.g. 'opus:96' (opus, mp3 or aac). "
+        "Repeatable; 'default' adds opus:64, opus:128, mp3:128 and aac:128."
+    ),
+]
+LibraryPathOpt = Annotated[
+    Path | None, typer.Option("--library", help="Defaults to data/library/stories.db.")
+]
+
+
+@app.callback()
+def main() -> None:
+    """AI Storyteller command line interface."""
+
+
+def _local_text_model(
+    model: str | None,
+    audio_length: int,
+    share_weights: bool = False,
+    device: str | None = None,
+) -> Any:
+    """Builds the transformers backend. Module-level, so worker processes can unpickle it."""
+    from ..text_generation.base import PromptCache
+    from ..text_generation.local_transformers import (
+        DEFAULT_LOCAL_MODEL,
+        TransformersTextGeneration,
+    )
+    from .prompts import GEN_LYRICS_FROM_STORY_PROMPT
+
+    local_model = TransformersTextGeneration(
+        model or DEFAULT_LOCAL_MODEL,
+        cache=PromptCache(),
+        share_weights=share_weights,
+        device=device,
+    )
+    # Every story shares the template up to the story text
+    local_model.add_prefix(
+        GEN_LYRICS_FROM_STORY_PROMPT.split("{story}")[0].format(seconds=audio_length)
+    )
+    return local_model
+
+
+def _text_model(
+    backend: str, model: str | None, base_url: str | None, audio_length: int, workers: int = 1
+) -> Any:
+    from ..text_generation.base import PromptCache
+
+    cache = PromptCache()
+    if backend == "gemini":
+        from ..text_generation.gemini import DEFAULT_GEMINI_MODEL, GeminiTextGeneration
+
+        return GeminiTextGeneration(model or DEFAULT_GEMINI_MODEL, cache=cache)
+    if backend == "transformers":
+        if workers == 1:
+            return _local_text_model(model, audio_length)
+        from functools import partial
+
+        from ..text_generation.local_transformers import DEFAULT_LOCAL_MODEL
+        from ..utils.workers import ModelPool, ProcessModel, split_cores, worker_devices
+
+        devices = worker_devices(workers)
+        return ModelPool(
+            [
+                ProcessModel(
+                    partial(
+                        _local_text_model, model, audio_length, share_weights=True, device=device
+                    ),
+                    cores=cores,
+                    name=f"text-worker-{i}",
+                    autostart=False,
+                    attributes={"model": model or DEFAULT_LOCAL_MODEL},
+                )
+                for i, (device, cores) in enumerate(zip(devices, split_cores(len(devices))))
+            ],
+            name="text",
+        )
+
+    from ..text_generation.chat_completions import ChatCompletionsTextGeneration
+
+    if backend == "huggingchat":
+        kwargs = {"model": model} if model else {}
+        return ChatCompletionsTextGeneration.huggingchat(cache=cache, **kwargs)
+    if backend == "openai":
+        if not base_url or not model:
+            raise typer.BadParameter("The 'openai' backend needs --text-base-url and --text-model.")
+        return ChatCompletionsTextGeneration(model, base_url, cache=cache)
+    raise typer.BadParameter(
+        "text_backend must be 'gemini', 'huggingchat', 'openai' or 'transformers'."
+    )
+
+
+def _music_model(
+    backend: str, audio_length: int, workers: int = 1, cache: Any | None = None
+) -> Any:
+    if backend == "worker" and workers > 1:
+        from ..music_generation.worker import worker_pool
+
+        return worker_pool(workers, audio_length=audio_length, cache=cache)
+    if backend == "worker":
+        from ..music_generation.worker import DiffRhythmWorker
+
+        # Start lazily: an incremental build may not need to generate any song
+        return DiffRhythmWorker(audio_length=audio_length, autostart=False, cache=cache)  # type: ignore[arg-type]
+    if backend == "script" and workers > 1:
+        from ..music_generation.diffrhythm import DiffRhythm
+        from ..utils.workers import ModelPool, split_cores, worker_devices
+
+        devices = worker_devices(workers)
+        return ModelPool(
+            [
+                DiffRhythm(
+                    cpu_cores=cores,
+                    cache=cache,
+                    # "cuda:1" -> "1"; CPU workers keep the script's default
+                    cuda_visible_devices=device.partition(":")[2] or None,
+                )
+                for device, cores in zip(devices, split_cores(len(devices)))
+            ],
+            name="music",
+        )
+    if backend == "script":
+        from ..music_generation.diffrhythm import DiffRhythm
+
+        return DiffRhythm(cache=cache)
+    raise typer.BadParameter("music_backend must be 'worker' or 'script'.")
+
+
+def _image_model(
+    image_model: str | None, image_gguf: str | None, image_offload: str, workers: int = 1
+) -> Any:
+    if image_offload not in ("none", "model", "sequential"):
+        raise typer.BadParameter("image_offload must be 'none', 'model' or 'sequential'.")
+    from functools import partial
+
+    from ..image_generation.flux import DEFAULT_FLUX_MODEL, FluxImageGeneration
+    from .prompts import DEFAULT_IMAGE_STYLE
+
+    # Loaded on the first page; every page shares the style embedding
+    flux_factory = partial(
+        FluxImageGeneration,
+        image_model or DEFAULT_FLUX_MODEL,
+        gguf_file=image_gguf,
+        offload=image_offload,
+        style=DEFAULT_IMAGE_STYLE,
+        max_batch_size=4,
+    )
+    if workers == 1:
+        return flux_factory()
+    from ..utils.workers import ModelPool, ProcessModel, split_cores, worker_devices
+
+    devices = worker_devices(workers)
+    return ModelPool(
+        [
+            ProcessModel(
+                partial(flux_factory, device=device),
+                cores=cores,
+                name=f"image-worker-{i}",
+                autostart=False,
+                attributes={
+                    "model": image_model or DEFAULT_FLUX_MODEL,
+                    "max_batch_size": flux_factory.keywords["max_batch_size"],
+                },
+            )
+            for i, (device, cores) in enumerate(zip(devices, split_cores(len(devices))))
+        ],
+        name="image",
+    )
+
+
+def _narration_voices(tts_model: list[str] | None, voice: str | None = None) -> Any:
+    from ..tts.cache import ClipCache
+    from ..tts.narration import NarrationVoices
+    from ..tts.vits import VITS_MODELS
+
+    specs = [spec.rpartition("=") for spec in tts_model or ()]
+    # A bare checkpoint replaces the defaults; LANG=CHECKPOINT adds to them
+    models = {} if any(not language for language, _, _ in specs) else dict(VITS_MODELS)
+    for language, _, checkpoint in specs:
+        models[language or "*"] = checkpoint
+    return NarrationVoices(models, cache=ClipCache(), voice=voice)
+
+
+def _load_stories(
+    stories: list[str] | None, stories_dir: Path | None, library: Path | None = None
+) -> list[Story]:
+    if library is not None:
+        from ..library.store import StoryLibrary
+
+        # Pages are read from the library as stages ask for them
+        store = StoryLibrary(library)
+        missing = set(stories or ()) - set(store.names())
+        if missing:
+            raise typer.BadParameter(f"Stories not found: {', '.join(sorted(missing))}")
+        return list(store.stories(stories))
+
+    story_dirs = list_story_dirs(stories_dir)
+    if stories:
+        story_dirs = [path for path in story_dirs if path.name in stories]
+        missing = set(stories) - {path.name for path in story_dirs}
+        if missing:
+            raise typer.BadParameter(f"Stories not found: {', '.join(sorted(missing))}")
+    return [load_story(path) for path in story_dirs]
+
+
+def _build(
+    stories: list[str] | None,
+    stories_dir: Path | None,
+    audio_length: int,
+    ref_prompt: str,
+    music: bool,
+    music_backend: str,
+    text_backend: str,
+    text_model: str | None,
+    text_base_url: str | None,
+    images: bool,
+    image_model: str | None,
+    image_gguf: str | None,
+    image_offload: str,
+    simplified: bool,
+    max_stories_in_flight: int,
+    incremental: bool,
+    library: Path | None = None,
+    telemetry_file: Path | None = None,
+    metrics_file: Path | None = None,
+    profile_stage: list[str] | None = None,
+    profile_dir: Path = Path("profiles"),
+    encode: list[str] | None = None,
+    workers: int = 1,
+) -> None:
+    import asyncio
+
+    from ..utils.telemetry import telemetry
+    from .prompts import DEFAULT_IMAGE_STYLE
+    from .runner import StoryPipeline
+
+    # Before any model starts, so the music worker inherits the profiling setup
+    telemetry.configure(telemetry_file, profile_stage or (), profile_dir)
+
+    if audio_length not in (95, 285):
+        raise typer.BadParameter("audio_length must be either 95 or 285 seconds.")
+
+    loaded = _load_stories(stories, stories_dir, library)
+
+    if workers < 1:
+        raise typer.BadParameter("workers must be at least 1.")
+
+    music_model = _music_model(music_backend, audio_length, workers) if music else None
+
+    postprocessor = None
+    if encode:
+        from ..music_generation.postprocess import DEFAULT_RENDITIONS, PostProcessor, Rendition
+
+        renditions: list[Rendition] = []
+        try:
+            for spec in encode:
+                new = DEFAULT_RENDITIONS if spec == "default" else (Rendition.parse(spec),)
+                renditions += [rendition for rendition in new if rendition not in renditions]
+        except ValueError as e:
+            raise typer.BadParameter(str(e)) from e
+        postprocessor = PostProcessor(renditions)
+
+    flux = _image_model(image_model, image_gguf, image_offload, workers) if images else None
+    text = _text_model(text_backend, text_model, text_base_url, audio_length, workers)
+
+    pipeline = StoryPipeline(
+        text_model=text,
+        music_model=music_model,
+        image_model=flux,
+        audio_length=audio_length,  # type: ignore[arg-type]
+        ref_prompt=ref_prompt,
+        image_style=DEFAULT_IMAGE_STYLE,
+        to_simplified=simplified,
+        max_stories_in_flight=max_stories_in_flight,
+        max_concurrent_text=4 * workers,
+        max_concurrent_music=workers,
+        # One call per page in flight per worker, so a story's pages render as one batch
+        max_concurrent_images=flux.max_batch_size * workers if flux is not None else 1,
+        incremental=incremental,
+        postprocessor=postprocessor,
+    )
+    try:
+        results = asyncio.run(pipeline.run(loaded))
+    finally:
+        if hasattr(text, "close"):  # Worker pools, loaded models and HTTP clients
+            text.close()
+        if music_model is not None and hasattr(music_model, "stop"):
+            music_model.stop()
+        if flux is not None:
+            flux.close()
+        if postprocessor is not None:
+            postprocessor.close()
+        if metrics_file is not None:
+            telemetry.write_prometheus(metrics_file)
+        if telemetry_file is not None or metrics_file is not None or profile_stage:
+            typer.echo(telemetry.summary())
+
+    failed = 0
+    for artifacts in results:
+        if artifacts.ok:
+            status = "ok"
+            if artifacts.skipped:
+                status += f" ({len(artifacts.skipped)} up to date)"
+        else:
+            status = "failed: " + "; ".join(
+                f"{stage}: {error}" for stage, error in artifacts.errors.items()
+            )
+        failed += not artifacts.ok
+        typer.echo(f"{artifacts.story.name}: {status}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def run(
+    stories: StoriesArg = None,
+    stories_dir: StoriesDirOpt = None,
+    library: LibraryOpt = None,
+    audio_length: AudioLengthOpt = 95,
+    ref_prompt: RefPromptOpt = "Children's song",
+    music: MusicOpt = True,
+    music_backend: MusicBackendOpt = "worker",
+    text_backend: TextBackendOpt = "gemini",
+    text_model: TextModelOpt = None,
+    text_base_url: TextBaseUrlOpt = None,
+    images: ImagesOpt = False,
+    image_model: ImageModelOpt = None,
+    image_gguf: ImageGgufOpt = None,
+    image_offload: ImageOffloadOpt = "model",
+    simplified: SimplifiedOpt = True,
+    max_stories_in_flight: InFlightOpt = 2,
+    telemetry_file: TelemetryFileOpt = None,
+    metrics_file: MetricsFileOpt = None,
+    profile_stage: ProfileStageOpt = None,
+    profile_dir: ProfileDirOpt = Path("profiles"),
+    encode: EncodeOpt = None,
+    workers: WorkersOpt = 1,
+) -> None:
+    """Generate lyrics, songs and page images for stories, rebuilding everything."""
+    _build(
+        stories,
+        stories_dir,
+        audio_length,
+        ref_prompt,
+        music,
+        music_backend,
+        text_backend,
+        text_model,
+        text_base_url,
+        images,
+        image_model,
+        image_gguf,
+        image_offload,
+        simplified,
+        max_stories_in_flight,
+        incremental=False,
+        library=library,
+        telemetry_file=telemetry_file,
+        metrics_file=metrics_file,
+        profile_stage=profile_stage,
+        profile_dir=profile_dir,
+        encode=encode,
+        workers=workers,
+    )
+
+
+@app.command()
+def build(
+    stories: StoriesArg = None,
+    stories_dir: StoriesDirOpt = None,
+    library: LibraryOpt = None,
+    audio_length: AudioLengthOpt = 95,
+    ref_prompt: RefPromptOpt = "Children's song",
+    music: MusicOpt = True,
+    music_backend: MusicBackendOpt = "worker",
+    text_backend: TextBackendOpt = "gemini",
+    text_model: TextModelOpt = None,
+    text_base_url: TextBaseUrlOpt = None,
+    images: ImagesOpt = False,
+    image_model: ImageModelOpt = None,
+    image_gguf: ImageGgufOpt = None,
+    image_offload: ImageOffloadOpt = "model",
+    simplified: SimplifiedOpt = True,
+    max_stories_in_flight: InFlightOpt = 2,
+    telemetry_file: TelemetryFileOpt = None,
+    metrics_file: MetricsFileOpt = None,
+    profile_stage: ProfileStageOpt = None,
+    profile_dir: ProfileDirOpt = Path("profiles"),
+    encode: EncodeOpt = None,
+    workers: WorkersOpt = 1,
+) -> None:
+    """Rebuild only the artifacts whose inputs changed since the last build."""
+    _build(
+        stories,
+        stories_dir,
+        audio_length,
+        ref_prompt,
+        music,
+        music_backend,
+        text_backend,
+        text_model,
+        text_base_url,
+        images,
+        image_model,
+        image_gguf,
+        image_offload,
+        simplified,
+        max_stories_in_flight,
+        incremental=True,
+        library=library,
+        telemetry_file=telemetry_file,
+        metrics_file=metrics_file,
+        profile_stage=profile_stage,
+        profile_dir=profile_dir,
+        encode=encode,
+        workers=workers,
+    )
+
+
+@app.command()
+def narrate(
+    stories: StoriesArg = None,
+    stories_dir: StoriesDirOpt = None,
+    tts_model: TtsModelOpt = None,
+    voice: Annotated[
+        str | None, typer.Option(help="Speaker id for multi-speaker checkpoints.")
+    ] = None,
+    library: LibraryOpt = None,
+) -> None:
+    """Read every story page aloud into <story>/generated/narration/<page>.wav."""
+    voices = _narration_voices(tts_model, voice)
+    skipped = 0
+    for story in _load_stories(stories, stories_dir, library):
+        try:
+            engine = voices.engine(story)
+        except ValueError as e:
+            skipped += 1
+            typer.echo(f"{story.name}: skipped: {e}")
+            continue
+        paths = engine.narrate_story(story)
+        typer.echo(f"{story.name}: {len(paths)} page(s) narrated")
+    if skipped:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def ui(
+    stories: StoriesArg = None,
+    stories_dir: StoriesDirOpt = None,
+    library: LibraryOpt = None,
+    audio_length: AudioLengthOpt = 95,
+    ref_prompt: RefPromptOpt = "Children's song",
+    music: MusicOpt = True,
+    music_backend: MusicBackendOpt = "worker",
+    text_backend: TextBackendOpt = "gemini",
+    text_model: TextModelOpt = None,
+    text_base_url: TextBaseUrlOpt = None,
+    images: ImagesOpt = False,
+    image_model: ImageModelOpt = None,
+    image_gguf: ImageGgufOpt = None,
+    image_offload: ImageOffloadOpt = "model",
+    simplified: SimplifiedOpt = True,
+    workers: WorkersOpt = 1,
+    narration: Annotated[bool, typer.Option(help="Offer page narration.")] = True,
+    tts_model: TtsModelOpt = None,
+    host: Annotated[str, typer.Option(help="Address to listen on.")] = "127.0.0.1",
+    port: Annotated[int, typer.Option(help="Port to listen on.")] = 7860,
+    share: Annotated[bool, typer.Option(help="Also serve through a public Gradio link.")] = False,
+    max_queue_size: Annotated[
+        int, typer.Option(help="Requests waiting in the queue before new ones are turned away.")
+    ] = 64,
+) -> None:
+    """Serve a web UI that streams lyrics, songs, narration and page images as they generate."""
+    from ..music_generation.cache import MusicCache
+    from ..ui.app import StoryStudio, build_app
+    from .prompts import DEFAULT_IMAGE_STYLE
+    from .runner import StoryPipeline
+
+    if audio_length not in (95, 285):
+        raise typer.BadParameter("audio_length must be either 95 or 285 seconds.")
+    if workers < 1:
+        raise typer.BadParameter("workers must be at least 1.")
+    loaded = _load_stories(stories, stories_dir, library)
+
+    # Songs are cached across stories and restarts, so a repeated request streams from disk
+    music_model = _music_model(music_backend, audio_length, workers, MusicCache()) if music else None
+    flux = _image_model(image_model, image_gguf, image_offload, workers) if images else None
+    voices = _narration_voices(tts_model) if narration else None
+    text = _text_model(text_backend, text_model, text_base_url, audio_length, workers)
+
+    pipeline = StoryPipeline(
+        text_model=text,
+        music_model=music_model,
+        image_model=flux,
+        audio_length=audio_length,  # type: ignore[arg-type]
+        ref_prompt=ref_prompt,
+        image_style=DEFAULT_IMAGE_STYLE,
+        to_simplified=simplified,
+    )
+    studio = StoryStudio(pipeline, loaded, narration=voices)
+    concurrency = {
+        "text": 8 * workers,
+        "music": workers,
+        "image": flux.max_batch_size * workers if flux is not None else 1,
+    }
+    try:
+        build_app(studio, concurrency, max_queue_size).launch(
+            server_name=host, server_port=port, share=share
+        )
+    finally:
+        if hasattr(text, "close"):  # Worker pools, loaded models and HTTP clients
+            text.close()
+        if music_model is not None and hasattr(music_model, "stop"):
+            music_model.stop()
+        if flux is not None:
+            flux.close()
+
+
+@app.command()
+def transcribe(
+    audio_files: Annotated[list[Path], typer.Argument(help="Recordings to transcribe.")],
+    asr_model: Annotated[str, typer.Option(help="Whisper checkpoint.")] = "openai/whisper-small",
+    language: Annotated[
+        str | None, typer.Option(help="Spoken language, e.g. zh. Detected if omitted.")
+    ] = None,
+    processes: Annotated[
+        int | None,
+        typer.Option(help="Parallel processes, each with its own model copy. Defaults to 2."),
+    ] = None,
+) -> None:
+    """Transcribe recordings, e.g. of story ideas, writing <file>.txt next to each."""
+    from functools import partial
+
+    from ..asr.transcriber import transcribe_files
+    from ..asr.whisper import WhisperASR
+
+    results = transcribe_files(
+        audio_files, partial(WhisperASR, asr_model, language=language), processes
+    )
+    failed = 0
+    for path, result in zip(audio_files, results):
+        if isinstance(result, Exception):
+            failed += 1
+            typer.echo(f"{path}: failed: {result}")
+            continue
+        path.with_suffix(".txt").write_text(result.text, encoding="utf-8")
+        typer.echo(f"{path}: {result.text}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command("encode")
+def encode_songs(
+    audio_files: Annotated[list[Path], typer.Argument(help="Songs to encode, e.g. song.wav.")],
+    rendition: Annotated[
+        list[str] | None,
+        typer.Option(help="CODEC:KBPS, e.g. 'opus:96'. Repeatable. Defaults to opus:64, opus:128, mp3:128 and aac:128."),
+    ] = None,
+    processes: Annotated[
+        int | None, typer.Option(help="Songs encoded at once. Defaults to the CPU count.")
+    ] = None,
+) -> None:
+    """Normalize, trim and encode songs, writing <song>.<kbps>k.<ext> next to each."""
+    from ..music_generation.postprocess import DEFAULT_RENDITIONS, PostProcessor, Rendition
+
+    try:
+        renditions = [Rendition.parse(spec) for spec in rendition] if rendition else DEFAULT_RENDITIONS
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+    with PostProcessor(renditions, processes=processes) as postprocessor:
+        results = postprocessor.process_many(audio_files)
+    failed = 0
+    for path, result in zip(audio_files, results):
+        if isinstance(result, Exception):
+            failed += 1
+            typer.echo(f"{path}: failed: {result}")
+            continue
+        for output_path in result.values():
+            typer.echo(f"{path}: {output_path} ({output_path.stat().st_size / 1024:.0f} KiB)")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+library_app = typer.Typer(help="Import, export, list and search the story library database.")
+app.add_typer(library_app, name="library")
+
+
+@library_app.command("import")
+def library_import(
+    stories_dir: Annotated[
+        Path | None, typer.Argument(help="Directory of <story>/story.json. Defaults to data/stories.")
+    ] = None,
+    library: LibraryPathOpt = None,
+    copy_assets: Annotated[
+        bool, typer.Option(help="Copy page images into the library rather than referencing them.")
+    ] = True,
+) -> None:
+    """Import or update every story under a stories directory; unchanged stories are skipped."""
+    from ..library.store import StoryLibrary
+
+    with StoryLibrary(library) as store:
+        changed = store.import_dir(stories_dir, copy_assets=copy_assets)
+        typer.echo(f"{changed} story(ies) imported or updated, {len(store)} in {store.path}")
+
+
+@library_app.command("export")
+def library_export(
+    output_dir: Annotated[Path, typer.Argument(help="Where to write <story>/story.json and img/.")],
+    stories: Annotated[list[str] | None, typer.Option("--story", help="Repeatable. All if omitted.")] = None,
+    library: LibraryPathOpt = None,
+) -> None:
+    """Export stories back to the story.json directory layout."""
+    from ..library.store import StoryLibrary
+
+    with StoryLibrary(library) as store:
+        for name in stories or store.names():
+            typer.echo(store.export_story(name, output_dir))
+
+
+@library_app.command("list")
+def library_list(
+    library: LibraryPathOpt = None,
+    limit: Annotated[int | None, typer.Option(help="Most stories listed.")] = None,
+    offset: Annotated[int, typer.Option(help="Stories skipped first.")] = 0,
+) -> None:
+    """List stories with their titles and page counts."""
+    from ..library.store import StoryLibrary
+
+    with StoryLibrary(library) as store:
+        for summary in store.list_stories(limit, offset):
+            typer.echo(f"{summary.name}\t{summary.title}\t{summary.page_count} pages")
+
+
+@library_app.command("search")
+def library_search(
+    query: Annotated[str, typer.Argument(help="Text to find in titles and pages.")],
+    library: LibraryPathOpt = None,
+    limit: Annotated[int, typer.Option(help="Most title hits and most page hits shown.")] = 20,
+) -> None:
+    """Full-text search over story titles and page texts."""
+    from ..library.store import StoryLibrary
+
+    with StoryLibrary(library) as store:
+        for hit in store.search(query, limit):
+            where = f"page {hit.page_key}" if hit.page_key is not None else "title"
+            snippet = " ".join(hit.snippet.split())
+            typer.echo(f"{hit.name} ({where}): {snippet}")
+
+
+if __name__ == "__main__":
+    app()
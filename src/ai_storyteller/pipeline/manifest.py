@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def fingerprint(*parts: Any) -> str:
+    """Hashes the inputs of an artifact; any change to them changes the fingerprint."""
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def file_fingerprint(path: str | Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class StoryManifest:
+    """
+    Records, per generated artifact of a story, the fingerprint of the inputs it was built from.
+
+    Stored as `manifest.json` in the story's output directory. Artifact names are stage
+    names such as "lyrics", "lrc", "song" and "image:<page>", and paths are stored
+    relative to the output directory so the library can be moved.
+    """
+
+    def __init__(self, output_dir: str | Path):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_FILE_NAME
+        try:
+            self.entries: dict[str, dict[str, Any]] = json.loads(
+                self.path.read_text(encoding="utf-8")
+            )
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def fresh_path(self, artifact: str, inputs_fingerprint: str) -> Path | None:
+        """Returns the artifact's file if it was built from the same inputs and still exists."""
+        entry = self.entries.get(artifact)
+        if entry is None or entry["fingerprint"] != inputs_fingerprint:
+            return None
+        path = self.output_dir / entry["path"]
+        return path if path.is_file() else None
+
+    def record(self, artifact: str, inputs_fingerprint: str, path: str | Path) -> None:
+        path = Path(path).resolve()
+        try:
+            stored_path = str(path.relative_to(self.output_dir.resolve()))
+        except ValueError:
+            stored_path = str(path)  # Outside the output dir, e.g. a cached song
+        self.entries[artifact] = {
+            "fingerprint": inputs_fingerprint,
+            "path": stored_path,
+            "built_at": time.time(),
+        }
+        self.save()
+
+    def save(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(self.entries, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+        os.replace(tmp_path, self.path)
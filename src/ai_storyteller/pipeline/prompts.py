@@ -0,0 +1,42 @@
+from typing import Any
+
+GEN_LYRICS_FROM_STORY_PROMPT = """\
+根據以下故事生成歌詞，這首歌長度為{seconds}秒
+格式應該是 .lrc，例如：
+
+```
+[00:00.00]歌詞內容
+[00:01.00]歌詞內容
+...
+```
+除了歌詞以外，其他的內容都不需要，中間不能有空行，如果故事的內容是中文，請用中文生成歌詞，如果故事的內容是英文，請用英文生成歌詞。
+
+故事：
+```
+{story}
+```
+"""
+
+DEFAULT_IMAGE_STYLE = "children's picture book illustration, soft watercolor, warm colors"
+
+PAGE_IMAGE_PROMPT = "{style}. {text}"
+
+# Written page image prompts in story.json refer to the story's style guide by this marker
+STYLE_GUIDE_PLACEHOLDER = "[Use Defined Style Guide]"
+
+
+def format_style_guide(guide: Any) -> str:
+    """
+    Flattens a story.json `style_guide`, text or nested objects, into one line of prompt text.
+
+    E.g. {"overall_style": "Watercolor.", "wolf": "Dark fur."} -> "Watercolor; wolf: Dark fur".
+    """
+    if isinstance(guide, dict):
+        parts = []
+        for key, value in guide.items():
+            if text := format_style_guide(value):
+                parts.append(text if key == "overall_style" else f"{key.replace('_', ' ')}: {text}")
+        return "; ".join(parts)
+    if isinstance(guide, list):
+        return "; ".join(text for item in guide if (text := format_style_guide(item)))
+    return str(guide or "").strip().rstrip(".")
@@ -0,0 +1,352 @@
+import asyncio
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+
+from ..interfaces.image_generation_interface import ImageGenerationModel
+from ..interfaces.text_generation_interface import TextGenerationModel
+from ..music_generation.postprocess import PostProcessor, Rendition
+from ..utils.lrc import LyricSheet
+from ..utils.telemetry import telemetry
+from .manifest import StoryManifest, file_fingerprint, fingerprint
+from .prompts import (
+    DEFAULT_IMAGE_STYLE,
+    GEN_LYRICS_FROM_STORY_PROMPT,
+    PAGE_IMAGE_PROMPT,
+    STYLE_GUIDE_PLACEHOLDER,
+    format_style_guide,
+)
+from .story import Story
+
+
+@dataclass
+class StoryArtifacts:
+    """What the pipeline produced for one story, and which stages failed."""
+
+    story: Story
+    manifest: StoryManifest | None = None
+    lyrics_path: Path | None = None
+    lrc_path: Path | None = None
+    song_path: Path | None = None
+    rendition_paths: dict[Rendition, Path] = field(default_factory=dict)
+    image_paths: dict[str, Path] = field(default_factory=dict)
+    errors: dict[str, str] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+    skipped: list[str] = field(default_factory=list)  # Up to date, not rebuilt
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class StoryPipeline:
+    """
+    Builds lyrics, a song and page images for stories, overlapping independent stages.
+
+    Per story the stages form a small DAG: lyrics -> cleaned LRC -> song -> encoded
+    renditions, while every page image depends only on the story. Stages run as asyncio
+    tasks as soon as their inputs are ready, so page images render while the song is
+    generating. Blocking model calls run in threads, with one semaphore per model so
+    each model instance only handles as many calls at once as it supports.
+
+    With `incremental=True`, each story's manifest (see `StoryManifest`) is checked
+    before every stage, and stages whose input fingerprint is unchanged reuse their
+    previous output instead of running.
+    """
+
+    def __init__(
+        self,
+        text_model: TextGenerationModel,
+        music_model: Any | None = None,
+        image_model: ImageGenerationModel | None = None,
+        audio_length: Literal[95, 285] = 95,
+        ref_prompt: str = "Children's song",
+        image_style: str = DEFAULT_IMAGE_STYLE,
+        to_simplified: bool = True,
+        max_stories_in_flight: int = 2,
+        max_concurrent_text: int = 4,
+        max_concurrent_music: int = 1,
+        max_concurrent_images: int = 1,
+        incremental: bool = False,
+        postprocessor: PostProcessor | None = None,
+    ):
+        """
+        Args:
+            text_model: Generates lyrics from the story.
+            music_model: Object with a `generate_music` method such as `DiffRhythm` or
+                `DiffRhythmWorker`. If None, the song stage is skipped.
+            image_model: Renders page images. If None, the image stages are skipped.
+            audio_length: Song length, 95 or 285 seconds.
+            ref_prompt: Style prompt for the song.
+            image_style: Style prefix for every page image prompt.
+            to_simplified: Convert lyrics to Simplified Chinese, which DiffRhythm sings better.
+            max_stories_in_flight: Stories processed at the same time.
+            max_concurrent_text: Concurrent text generation calls.
+            max_concurrent_music: Concurrent music generation calls.
+            max_concurrent_images: Concurrent image generation calls.
+            incremental: Only rebuild artifacts whose inputs changed since the last build.
+            postprocessor: Masters and encodes each song once it is generated. If None,
+                only the WAV is kept.
+        """
+        self.text_model = text_model
+        self.music_model = music_model
+        self.image_model = image_model
+        self.audio_length = audio_length
+        self.ref_prompt = ref_prompt
+        self.image_style = image_style
+        self.to_simplified = to_simplified
+        self.max_stories_in_flight = max_stories_in_flight
+        self.incremental = incremental
+        self.postprocessor = postprocessor
+        self._limits = {
+            "text": max_concurrent_text,
+            "music": max_concurrent_music,
+            "image": max_concurrent_images,
+            "encode": postprocessor.processes if postprocessor is not None else 1,
+        }
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._t2s: Any = None
+
+    def _semaphore(self, resource: str) -> asyncio.Semaphore:
+        # Created lazily so they bind to the running event loop
+        if resource not in self._semaphores:
+            self._semaphores[resource] = asyncio.Semaphore(self._limits[resource])
+        return self._semaphores[resource]
+
+    async def _stage(
+        self,
+        name: str,
+        artifacts: StoryArtifacts,
+        resource: str | None,
+        inputs_fingerprint: str,
+        fn: Callable[..., Path],
+        *args: Any,
+    ) -> Path | None:
+        """Runs one blocking stage in a thread, recording its time or error, unless it is up to date."""
+        manifest = artifacts.manifest
+        kind = name.split(":")[0]  # "image:<page>" -> "image"
+        if self.incremental and manifest is not None:
+            if fresh_path := manifest.fresh_path(name, inputs_fingerprint):
+                artifacts.skipped.append(name)
+                telemetry.count("stages_skipped", stage=kind)
+                return fresh_path
+
+        started = time.perf_counter()
+        with telemetry.span(f"stage.{kind}", story=artifacts.story.name, key=name) as span:
+            try:
+                if resource is None:
+                    result = await asyncio.to_thread(fn, *args)
+                else:
+                    async with self._semaphore(resource):
+                        span.attributes["queued_seconds"] = time.perf_counter() - started
+                        result = await asyncio.to_thread(fn, *args)
+            except Exception as e:
+                span.fail(e)
+                artifacts.errors[name] = f"{type(e).__name__}: {e}"
+                print(f"[{artifacts.story.name}] {name} failed: {e}")
+                return None
+        artifacts.timings[name] = time.perf_counter() - started
+        print(f"[{artifacts.story.name}] {name} done in {artifacts.timings[name]:.1f}s")
+        if manifest is not None:
+            manifest.record(name, inputs_fingerprint, result)
+        return result
+
+    @staticmethod
+    def _model_id(model: Any) -> str:
+        """Identifies a backend for fingerprints: class name plus model or repo id if it has one."""
+        name = getattr(model, "model", None) or getattr(model, "repo_id", None) or ""
+        return f"{type(model).__name__}:{name}"
+
+    # --- Input fingerprints, shared with anything else that reuses built artifacts ---
+
+    def lyrics_fingerprint(self, story: Story) -> str:
+        return fingerprint(
+            story.text,
+            GEN_LYRICS_FROM_STORY_PROMPT,
+            self.audio_length,
+            self._model_id(self.text_model),
+        )
+
+    def lrc_fingerprint(self, lyrics_path: Path) -> str:
+        return fingerprint(file_fingerprint(lyrics_path), self.to_simplified, self.audio_length)
+
+    def song_fingerprint(self, lrc_path: Path) -> str:
+        return fingerprint(
+            file_fingerprint(lrc_path),
+            self.ref_prompt,
+            self.audio_length,
+            self._model_id(self.music_model),
+        )
+
+    def encode_fingerprint(self, song_path: Path) -> str:
+        assert self.postprocessor is not None
+        return fingerprint(
+            file_fingerprint(song_path),
+            [str(rendition) for rendition in self.postprocessor.renditions],
+            self.postprocessor.mastering,
+        )
+
+    def image_fingerprint(self, story: Story, page_key: str) -> str:
+        return fingerprint(
+            self.page_image_prompt(story, page_key), self._model_id(self.image_model)
+        )
+
+    # --- Stages ---
+
+    def lyrics_prompt(self, story: Story) -> str:
+        return GEN_LYRICS_FROM_STORY_PROMPT.format(story=story.text, seconds=self.audio_length)
+
+    def save_lyrics(self, story: Story, lyrics: str) -> Path:
+        lyrics_path = story.output_dir / "lyrics.txt"
+        lyrics_path.parent.mkdir(parents=True, exist_ok=True)
+        lyrics_path.write_text(lyrics, encoding="utf-8")
+        return lyrics_path
+
+    def generate_lyrics(self, story: Story) -> Path:
+        return self.save_lyrics(story, self.text_model.generate_text(self.lyrics_prompt(story)))
+
+    def clean_lyrics(self, story: Story, lyrics_path: Path) -> Path:
+        lyrics = lyrics_path.read_text(encoding="utf-8")
+        if self.to_simplified:
+            if self._t2s is None:
+                import opencc
+
+                self._t2s = opencc.OpenCC("t2s.json")
+            lyrics = self._t2s.convert(lyrics)
+        sheet = LyricSheet.parse(lyrics)
+        # Models often overrun the requested length; DiffRhythm would drop the late lines
+        fitted = sheet.fit(self.audio_length)
+        if fitted != sheet:
+            print(
+                f"[{story.name}] Compressed lyrics ending at {sheet.end_seconds:.1f}s "
+                f"to fit {self.audio_length}s"
+            )
+        # Raises before the song stage spends a diffusion run on bad lyrics
+        fitted.check(self.audio_length)
+        lrc_path = story.output_dir / "lyrics.lrc"
+        lrc_path.write_text(fitted.to_lrc(), encoding="utf-8")
+        return lrc_path
+
+    def generate_song(self, story: Story, lrc_path: Path) -> Path:
+        assert self.music_model is not None
+        song_path = self.music_model.generate_music(
+            ref_prompt=self.ref_prompt,
+            lrc_path=lrc_path,
+            audio_length=self.audio_length,
+            output_dir=story.output_dir,
+            output_file_name="song.wav",
+        )
+        if song_path is None:
+            raise RuntimeError("Music generation failed.")
+        return Path(song_path)
+
+    def encode_song(self, story: Story, song_path: Path) -> Path:
+        assert self.postprocessor is not None
+        paths = self.postprocessor.process(song_path, story.output_dir, "song")
+        return next(iter(paths.values()))
+
+    def page_image_prompt(self, story: Story, page_key: str) -> str:
+        """
+        The FLUX prompt for a page: its written `image_prompt` from story.json, with the
+        story's `style_guide` in place of "[Use Defined Style Guide]", or failing that
+        the image style and the page text.
+        """
+        page = story.page(page_key)
+        if image_prompt := str(page.extra.get("image_prompt") or "").strip():
+            style = format_style_guide(story.extra.get("style_guide")) or self.image_style
+            return image_prompt.replace(STYLE_GUIDE_PLACEHOLDER, style)
+        text = page.text.strip() or story.title  # The cover has no text
+        return PAGE_IMAGE_PROMPT.format(style=self.image_style, text=text)
+
+    def generate_page_image(self, story: Story, page_key: str) -> Path:
+        assert self.image_model is not None
+        image_path = self.image_model.generate_image(
+            self.page_image_prompt(story, page_key),
+            story.output_dir / "img" / f"{page_key}.png",
+        )
+        if image_path is None:
+            raise RuntimeError("Image generation failed.")
+        return Path(image_path)
+
+    # --- Scheduling ---
+
+    async def _song_branch(self, artifacts: StoryArtifacts) -> None:
+        story = artifacts.story
+        artifacts.lyrics_path = await self._stage(
+            "lyrics",
+            artifacts,
+            "text",
+            self.lyrics_fingerprint(story),
+            self.generate_lyrics,
+            story,
+        )
+        if artifacts.lyrics_path is None:
+            return
+        artifacts.lrc_path = await self._stage(
+            "lrc",
+            artifacts,
+            None,
+            self.lrc_fingerprint(artifacts.lyrics_path),
+            self.clean_lyrics,
+            story,
+            artifacts.lyrics_path,
+        )
+        if artifacts.lrc_path is None or self.music_model is None:
+            return
+        artifacts.song_path = await self._stage(
+            "song",
+            artifacts,
+            "music",
+            self.song_fingerprint(artifacts.lrc_path),
+            self.generate_song,
+            story,
+            artifacts.lrc_path,
+        )
+        if artifacts.song_path is None or self.postprocessor is None:
+            return
+        # Encoding has its own slots, so the next song starts while this one encodes
+        encoded_path = await self._stage(
+            "encode",
+            artifacts,
+            "encode",
+            self.encode_fingerprint(artifacts.song_path),
+            self.encode_song,
+            story,
+            artifacts.song_path,
+        )
+        if encoded_path is not None:
+            artifacts.rendition_paths = self.postprocessor.output_paths(story.output_dir, "song")
+
+    async def _image_branch(self, artifacts: StoryArtifacts, page_key: str) -> None:
+        image_path = await self._stage(
+            f"image:{page_key}",
+            artifacts,
+            "image",
+            self.image_fingerprint(artifacts.story, page_key),
+            self.generate_page_image,
+            artifacts.story,
+            page_key,
+        )
+        if image_path is not None:
+            artifacts.image_paths[page_key] = image_path
+
+    async def run_story(self, story: Story) -> StoryArtifacts:
+        """Runs every stage for one story, overlapping the song and image branches."""
+        artifacts = StoryArtifacts(story, manifest=StoryManifest(story.output_dir))
+        branches = [self._song_branch(artifacts)]
+        if self.image_model is not None:
+            branches += [self._image_branch(artifacts, key) for key in story.page_keys]
+        await asyncio.gather(*branches)
+        return artifacts
+
+    async def run(self, stories: Sequence[Story]) -> list[StoryArtifacts]:
+        """Runs the pipeline for many stories, with at most `max_stories_in_flight` at once."""
+        in_flight = asyncio.Semaphore(self.max_stories_in_flight)
+
+        async def run_bounded(story: Story) -> StoryArtifacts:
+            async with in_flight:
+                return await self.run_story(story)
+
+        return list(await asyncio.gather(*(run_bounded(story) for story in stories)))
@@ -0,0 +1,97 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from ..config.settings import settings
+
+STORY_FILE_NAME = "story.json"
+
+
+@dataclass
+class StoryPage:
+    key: str  # "cover", "1", "2", ...
+    text: str
+    img: str | None = None
+    extra: dict[str, Any] = field(default_factory=dict)  # Other fields, e.g. image_prompt
+
+
+@dataclass
+class Story:
+    name: str  # Directory name under data/stories
+    title: str
+    pages: list[StoryPage] = field(default_factory=list)
+    path: Path | None = None  # Story directory
+    extra: dict[str, Any] = field(default_factory=dict)  # Other fields, e.g. style_guide
+
+    @property
+    def text(self) -> str:
+        """All page texts joined in page order, as used for lyric generation."""
+        return "\n".join(
+            text for page in self.pages if (text := page.text.strip())
+        ).strip()
+
+    @property
+    def page_keys(self) -> list[str]:
+        return [page.key for page in self.pages]
+
+    def page(self, key: str) -> StoryPage:
+        """Returns the page with this key. Raises KeyError if there is none."""
+        for page in self.pages:
+            if page.key == key:
+                return page
+        raise KeyError(key)
+
+    def image_path(self, key: str) -> Path | None:
+        """
+        The page's original illustration: `img/<img>`, or `img/<key>.png` for pages
+        without an `img` field. None if the file does not exist.
+        """
+        if self.path is None:
+            return None
+        img = self.page(key).img or f"{key}.png"
+        path = self.path / "img" / img
+        return path if path.is_file() else None
+
+    @property
+    def output_dir(self) -> Path:
+        """Where generated assets for this story go."""
+        base = self.path if self.path else settings.data_dir / "stories" / self.name
+        return base / "generated"
+
+
+def load_story(story_dir: str | Path) -> Story:
+    """
+    Loads `story.json` from a story directory.
+
+    Args:
+        story_dir: A directory such as data/stories/tea.
+
+    Returns:
+        The story with its pages in file order.
+    """
+    story_dir = Path(story_dir)
+    with open(story_dir / STORY_FILE_NAME, encoding="utf-8") as f:
+        data = json.load(f)
+    pages = [
+        StoryPage(
+            key=key,
+            text=page.get("text", ""),
+            img=page.get("img"),
+            extra={field: value for field, value in page.items() if field not in ("text", "img")},
+        )
+        for key, page in data.get("pages", {}).items()
+    ]
+    return Story(
+        name=story_dir.name,
+        title=data.get("title", story_dir.name),
+        pages=pages,
+        path=story_dir.resolve(),
+        extra={field: value for field, value in data.items() if field not in ("title", "pages")},
+    )
+
+
+def list_story_dirs(stories_dir: str | Path | None = None) -> list[Path]:
+    """Returns every directory under `stories_dir` (default data/stories) that has a story.json."""
+    stories_dir = Path(stories_dir) if stories_dir else settings.data_dir / "stories"
+    return sorted(path.parent for path in stories_dir.glob(f"*/{STORY_FILE_NAME}"))
@@ -0,0 +1,294 @@
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from ..config.settings import settings
+from ..interfaces.text_generation_interface import ChatMessage
+from ..utils.telemetry import telemetry
+
+Prompt = str | Sequence[ChatMessage]
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def to_messages(prompt: Prompt) -> list[ChatMessage]:
+    if isinstance(prompt, str):
+        return [ChatMessage(role="user", content=prompt)]
+    return list(prompt)
+
+
+class RetryableError(Exception):
+    """A request failure worth retrying, e.g. a rate limit or a 5xx response."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    max_attempts: int = 5
+    initial_delay: float = 1.0
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+
+    def delays(self) -> Iterator[float]:
+        """Yields the wait before each retry (one fewer than `max_attempts`)."""
+        delay = self.initial_delay
+        for _ in range(self.max_attempts - 1):
+            yield random.uniform(0, delay)
+            delay = min(delay * self.multiplier, self.max_delay)
+
+
+class PromptCache:
+    """
+    Persistent prompt -> response cache, keyed on the model, the messages and generation parameters.
+
+    Responses are stored as JSON files under `settings.cache_dir / "text"` and also kept
+    in memory for the life of the process.
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None):
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir else settings.cache_dir / "text"
+        ).resolve()
+        self._memory: dict[str, str] = {}
+
+    @staticmethod
+    def make_key(
+        model: str, messages: Sequence[ChatMessage], params: dict[str, Any]
+    ) -> str:
+        payload = {
+            "model": model,
+            "messages": [[message.role, message.content] for message in messages],
+            "params": params,
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        if key in self._memory:
+            return self._memory[key]
+        try:
+            response = json.loads(self._path(key).read_text(encoding="utf-8"))["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+        self._memory[key] = response
+        return response
+
+    def put(self, key: str, response: str) -> None:
+        self._memory[key] = response
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"response": response}, ensure_ascii=False), encoding="utf-8"
+        )
+        os.replace(tmp_path, path)
+
+
+class BaseTextGeneration:
+    """
+    Shared request layer for TextGenerationModel backends.
+
+    Subclasses implement `_complete` for one request. This class adds a prompt cache,
+    de-duplication of identical prompts in flight, a limit on concurrent requests,
+    retries with exponential backoff on `RetryableError`, and `generate_text_batch`.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_concurrency: int = 4,
+        retry_policy: RetryPolicy | None = None,
+        cache: PromptCache | None = None,
+        **params: Any,
+    ):
+        """
+        Args:
+            model: Model name sent to the backend, also part of the cache key.
+            max_concurrency: Most requests in flight at once, across threads.
+            retry_policy: How to back off on retryable errors. Defaults to `RetryPolicy()`.
+            cache: Optional prompt -> response cache.
+            **params: Generation parameters such as temperature or max_tokens.
+        """
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.params = params
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight: dict[str, Future[str]] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _complete(self, messages: Sequence[ChatMessage]) -> str:
+        """Sends one request to the backend and returns the generated text."""
+        raise NotImplementedError
+
+    def _stream(self, messages: Sequence[ChatMessage]) -> Iterator[str]:
+        """Yields the response in pieces as the backend produces them. Defaults to `_complete` whole."""
+        yield self._complete(messages)
+
+    def _complete_with_retries(self, messages: Sequence[ChatMessage]) -> str:
+        delays = self.retry_policy.delays()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self._slots, telemetry.span("text.request", model=self.model, attempt=attempt):
+                    return self._complete(messages)
+            except RetryableError as e:
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                telemetry.count("text_retries", model=self.model)
+                print(f"Warning: {e} Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def generate_text(self, prompt: Prompt) -> str:
+        messages = to_messages(prompt)
+        key = PromptCache.make_key(self.model, messages, self.params)
+        if self.cache is not None and (cached := self.cache.get(key)) is not None:
+            telemetry.count("text_cache_hits", model=self.model)
+            return cached
+
+        # Identical prompts already being generated share that request
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        assert future is not None
+        if not owner:
+            return future.result()
+
+        try:
+            response = self._complete_with_retries(messages)
+            if self.cache is not None:
+                self.cache.put(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def stream_text(self, prompt: Prompt) -> Iterator[str]:
+        """
+        Yields the generated text in pieces as it arrives, e.g. to show lyrics as they are written.
+
+        A cached response is yielded whole. Retryable errors are retried until the first
+        piece arrives; after that they are raised, since the caller already has part of
+        the text. The complete response is cached like `generate_text`'s.
+
+        The request runs on its own thread, which holds a concurrency slot only while
+        the backend responds, so a consumer that stops iterating without closing the
+        generator never keeps a slot from other requests.
+        """
+        messages = to_messages(prompt)
+        key = PromptCache.make_key(self.model, messages, self.params)
+        if self.cache is not None and (cached := self.cache.get(key)) is not None:
+            telemetry.count("text_cache_hits", model=self.model)
+            yield cached
+            return
+
+        replies: queue.Queue[tuple[str, Any]] = queue.Queue()
+        stopped = threading.Event()
+
+        def pump() -> None:
+            delays = self.retry_policy.delays()
+            pieces: list[str] = []
+            started = time.perf_counter()
+            try:
+                while True:
+                    try:
+                        with self._slots:
+                            for piece in self._stream(messages):
+                                if stopped.is_set():
+                                    return  # Closed early: end the response, cache nothing
+                                if not pieces:
+                                    telemetry.observe(
+                                        "text_first_piece_seconds",
+                                        time.perf_counter() - started,
+                                        model=self.model,
+                                    )
+                                pieces.append(piece)
+                                replies.put(("piece", piece))
+                        break
+                    except RetryableError as e:
+                        delay = next(delays, None)
+                        if pieces or delay is None:
+                            raise
+                        if e.retry_after is not None:
+                            delay = max(delay, e.retry_after)
+                        telemetry.count("text_retries", model=self.model)
+                        print(f"Warning: {e} Retrying in {delay:.1f}s...")
+                        time.sleep(delay)
+                if self.cache is not None:
+                    self.cache.put(key, "".join(pieces))
+            except BaseException as e:
+                replies.put(("error", e))
+                return
+            replies.put(("done", None))
+
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(pump,), name="text-stream", daemon=True
+        ).start()
+        try:
+            while True:
+                kind, value = replies.get()
+                if kind == "piece":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            stopped.set()
+
+    def generate_text_batch(
+        self, prompts: Sequence[Prompt], return_exceptions: bool = False
+    ) -> list[Any]:
+        """
+        Generates text for many prompts concurrently, up to `max_concurrency` at once.
+
+        Args:
+            prompts: The prompts, as for `generate_text`.
+            return_exceptions: Return a failed prompt's exception in its place instead of raising.
+
+        Returns:
+            The generated texts, in prompt order.
+        """
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_concurrency, len(prompts)))
+        ) as executor:
+            futures = [executor.submit(self.generate_text, prompt) for prompt in prompts]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
@@ -0,0 +1,162 @@
+import json
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+from ..interfaces.text_generation_interface import ChatMessage
+from ..utils.env_utils import get_env_var
+from .base import (
+    RETRYABLE_STATUS_CODES,
+    BaseTextGeneration,
+    PromptCache,
+    RetryableError,
+    RetryPolicy,
+)
+
+GEMINI_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai"
+HUGGINGFACE_ROUTER_BASE_URL = "https://router.huggingface.co/{provider}/v3/openai"
+
+
+class ChatCompletionsTextGeneration(BaseTextGeneration):
+    """
+    TextGenerationModel for any OpenAI-compatible `/chat/completions` endpoint.
+
+    Gemini, HuggingChat inference providers and local servers (vLLM, llama.cpp,
+    a fake server in tests) all speak this API. Requests share one pooled HTTP
+    client, so connections are kept alive between calls.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str,
+        api_key: str | None = None,
+        timeout: float = 120.0,
+        max_concurrency: int = 4,
+        retry_policy: RetryPolicy | None = None,
+        cache: PromptCache | None = None,
+        **params: Any,
+    ):
+        """
+        Args:
+            model: Model name sent in each request.
+            base_url: API root, e.g. http://127.0.0.1:8000/v1.
+            api_key: Bearer token. None sends no Authorization header.
+            timeout: Seconds per request.
+            max_concurrency: Most requests in flight at once; also the connection pool size.
+            retry_policy: How to back off on rate limits, 5xx responses and connection errors.
+            cache: Optional prompt -> response cache.
+            **params: Extra request fields such as temperature, top_p or max_tokens.
+        """
+        super().__init__(
+            model,
+            max_concurrency=max_concurrency,
+            retry_policy=retry_policy,
+            cache=cache,
+            **params,
+        )
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+
+    @classmethod
+    def gemini(
+        cls, model: str = "gemini-2.0-flash", api_key: str | None = None, **kwargs: Any
+    ) -> "ChatCompletionsTextGeneration":
+        """Gemini through its OpenAI-compatible endpoint, using GEMINI_API_KEY by default."""
+        return cls(
+            model,
+            GEMINI_OPENAI_BASE_URL,
+            api_key=api_key or get_env_var("GEMINI_API_KEY"),
+            **kwargs,
+        )
+
+    @classmethod
+    def huggingchat(
+        cls,
+        model: str = "Qwen/Qwen3-235B-A22B",
+        provider: str = "novita",
+        api_key: str | None = None,
+        **kwargs: Any,
+    ) -> "ChatCompletionsTextGeneration":
+        """A Hugging Face inference provider, using HUGGINGCHAT_API_KEY by default."""
+        kwargs.setdefault("temperature", 0.5)
+        kwargs.setdefault("top_p", 0.7)
+        kwargs.setdefault("max_tokens", 8192)
+        return cls(
+            model,
+            HUGGINGFACE_ROUTER_BASE_URL.format(provider=provider),
+            api_key=api_key or get_env_var("HUGGINGCHAT_API_KEY"),
+            **kwargs,
+        )
+
+    def _payload(self, messages: Sequence[ChatMessage]) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": message.role, "content": message.content}
+                for message in messages
+            ],
+            **self.params,
+        }
+
+    def _check_status(self, response: Any) -> None:
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableError(
+                f"{self.base_url} returned {response.status_code}.",
+                retry_after=float(retry_after)
+                if retry_after and retry_after.isdigit()
+                else None,
+            )
+        response.raise_for_status()
+
+    def _complete(self, messages: Sequence[ChatMessage]) -> str:
+        import httpx
+
+        try:
+            response = self._client.post("/chat/completions", json=self._payload(messages))
+        except httpx.TransportError as e:
+            raise RetryableError(f"Request to {self.base_url} failed: {e}") from e
+        self._check_status(response)
+        return response.json()["choices"][0]["message"]["content"] or ""
+
+    def _stream(self, messages: Sequence[ChatMessage]) -> Iterator[str]:
+        """Streams the completion as server-sent events, one content delta at a time."""
+        import httpx
+
+        payload = {**self._payload(messages), "stream": True}
+        try:
+            with self._client.stream("POST", "/chat/completions", json=payload) as response:
+                if response.status_code >= 400:
+                    response.read()  # So the error carries the body
+                self._check_status(response)
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue  # Blank separators, comments and keep-alives
+                    data = line[len("data:") :].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    if content := choices[0].get("delta", {}).get("content"):
+                        yield content
+        except httpx.TransportError as e:
+            raise RetryableError(f"Request to {self.base_url} failed: {e}") from e
+
+    def close(self) -> None:
+        self._client.close()
+
+    def __enter__(self) -> "ChatCompletionsTextGeneration":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
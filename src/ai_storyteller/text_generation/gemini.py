@@ -0,0 +1,92 @@
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+from ..interfaces.text_generation_interface import ChatMessage
+from ..utils.env_utils import get_env_var
+from .base import (
+    RETRYABLE_STATUS_CODES,
+    BaseTextGeneration,
+    PromptCache,
+    RetryableError,
+    RetryPolicy,
+)
+
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
+
+
+class GeminiTextGeneration(BaseTextGeneration):
+    """TextGenerationModel backed by the Gemini API through google-genai."""
+
+    def __init__(
+        self,
+        model: str = DEFAULT_GEMINI_MODEL,
+        api_key: str | None = None,
+        max_concurrency: int = 4,
+        retry_policy: RetryPolicy | None = None,
+        cache: PromptCache | None = None,
+    ):
+        """
+        Args:
+            model: Gemini model name.
+            api_key: API key. If None, GEMINI_API_KEY is looked up with `get_env_var`.
+            max_concurrency: Most requests in flight at once.
+            retry_policy: How to back off on rate limits and server errors.
+            cache: Optional prompt -> response cache.
+        """
+        super().__init__(
+            model,
+            max_concurrency=max_concurrency,
+            retry_policy=retry_policy,
+            cache=cache,
+        )
+        self._api_key = api_key
+        self._client: Any = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client(
+                api_key=self._api_key or get_env_var("GEMINI_API_KEY")
+            )
+        return self._client
+
+    @staticmethod
+    def _contents(messages: Sequence[ChatMessage]) -> list[Any]:
+        from google.genai import types as gtypes
+
+        return [
+            gtypes.Content(
+                role="model" if message.role == "assistant" else "user",
+                parts=[gtypes.Part.from_text(text=message.content)],
+            )
+            for message in messages
+        ]
+
+    def _complete(self, messages: Sequence[ChatMessage]) -> str:
+        from google.genai import errors as gerrors
+
+        try:
+            response = self.client.models.generate_content(
+                model=self.model, contents=self._contents(messages)
+            )
+        except gerrors.APIError as e:
+            if e.code in RETRYABLE_STATUS_CODES:
+                raise RetryableError(f"Gemini returned {e.code}: {e.message}") from e
+            raise
+        return response.text or ""
+
+    def _stream(self, messages: Sequence[ChatMessage]) -> Iterator[str]:
+        from google.genai import errors as gerrors
+
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model, contents=self._contents(messages)
+            ):
+                if chunk.text:
+                    yield chunk.text
+        except gerrors.APIError as e:
+            if e.code in RETRYABLE_STATUS_CODES:
+                raise RetryableError(f"Gemini returned {e.code}: {e.message}") from e
+            raise
@@ -0,0 +1,444 @@
+import copy
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+from ..interfaces.text_generation_interface import ChatMessage
+from ..utils.telemetry import telemetry
+from .base import BaseTextGeneration, PromptCache, RetryPolicy
+
+DEFAULT_LOCAL_MODEL = "Qwen/Qwen3-4B"
+THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+Quantization = Literal["auto", "int8", "4bit", "none"]
+
+
+def _common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+@dataclass
+class _Request:
+    tokens: list[int]
+    future: Future[Any] = field(default_factory=Future)
+    warm_only: bool = False  # Only compute and cache the KV for `tokens`
+
+
+class TransformersTextGeneration(BaseTextGeneration):
+    """
+    TextGenerationModel that keeps a Hugging Face causal LM resident and batches requests.
+
+    Concurrent `generate_text` calls are queued and a background thread decodes them
+    together, up to `max_batch_size` at a time. Sequences leave the batch as soon as
+    they finish, so one long answer does not hold up the rows around it.
+
+    Prompts that share a token prefix (e.g. every story filled into
+    `GEN_LYRICS_FROM_STORY_PROMPT`) reuse that prefix's KV cache instead of running it
+    through the model again. Prefixes are found automatically from the batch and from
+    recent prompts, or registered up front with `add_prefix`.
+
+    Weights are quantized by default: 4-bit with bitsandbytes on CUDA, as in the
+    notebook, and dynamic int8 on CPU, which roughly halves memory traffic per token.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_LOCAL_MODEL,
+        device: str | None = None,
+        quantization: Quantization = "auto",
+        max_batch_size: int = 8,
+        batch_wait: float = 0.05,
+        max_new_tokens: int = 2048,
+        temperature: float = 0.7,
+        top_p: float = 0.8,
+        enable_thinking: bool = False,
+        min_prefix_tokens: int = 32,
+        max_cached_prefixes: int = 4,
+        num_threads: int | None = None,
+        retry_policy: RetryPolicy | None = None,
+        cache: PromptCache | None = None,
+        share_weights: bool = False,
+    ):
+        """
+        Args:
+            model: Hugging Face model id.
+            device: "cuda" or "cpu". If None, CUDA is used when available.
+            quantization: "4bit" (bitsandbytes, CUDA), "int8" (dynamic, CPU), "none",
+                or "auto" for 4bit on CUDA and int8 on CPU.
+            max_batch_size: Most sequences decoded together.
+            batch_wait: Seconds to wait for more requests before starting a batch.
+            max_new_tokens: Most tokens generated per request.
+            temperature: Sampling temperature. 0 decodes greedily.
+            top_p: Nucleus sampling threshold.
+            enable_thinking: Let Qwen3-style models think before answering. Thinking is
+                always stripped from the returned text.
+            min_prefix_tokens: Shortest shared prefix worth caching.
+            max_cached_prefixes: Prefix KV caches kept in memory.
+            num_threads: Torch CPU threads. None keeps torch's default.
+            retry_policy: How to back off on retryable errors.
+            cache: Optional prompt -> response cache.
+            share_weights: With unquantized CPU weights, memory-map them from a file shared
+                with other processes (see `utils.workers.share_weights`). Quantized
+                weights are rebuilt per process and stay private.
+        """
+        super().__init__(
+            model,
+            # Enough requests in flight to fill the next batch while one is decoding
+            max_concurrency=2 * max_batch_size,
+            retry_policy=retry_policy,
+            cache=cache,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            enable_thinking=enable_thinking,
+        )
+        self.device = device
+        self.quantization = quantization
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.enable_thinking = enable_thinking
+        self.min_prefix_tokens = min_prefix_tokens
+        self.max_cached_prefixes = max_cached_prefixes
+        self.num_threads = num_threads
+        self.share_weights = share_weights
+
+        self._model: Any = None
+        self._tokenizer: Any = None
+        self._eos_ids: set[int] = set()
+        self._pad_id = 0
+        self._load_lock = threading.Lock()
+        self._queue: queue.Queue[_Request | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        # token prefix -> KV cache for it, least recently used first
+        self._prefixes: OrderedDict[tuple[int, ...], Any] = OrderedDict()
+        self._recent_prompts: deque[list[int]] = deque(maxlen=32)
+
+    def load(self) -> None:
+        """Loads the tokenizer and model and starts the batching thread. Called on first use."""
+        with self._load_lock:
+            if self._model is not None:
+                return
+            import torch
+            from transformers import (
+                AutoModelForCausalLM,  # pyright: ignore[reportPrivateImportUsage]
+                AutoTokenizer,  # pyright: ignore[reportPrivateImportUsage]
+            )
+
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+            quantization = self.quantization
+            if quantization == "auto":
+                quantization = "4bit" if device.startswith("cuda") else "int8"
+            if quantization == "int8" and device != "cpu":
+                raise ValueError("int8 dynamic quantization only runs on CPU.")
+            if quantization == "4bit" and not device.startswith("cuda"):
+                raise ValueError("4bit quantization needs CUDA.")
+
+            print(f"Loading {self.model} on {device} ({quantization})...")
+            with telemetry.span(
+                "text.load", model=self.model, device=device, quantization=quantization
+            ):
+                tokenizer = AutoTokenizer.from_pretrained(self.model)
+                if quantization == "4bit":
+                    from transformers import BitsAndBytesConfig  # pyright: ignore[reportPrivateImportUsage]
+
+                    model = AutoModelForCausalLM.from_pretrained(
+                        self.model,
+                        quantization_config=BitsAndBytesConfig(
+                            load_in_4bit=True,
+                            bnb_4bit_compute_dtype=torch.bfloat16,
+                        ),
+                        device_map=device,
+                    )
+                else:
+                    model = AutoModelForCausalLM.from_pretrained(
+                        self.model,
+                        # Dynamic int8 kernels take float32 activations
+                        torch_dtype=torch.float32 if device == "cpu" else torch.bfloat16,
+                    ).to(device)
+                    if quantization == "int8":
+                        model = torch.ao.quantization.quantize_dynamic(
+                            model, {torch.nn.Linear}, dtype=torch.qint8
+                        )
+                    elif self.share_weights and device == "cpu":
+                        from ..utils.workers import share_weights
+
+                        share_weights(model, f"text-{self.model.replace('/', '--')}-float32")
+                model.eval()
+
+            eos = model.generation_config.eos_token_id
+            if eos is None:
+                eos = tokenizer.eos_token_id
+            self._eos_ids = set(eos) if isinstance(eos, list) else {eos}
+            self._pad_id = (
+                tokenizer.pad_token_id
+                if tokenizer.pad_token_id is not None
+                else next(iter(self._eos_ids))
+            )
+            self._tokenizer = tokenizer
+            self._model = model
+            self._thread = threading.Thread(
+                target=self._serve, name="transformers-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stops the batching thread once queued requests are done and frees the model.
+        A later request loads it again.
+        """
+        with self._load_lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+            self._model = None
+            self._tokenizer = None
+            self._prefixes.clear()
+            self._recent_prompts.clear()
+
+    def __enter__(self) -> "TransformersTextGeneration":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    # --- Prompts ---
+
+    def _render(self, messages: Sequence[ChatMessage]) -> str:
+        return self._tokenizer.apply_chat_template(
+            [{"role": message.role, "content": message.content} for message in messages],
+            tokenize=False,
+            add_generation_prompt=True,
+            enable_thinking=self.enable_thinking,
+        )
+
+    def _tokenize(self, text: str) -> list[int]:
+        return self._tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def add_prefix(self, prompt_prefix: str) -> None:
+        """
+        Precomputes the KV cache for the start of a user prompt, e.g. the fixed part of a template.
+
+        Args:
+            prompt_prefix: Text every matching prompt starts with, before the chat template is applied.
+        """
+        self.load()
+        text = self._render([ChatMessage(role="user", content=prompt_prefix)])
+        # Only the template's opening and the prefix itself; whatever follows differs per prompt
+        tokens = self._tokenize(text[: text.index(prompt_prefix) + len(prompt_prefix)])
+        request = _Request(tokens, warm_only=True)
+        self._queue.put(request)
+        request.future.result()
+
+    def _complete(self, messages: Sequence[ChatMessage]) -> str:
+        self.load()
+        request = _Request(self._tokenize(self._render(messages)))
+        self._queue.put(request)
+        return THINK_PATTERN.sub("", request.future.result()).strip()
+
+    # --- Batching thread ---
+
+    def _serve(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(request)
+
+            for request in [request for request in batch if request.warm_only]:
+                try:
+                    self._prefix_cache(request.tokens, len(request.tokens))
+                    request.future.set_result(None)
+                except Exception as e:
+                    request.future.set_exception(e)
+            batch = [request for request in batch if not request.warm_only]
+            if not batch:
+                continue
+            try:
+                texts = self._generate_batch([request.tokens for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                for request, text in zip(batch, texts):
+                    request.future.set_result(text)
+
+    # --- Prefix KV cache ---
+
+    def _prefix_cache(self, tokens: list[int], length: int) -> Any:
+        """
+        Returns a fresh KV cache holding `tokens[:length]`.
+
+        Starts from the cached prefix sharing the most tokens with it, cropped to the
+        shared part, and runs only the remaining tokens through the model. The result
+        is cached for later prompts.
+        """
+        import torch
+        from transformers import DynamicCache
+
+        key = tuple(tokens[:length])
+        best_key, best_length = None, 0
+        for cached_key in self._prefixes:
+            shared = _common_prefix_length(cached_key, key)
+            if shared > best_length:
+                best_key, best_length = cached_key, shared
+
+        if best_key is not None and best_length >= self.min_prefix_tokens:
+            self._prefixes.move_to_end(best_key)
+            cache = copy.deepcopy(self._prefixes[best_key])
+            if best_length < len(best_key):
+                cache.crop(best_length - len(best_key))  # Negative: drop that many tokens
+            if best_length == length:
+                return cache
+        else:
+            cache, best_length = DynamicCache(), 0
+
+        device = self._model.device
+        with torch.no_grad():
+            out = self._model(
+                input_ids=torch.tensor([key[best_length:]], device=device),
+                position_ids=torch.arange(best_length, length, device=device)[None],
+                past_key_values=cache,
+                use_cache=True,
+            )
+        self._prefixes[key] = out.past_key_values
+        while len(self._prefixes) > self.max_cached_prefixes:
+            self._prefixes.popitem(last=False)
+        return copy.deepcopy(out.past_key_values)
+
+    def _shared_prefix_length(self, prompts: list[list[int]]) -> int:
+        """Length of the prefix worth reusing for a batch, or 0 if none is."""
+        # Leave every prompt at least one token to run through the model
+        common = prompts[0][: min(len(tokens) for tokens in prompts) - 1]
+        for tokens in prompts[1:]:
+            common = common[: _common_prefix_length(common, tokens)]
+        if len(prompts) == 1:
+            # A lone prompt only shares what earlier prompts also had
+            seen = [*self._recent_prompts, *self._prefixes]
+            length = max((_common_prefix_length(common, tokens) for tokens in seen), default=0)
+        else:
+            length = len(common)
+        return length if length >= self.min_prefix_tokens else 0
+
+    # --- Decoding ---
+
+    def _sample(self, logits: Any) -> Any:
+        import torch
+
+        if self.temperature <= 0:
+            return logits.argmax(dim=-1)
+        probs = torch.softmax(logits.float() / self.temperature, dim=-1)
+        if self.top_p < 1.0:
+            sorted_probs, sorted_ids = probs.sort(dim=-1, descending=True)
+            sorted_probs[sorted_probs.cumsum(dim=-1) - sorted_probs > self.top_p] = 0
+            probs = torch.zeros_like(probs).scatter_(-1, sorted_ids, sorted_probs)
+        return torch.multinomial(probs, num_samples=1).squeeze(-1)
+
+    def _generate_batch(self, prompts: list[list[int]]) -> list[str]:
+        import torch
+        from transformers import DynamicCache
+
+        # no_grad rather than inference_mode: cached prefixes are deep-copied later
+        with (
+            telemetry.span(
+                "text.batch",
+                model=self.model,
+                batch=len(prompts),
+                prompt_tokens=sum(len(tokens) for tokens in prompts),
+            ) as span,
+            torch.no_grad(),
+        ):
+            started = time.perf_counter()
+            device = self._model.device
+            prefix_length = self._shared_prefix_length(prompts)
+            if prefix_length:
+                cache = self._prefix_cache(prompts[0], prefix_length)
+                cache.batch_repeat_interleave(len(prompts))
+            else:
+                cache = DynamicCache()
+            self._recent_prompts.extend(prompts)
+
+            # Pad between the shared prefix and each suffix so all rows end together
+            suffixes = [tokens[prefix_length:] for tokens in prompts]
+            width = max(len(suffix) for suffix in suffixes)
+            input_ids = torch.tensor(
+                [[self._pad_id] * (width - len(suffix)) + suffix for suffix in suffixes],
+                device=device,
+            )
+            attention_mask = torch.tensor(
+                [
+                    [1] * prefix_length + [0] * (width - len(suffix)) + [1] * len(suffix)
+                    for suffix in suffixes
+                ],
+                device=device,
+            )
+
+            generated: list[list[int]] = [[] for _ in prompts]
+            active = list(range(len(prompts)))  # Prompt index of each batch row
+            for step in range(self.max_new_tokens):
+                position_ids = (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+                out = self._model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    position_ids=position_ids[:, -input_ids.shape[1] :],
+                    past_key_values=cache,
+                    use_cache=True,
+                )
+                cache = out.past_key_values
+                next_tokens = self._sample(out.logits[:, -1, :])
+                if step == 0:
+                    telemetry.observe(
+                        "text_first_token_seconds", time.perf_counter() - started, model=self.model
+                    )
+
+                keep = []
+                for row, token in enumerate(next_tokens.tolist()):
+                    if token not in self._eos_ids:
+                        generated[active[row]].append(token)
+                        keep.append(row)
+                if not keep:
+                    break
+                if len(keep) < len(active):
+                    # Drop finished rows so the rest decode with a smaller batch
+                    rows = torch.tensor(keep, device=device)
+                    cache.batch_select_indices(rows)
+                    attention_mask = attention_mask[rows]
+                    next_tokens = next_tokens[rows]
+                    active = [active[row] for row in keep]
+                input_ids = next_tokens[:, None]
+                attention_mask = torch.cat(
+                    [attention_mask, attention_mask.new_ones((len(active), 1))], dim=-1
+                )
+
+            new_tokens = sum(len(tokens) for tokens in generated)
+            span.attributes.update(prefix_tokens=prefix_length, new_tokens=new_tokens)
+            telemetry.count("text_tokens_generated", new_tokens, model=self.model)
+
+        return [
+            self._tokenizer.decode(tokens, skip_special_tokens=True) for tokens in generated
+        ]
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from ..config.settings import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class ClipCache:
+    """
+    Persistent cache of synthesized speech, keyed on the text, voice and model.
+
+    Clips are stored as float32 `.npy` files under `<cache_dir>/<key[:2]>/<key>.npy`, so a
+    page narrated once never has to be synthesized again, even after a story edit that
+    leaves most of its sentences unchanged.
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None):
+        """
+        Args:
+            cache_dir: Where to store clips. Defaults to `settings.cache_dir / "tts"`.
+        """
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir else settings.cache_dir / "tts"
+        ).resolve()
+
+    @staticmethod
+    def make_key(text: str, voice: str | None, model_id: str) -> str:
+        return hashlib.sha256(
+            json.dumps([text, voice, model_id], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def get(self, key: str) -> "np.ndarray | None":
+        import numpy as np
+
+        path = self._path(key)
+        if not path.is_file():
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            return None  # Partially written or corrupt; synthesize again
+
+    def put(self, key: str, clip: "np.ndarray") -> Path:
+        import numpy as np
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp.npy")
+        np.save(tmp_path, clip.astype(np.float32, copy=False))
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,254 @@
+import queue
+import threading
+from collections.abc import Callable, Iterator, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ..interfaces.tts_interface import TTSModel
+from ..music_generation.streaming import AudioChunk, write_wav
+from ..pipeline.story import Story
+from .cache import ClipCache
+from .sentences import detect_language, split_sentences
+from .vits import VITS_MODELS, VitsTTS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def to_pcm(clip: "np.ndarray", pause_samples: int = 0) -> "np.ndarray":
+    """Converts a float waveform to int16 [samples, 1] PCM, followed by `pause_samples` of silence."""
+    import numpy as np
+
+    pcm = np.zeros((len(clip) + pause_samples, 1), dtype=np.int16)
+    pcm[: len(clip), 0] = (np.clip(clip, -1.0, 1.0) * 32767).astype(np.int16)
+    return pcm
+
+
+class NarrationEngine:
+    """
+    Reads story pages aloud with a TTSModel, sentence by sentence.
+
+    `stream` synthesizes the first (shortened) sentence on its own and the rest in
+    batches on a background thread, yielding each sentence's audio as soon as it is
+    ready, so playback starts after one short synthesis instead of the whole page.
+    `narrate_pages` and `narrate_story` batch sentences across pages to write one WAV
+    per page. Every clip goes through the clip cache, keyed on (text, voice, model).
+    """
+
+    def __init__(
+        self,
+        model: TTSModel,
+        cache: ClipCache | None = None,
+        voice: str | None = None,
+        max_batch_size: int = 8,
+        max_chars: int = 80,
+        first_max_chars: int = 16,
+        pause: float = 0.25,
+    ):
+        """
+        Args:
+            model: The speech synthesizer.
+            cache: Clip cache. None disables caching.
+            voice: Default voice, passed to the model.
+            max_batch_size: Most sentences synthesized in one model call.
+            max_chars: Longer sentences are split at commas.
+            first_max_chars: Limit for a page's first piece, which decides time to first audio.
+            pause: Seconds of silence after each sentence.
+        """
+        self.model = model
+        self.cache = cache
+        self.voice = voice
+        self.max_batch_size = max_batch_size
+        self.max_chars = max_chars
+        self.first_max_chars = first_max_chars
+        self.pause = pause
+        # Model calls from concurrent streams take turns
+        self._model_lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        name = getattr(self.model, "model", None) or ""
+        return f"{type(self.model).__name__}:{name}"
+
+    def split(self, text: str) -> list[str]:
+        return split_sentences(text, self.max_chars, self.first_max_chars)
+
+    def synthesize(
+        self, sentences: Sequence[str], voice: str | None = None
+    ) -> list["np.ndarray"]:
+        """
+        Returns a waveform per sentence, from the cache where possible.
+
+        Uncached sentences are de-duplicated, sorted by length so each batch pads little,
+        and synthesized `max_batch_size` at a time.
+        """
+        voice = voice if voice is not None else self.voice
+        clips: dict[str, Any] = {}
+        keys = {}
+        for sentence in dict.fromkeys(sentences):
+            if self.cache is not None:
+                keys[sentence] = key = ClipCache.make_key(sentence, voice, self.model_id)
+                if (clip := self.cache.get(key)) is not None:
+                    clips[sentence] = clip
+
+        missing = sorted((s for s in dict.fromkeys(sentences) if s not in clips), key=len)
+        for start in range(0, len(missing), self.max_batch_size):
+            batch = missing[start : start + self.max_batch_size]
+            with self._model_lock:
+                synthesized = self.model.synthesize_batch(batch, voice=voice)
+            for sentence, clip in zip(batch, synthesized):
+                clips[sentence] = clip
+                if self.cache is not None:
+                    self.cache.put(keys[sentence], clip)
+        return [clips[sentence] for sentence in sentences]
+
+    def stream(self, text: str, voice: str | None = None) -> Iterator[AudioChunk]:
+        """
+        Yields a page's narration one sentence at a time, as soon as each is synthesized.
+
+        Args:
+            text: Page text.
+            voice: Voice to use. Defaults to the engine's voice.
+
+        Yields:
+            One `AudioChunk` per sentence, including the pause after it.
+        """
+        sentences = self.split(text)
+        if not sentences:
+            return
+        # The first sentence goes alone: it is all the listener waits for
+        batches = [sentences[:1]] + [
+            sentences[start : start + self.max_batch_size]
+            for start in range(1, len(sentences), self.max_batch_size)
+        ]
+        ready: queue.Queue[list[Any] | BaseException] = queue.Queue()
+        stopped = threading.Event()
+
+        def produce() -> None:
+            for batch in batches:
+                if stopped.is_set():
+                    return
+                try:
+                    ready.put(self.synthesize(batch, voice))
+                except BaseException as e:
+                    ready.put(e)
+                    return
+
+        threading.Thread(target=produce, name="narration", daemon=True).start()
+        sample_rate = self.model.sample_rate
+        pause_samples = round(self.pause * sample_rate)
+        start_sample = 0
+        try:
+            for batch_index in range(len(batches)):
+                clips = ready.get()
+                if isinstance(clips, BaseException):
+                    raise clips
+                for clip_index, clip in enumerate(clips):
+                    pcm = to_pcm(clip, pause_samples)
+                    yield AudioChunk(
+                        pcm=pcm,
+                        sample_rate=sample_rate,
+                        start_sample=start_sample,
+                        is_last=batch_index == len(batches) - 1
+                        and clip_index == len(clips) - 1,
+                    )
+                    start_sample += len(pcm)
+        finally:
+            stopped.set()  # The consumer may stop early; synthesize no further batches
+
+    def narrate_pages(
+        self,
+        pages: dict[str, str],
+        output_dir: str | Path,
+        voice: str | None = None,
+    ) -> dict[str, Path]:
+        """
+        Writes one WAV per page, synthesizing the sentences of all pages in shared batches.
+
+        Args:
+            pages: Page key -> page text. Pages without text are skipped.
+            output_dir: Where to write `<page key>.wav`.
+            voice: Voice to use. Defaults to the engine's voice.
+
+        Returns:
+            Page key -> written WAV file.
+        """
+        page_sentences = {
+            key: sentences for key, text in pages.items() if (sentences := self.split(text))
+        }
+        all_sentences = [s for sentences in page_sentences.values() for s in sentences]
+        clips = dict(zip(all_sentences, self.synthesize(all_sentences, voice)))
+
+        sample_rate = self.model.sample_rate
+        pause_samples = round(self.pause * sample_rate)
+        paths = {}
+        for key, sentences in page_sentences.items():
+            chunks = []
+            start_sample = 0
+            for i, sentence in enumerate(sentences):
+                pcm = to_pcm(clips[sentence], pause_samples)
+                chunks.append(
+                    AudioChunk(pcm, sample_rate, start_sample, is_last=i == len(sentences) - 1)
+                )
+                start_sample += len(pcm)
+            paths[key] = write_wav(chunks, Path(output_dir) / f"{key}.wav")
+        return paths
+
+    def narrate_story(self, story: Story, voice: str | None = None) -> dict[str, Path]:
+        """Narrates every page with text into `<story output dir>/narration/<page key>.wav`."""
+        return self.narrate_pages(
+            {page.key: page.text for page in story.pages},
+            story.output_dir / "narration",
+            voice,
+        )
+
+
+class NarrationVoices:
+    """
+    Picks a `NarrationEngine` per story language, so each story is read by a voice that speaks it.
+
+    Engines are built on first use and share one clip cache.
+    """
+
+    def __init__(
+        self,
+        models: dict[str, str] | None = None,
+        cache: ClipCache | None = None,
+        voice: str | None = None,
+        factory: Callable[[str], TTSModel] = VitsTTS,
+    ):
+        """
+        Args:
+            models: Language ("en", "zh", see `detect_language`) -> checkpoint; "*" is
+                used for any language without its own. Defaults to `VITS_MODELS`.
+            cache: Clip cache shared by every engine. None disables caching.
+            voice: Default voice, passed to every engine.
+            factory: Builds a TTSModel from a checkpoint.
+        """
+        self.models = dict(VITS_MODELS if models is None else models)
+        self.cache = cache
+        self.voice = voice
+        self.factory = factory
+        self._engines: dict[str, NarrationEngine] = {}
+        self._lock = threading.Lock()
+
+    def engine(self, story: Story) -> NarrationEngine:
+        """
+        The engine for the story's language.
+
+        Raises:
+            ValueError: If there is no voice for the story's language.
+        """
+        language = detect_language(story.text)
+        model = self.models.get(language) or self.models.get("*")
+        if model is None:
+            raise ValueError(
+                f"No narration voice for {language!r} stories; "
+                f"add a VITS checkpoint for {language!r}."
+            )
+        with self._lock:
+            if model not in self._engines:
+                self._engines[model] = NarrationEngine(
+                    self.factory(model), cache=self.cache, voice=self.voice
+                )
+            return self._engines[model]
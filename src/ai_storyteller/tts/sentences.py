@@ -0,0 +1,74 @@
+import re
+
+# Sentence ends, including any closing quotes or brackets after them
+SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？!?…；;])[」』”’\"')）]*|(?<=[.])[\"')]*(?=\s)")
+# Places a long sentence can be split without breaking a phrase
+CLAUSE_END_PATTERN = re.compile(r"(?<=[，,、：:])")
+ABBREVIATIONS = ("Mr.", "Mrs.", "Ms.", "Dr.", "St.")
+HAN_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+LATIN_PATTERN = re.compile(r"[A-Za-z]")
+
+
+def _split_after(pattern: re.Pattern[str], text: str) -> list[str]:
+    pieces, start = [], 0
+    for match in pattern.finditer(text):
+        pieces.append(text[start : match.end()])
+        start = match.end()
+    pieces.append(text[start:])
+    return [piece for piece in pieces if piece.strip()]
+
+
+def _split_long(sentence: str, max_chars: int) -> list[str]:
+    """Splits a sentence at clause punctuation into pieces of at most about `max_chars`."""
+    if len(sentence) <= max_chars:
+        return [sentence.strip()]
+    pieces: list[str] = []
+    for clause in _split_after(CLAUSE_END_PATTERN, sentence):
+        if pieces and len(pieces[-1]) + len(clause) <= max_chars:
+            pieces[-1] += clause
+        else:
+            pieces.append(clause)
+    return [piece.strip() for piece in pieces]
+
+
+def split_sentences(
+    text: str, max_chars: int = 80, first_max_chars: int | None = None
+) -> list[str]:
+    """
+    Splits page text into sentences for narration.
+
+    Handles Chinese and English punctuation, keeps closing quotes with their sentence
+    (「好想喝點冰的！」 stays whole) and treats line breaks as sentence ends.
+
+    Args:
+        text: Page text, e.g. a page's `text` from story.json.
+        max_chars: Sentences longer than this are split at commas.
+        first_max_chars: Tighter limit for the first piece, so audio can start sooner.
+
+    Returns:
+        The sentences, in reading order, without surrounding whitespace.
+    """
+    sentences: list[str] = []
+    for line in text.splitlines():
+        merged: list[str] = []
+        for sentence in _split_after(SENTENCE_END_PATTERN, line):
+            if merged and merged[-1].strip().endswith(ABBREVIATIONS):
+                merged[-1] += sentence  # "Mr." does not end a sentence
+            else:
+                merged.append(sentence)
+        for sentence in merged:
+            limit = max_chars
+            if not sentences and first_max_chars is not None:
+                limit = first_max_chars
+            pieces = _split_long(sentence, limit)
+            if not sentences and len(pieces) > 1:
+                # Only the first piece needs to be short; rejoin the rest
+                sentences.append(pieces[0])
+                pieces = _split_long(sentence.strip()[len(pieces[0]) :], max_chars)
+            sentences.extend(pieces)
+    return sentences
+
+
+def detect_language(text: str) -> str:
+    """Guesses a text's language from its script: "zh" if Han characters outnumber Latin letters, else "en"."""
+    return "zh" if len(HAN_PATTERN.findall(text)) > len(LATIN_PATTERN.findall(text)) else "en"
@@ -0,0 +1,110 @@
+import threading
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_VITS_MODEL = "facebook/mms-tts-eng"
+# Voices by story language (see `sentences.detect_language`). There is no Chinese one
+# yet: pass a Mandarin VITS checkpoint for "zh" rather than read Chinese in English
+VITS_MODELS = {"en": DEFAULT_VITS_MODEL}
+
+
+class VitsTTS:
+    """
+    TTSModel running a VITS checkpoint from transformers, such as the MMS-TTS voices, on CPU.
+
+    VITS is non-autoregressive, so a batch of sentences costs one forward pass and a
+    short sentence is synthesized in well under a second on a laptop CPU. Any
+    `VitsModel` checkpoint works; checkpoints whose tokenizer expects romanized input
+    (`is_uroman`) need the `uroman` package.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_VITS_MODEL,
+        device: str = "cpu",
+        speaking_rate: float = 1.0,
+        num_threads: int | None = None,
+    ):
+        """
+        Args:
+            model: Hugging Face id of a VITS checkpoint.
+            device: Torch device to run on.
+            speaking_rate: Above 1 speaks faster, below 1 slower.
+            num_threads: Torch CPU threads. None keeps torch's default.
+        """
+        self.model = model
+        self.device = device
+        self.speaking_rate = speaking_rate
+        self.num_threads = num_threads
+        self._model: Any = None
+        self._tokenizer: Any = None
+        self._uroman: Any = None
+        self._load_lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._model is not None:
+                return
+            import torch
+            from transformers import (
+                AutoTokenizer,  # pyright: ignore[reportPrivateImportUsage]
+                VitsModel,  # pyright: ignore[reportPrivateImportUsage]
+            )
+
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            print(f"Loading {self.model} on {self.device}...")
+            tokenizer = AutoTokenizer.from_pretrained(self.model)
+            if getattr(tokenizer, "is_uroman", False):
+                try:
+                    import uroman  # type: ignore
+                except ImportError as e:
+                    raise ImportError(
+                        f"{self.model} expects romanized text; install the 'uroman' package."
+                    ) from e
+                self._uroman = uroman.Uroman()
+            model = VitsModel.from_pretrained(self.model).to(self.device)
+            model.speaking_rate = self.speaking_rate
+            model.eval()
+            self._tokenizer = tokenizer
+            self._model = model
+
+    @property
+    def sample_rate(self) -> int:
+        self.load()
+        return self._model.config.sampling_rate
+
+    def synthesize_batch(
+        self, texts: Sequence[str], voice: str | None = None
+    ) -> list["np.ndarray"]:
+        """
+        Synthesizes speech for several sentences in one forward pass.
+
+        Args:
+            texts: Sentences to speak.
+            voice: Speaker id for multi-speaker checkpoints. Ignored by single-speaker ones.
+
+        Returns:
+            One mono float32 waveform per text, at `sample_rate`.
+        """
+        import torch
+
+        self.load()
+        if not texts:
+            return []
+        if self._uroman is not None:
+            texts = [self._uroman.romanize_string(text) for text in texts]
+        inputs = self._tokenizer(list(texts), padding=True, return_tensors="pt").to(
+            self.device
+        )
+        kwargs = {}
+        if voice is not None and self._model.config.num_speakers > 1:
+            kwargs["speaker_id"] = int(voice)
+        with torch.no_grad():
+            output = self._model(**inputs, **kwargs)
+        waveforms = output.waveform.float().cpu().numpy()
+        lengths = output.sequence_lengths.tolist()
+        return [waveform[:length] for waveform, length in zip(waveforms, lengths)]
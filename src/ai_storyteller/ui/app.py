@@ -0,0 +1,452 @@
+import contextvars
+import os
+import threading
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ..music_generation.streaming import record_wav
+from ..pipeline.manifest import StoryManifest
+from ..pipeline.runner import StoryPipeline
+from ..pipeline.story import Story
+from ..text_generation.base import BaseTextGeneration
+from ..utils.telemetry import telemetry
+
+if TYPE_CHECKING:
+    import gradio as gr
+    import numpy as np
+
+    from ..tts.narration import NarrationVoices
+
+# Requests each kind of endpoint serves at once; the rest wait in the queue
+DEFAULT_CONCURRENCY = {"text": 8, "music": 1, "image": 4, "tts": 2}
+
+Gallery = list[tuple[str, str]]  # (image path, caption)
+
+
+class _Flight:
+    """
+    One render in progress, shared by every request for the same artifact.
+
+    The render runs on its own thread and publishes partial results with `add`; each
+    request follows them from the start with `follow`, so requests that join late see
+    everything, and none holds a lock while its consumer is away.
+    """
+
+    def __init__(self) -> None:
+        self.items: list[Any] = []
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.done = False
+        self._changed = threading.Condition()
+
+    def add(self, item: Any) -> None:
+        with self._changed:
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def finish(self, result: Any = None, error: BaseException | None = None) -> None:
+        with self._changed:
+            self.result, self.error, self.done = result, error, True
+            self._changed.notify_all()
+
+    def follow(self) -> Iterator[Any]:
+        """Yields every partial result, then returns once the render is done."""
+        seen = 0
+        while True:
+            with self._changed:
+                while seen == len(self.items) and not self.done:
+                    self._changed.wait()
+                new, done = self.items[seen:], self.done
+            seen += len(new)
+            yield from new
+            if done and seen == len(self.items):
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def wait(self) -> Any:
+        """Waits for the render, ignoring partial results. Returns its result."""
+        for _ in self.follow():
+            pass
+        return self.result
+
+
+class StoryStudio:
+    """
+    The generation endpoints behind the UI, each a generator that yields partial results.
+
+    Every endpoint first reuses finished work: artifacts are looked up in the story's
+    manifest under the same input fingerprints `StoryPipeline` uses, so anything built
+    with `ai-storyteller build` is served at once and vice versa. Misses go to the
+    backends, whose own caches (prompt, music and clip caches) catch repeats. Requests
+    for the same artifact of the same story wait for the first one to finish and then
+    reuse its result instead of rendering it again.
+
+    Renders run on their own threads, so a user who leaves mid-stream neither stops a
+    render others are following nor keeps anyone waiting on a lock.
+    """
+
+    def __init__(
+        self,
+        pipeline: StoryPipeline,
+        stories: Sequence[Story],
+        narration: "NarrationVoices | None" = None,
+    ):
+        """
+        Args:
+            pipeline: Holds the models and settings; its stages do the work.
+            stories: Stories offered in the UI.
+            narration: Reads pages aloud in each story's language. If None, narration
+                is not offered.
+        """
+        self.pipeline = pipeline
+        self.stories = {story.name: story for story in stories}
+        self.narration = narration
+        self._flights: dict[tuple[str, str], _Flight] = {}
+        self._manifest_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def story_names(self) -> list[str]:
+        return list(self.stories)
+
+    def story(self, name: str) -> Story:
+        try:
+            return self.stories[name]
+        except KeyError:
+            raise ValueError(f"Unknown story: {name}") from None
+
+    # --- Shared artifacts ---
+
+    def _flight(
+        self, story: Story, artifact: str, render: Callable[[Callable[[Any], None]], Any]
+    ) -> _Flight:
+        """
+        Returns the render of this artifact in progress, starting one if there is none.
+
+        `render` is called with a function that publishes a partial result, and returns
+        the artifact's path. It should check the manifest first: a render that finished
+        just before this one started has already recorded its artifact.
+        """
+        key = (story.name, artifact)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight
+            flight = self._flights[key] = _Flight()
+
+        def run() -> None:
+            try:
+                result = render(flight.add)
+            except BaseException as e:
+                flight.finish(error=e)
+            else:
+                flight.finish(result)
+            finally:
+                with self._lock:
+                    del self._flights[key]
+
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(run,), name=f"ui-{artifact}", daemon=True
+        ).start()
+        return flight
+
+    def _fresh(self, story: Story, artifact: str, inputs_fingerprint: str) -> Path | None:
+        return StoryManifest(story.output_dir).fresh_path(artifact, inputs_fingerprint)
+
+    def _record(self, story: Story, artifact: str, inputs_fingerprint: str, path: Path) -> None:
+        # Re-read under the lock so concurrent endpoints don't drop each other's entries
+        with self._lock:
+            lock = self._manifest_locks.setdefault(story.name, threading.Lock())
+        with lock:
+            StoryManifest(story.output_dir).record(artifact, inputs_fingerprint, path)
+
+    def _generated_image(self, story: Story, page_key: str) -> Path | None:
+        if self.pipeline.image_model is None:
+            return None
+        return self._fresh(
+            story, f"image:{page_key}", self.pipeline.image_fingerprint(story, page_key)
+        )
+
+    # --- Endpoints ---
+
+    def show_story(self, name: str) -> tuple[str, Gallery, list[str]]:
+        """
+        Returns the story as Markdown, its page images and its page keys.
+
+        Pages show their generated image if one is up to date, else the original.
+        """
+        story = self.story(name)
+        pages = [f"# {story.title}"]
+        gallery: Gallery = []
+        for page in story.pages:
+            if page.text.strip():
+                pages.append(f"**{page.key}**\n\n{page.text.strip()}")
+            image = self._generated_image(story, page.key) or story.image_path(page.key)
+            if image is not None:
+                gallery.append((str(image), page.key))
+        return "\n\n".join(pages), gallery, story.page_keys
+
+    def _lyrics_steps(self, story: Story) -> Iterator[tuple[str, str, Path | None]]:
+        """Yields (lyrics so far, LRC, LRC path); the LRC parts are empty until the end."""
+        pipeline = self.pipeline
+        lyrics_fingerprint = pipeline.lyrics_fingerprint(story)
+        lyrics_path = self._fresh(story, "lyrics", lyrics_fingerprint)
+        if lyrics_path is None:
+
+            def write_lyrics(publish: Callable[[str], None]) -> Path:
+                if path := self._fresh(story, "lyrics", lyrics_fingerprint):
+                    return path
+                prompt = pipeline.lyrics_prompt(story)
+                # Process-pooled models can't stream across the pipe; they answer whole
+                if isinstance(pipeline.text_model, BaseTextGeneration):
+                    lyrics = ""
+                    for piece in pipeline.text_model.stream_text(prompt):
+                        lyrics += piece
+                        publish(lyrics)
+                else:
+                    lyrics = pipeline.text_model.generate_text(prompt)
+                path = pipeline.save_lyrics(story, lyrics)
+                self._record(story, "lyrics", lyrics_fingerprint, path)
+                return path
+
+            flight = self._flight(story, "lyrics", write_lyrics)
+            for lyrics in flight.follow():
+                yield lyrics, "", None
+            lyrics_path = flight.result
+        lyrics = lyrics_path.read_text(encoding="utf-8")
+        yield lyrics, "", None
+
+        lrc_fingerprint = pipeline.lrc_fingerprint(lyrics_path)
+        lrc_path = self._fresh(story, "lrc", lrc_fingerprint)
+        if lrc_path is None:
+
+            def clean_lyrics(publish: Callable[[Any], None]) -> Path:
+                if path := self._fresh(story, "lrc", lrc_fingerprint):
+                    return path
+                path = pipeline.clean_lyrics(story, lyrics_path)
+                self._record(story, "lrc", lrc_fingerprint, path)
+                return path
+
+            lrc_path = self._flight(story, "lrc", clean_lyrics).wait()
+        yield lyrics, lrc_path.read_text(encoding="utf-8"), lrc_path
+
+    def lyrics(self, name: str) -> Iterator[tuple[str, str]]:
+        """Yields (lyrics so far, LRC) as the lyrics are written, then the cleaned LRC."""
+        for lyrics, lrc, _ in self._lyrics_steps(self.story(name)):
+            yield lyrics, lrc
+
+    def song(self, name: str) -> Iterator[Any]:
+        """
+        Yields the song: (sample rate, int16 PCM) chunks while it is generated, or its
+        file path if it is already built.
+
+        The lyrics are generated first if needed. Streamed audio is saved as the story's
+        song.wav once complete, so the next request gets the file.
+        """
+        pipeline = self.pipeline
+        if pipeline.music_model is None:
+            raise ValueError("Music generation is disabled.")
+        story = self.story(name)
+        lrc_path = None
+        for _, _, lrc_path in self._lyrics_steps(story):
+            pass
+        assert lrc_path is not None
+
+        song_fingerprint = pipeline.song_fingerprint(lrc_path)
+        song_path = self._fresh(story, "song", song_fingerprint)
+        if song_path is not None:
+            yield str(song_path)
+            return
+
+        def sing(publish: Callable[[tuple[int, "np.ndarray"]], None]) -> Path:
+            if path := self._fresh(story, "song", song_fingerprint):
+                return path
+            stream_music = getattr(pipeline.music_model, "stream_music", None)
+            if stream_music is None:
+                path = pipeline.generate_song(story, lrc_path)
+            else:
+                path = story.output_dir / "song.wav"
+                partial_path = path.with_suffix(".part.wav")
+                chunks = stream_music(
+                    ref_prompt=pipeline.ref_prompt,
+                    lrc_path=lrc_path,
+                    audio_length=pipeline.audio_length,
+                )
+                for chunk in record_wav(chunks, partial_path):
+                    publish((chunk.sample_rate, chunk.pcm))
+                os.replace(partial_path, path)
+            self._record(story, "song", song_fingerprint, path)
+            return path
+
+        flight = self._flight(story, "song", sing)
+        streamed = False
+        for chunk in flight.follow():
+            streamed = True
+            yield chunk
+        if not streamed:  # Generated without streaming, or found built
+            yield str(flight.result)
+
+    def narrate(self, name: str, page_key: str) -> Iterator[tuple[int, "np.ndarray"]]:
+        """Yields a page's narration as (sample rate, int16 PCM), one sentence at a time."""
+        if self.narration is None:
+            raise ValueError("Narration is disabled.")
+        story = self.story(name)
+        text = story.page(page_key).text.strip() or story.title  # The cover has no text
+        for chunk in self.narration.engine(story).stream(text):
+            yield chunk.sample_rate, chunk.pcm
+
+    def _page_image(self, story: Story, page_key: str) -> Path:
+        artifact = f"image:{page_key}"
+        image_fingerprint = self.pipeline.image_fingerprint(story, page_key)
+
+        def illustrate(publish: Callable[[Any], None]) -> Path:
+            if path := self._fresh(story, artifact, image_fingerprint):
+                return path
+            path = self.pipeline.generate_page_image(story, page_key)
+            self._record(story, artifact, image_fingerprint, path)
+            return path
+
+        return self._flight(story, artifact, illustrate).wait()
+
+    def images(self, name: str) -> Iterator[Gallery]:
+        """
+        Yields the page gallery: first with every up-to-date image, then again as each
+        missing page is rendered.
+
+        Missing pages are requested together, so a batching image model renders them
+        in one batch. Pages that fail keep their original image.
+        """
+        if self.pipeline.image_model is None:
+            raise ValueError("Image generation is disabled.")
+        story = self.story(name)
+        images: dict[str, Path | None] = {}
+        missing = []
+        for key in story.page_keys:
+            images[key] = self._generated_image(story, key)
+            if images[key] is None:
+                missing.append(key)
+                images[key] = story.image_path(key)
+
+        def gallery() -> Gallery:
+            return [(str(path), key) for key, path in images.items() if path is not None]
+
+        yield gallery()
+        if not missing:
+            return
+        with ThreadPoolExecutor(len(missing), thread_name_prefix="ui-image") as pool:
+            futures = {pool.submit(self._page_image, story, key): key for key in missing}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    images[key] = future.result()
+                except Exception as e:
+                    telemetry.count("ui_errors", endpoint="images")
+                    print(f"[{story.name}] image:{key} failed: {e}")
+                    continue
+                yield gallery()
+
+
+def build_app(
+    studio: StoryStudio,
+    concurrency: dict[str, int] | None = None,
+    max_queue_size: int | None = 64,
+) -> "gr.Blocks":
+    """
+    Builds the Gradio app: pick a story, then stream its lyrics, song, narration and images.
+
+    Every endpoint runs through Gradio's queue. Endpoints sharing a model share a
+    concurrency group, so a burst of users queues for the model instead of
+    overloading it, while cheap cache hits are never stuck behind long renders of
+    another kind.
+
+    Args:
+        studio: The endpoints.
+        concurrency: Requests served at once per group ("text", "music", "image",
+            "tts"), merged over `DEFAULT_CONCURRENCY`.
+        max_queue_size: Requests allowed to wait before new ones are turned away.
+            None for no limit.
+    """
+    import gradio as gr
+
+    limits = DEFAULT_CONCURRENCY | (concurrency or {})
+    pipeline = studio.pipeline
+    names = studio.story_names
+
+    def show_story(name: str) -> tuple[str, Gallery, Any]:
+        markdown, gallery, page_keys = studio.show_story(name)
+        page = gr.Dropdown(choices=page_keys, value=page_keys[0] if page_keys else None)
+        return markdown, gallery, page
+
+    def endpoint(handler: Callable[..., Any], name: str) -> Callable[..., Any]:
+        # Turns errors into a message in the UI rather than a stack trace
+        def run(*args: Any) -> Iterator[Any]:
+            try:
+                yield from handler(*args)
+            except Exception as e:
+                telemetry.count("ui_errors", endpoint=name)
+                raise gr.Error(str(e)) from e
+
+        run.__name__ = name
+        return run
+
+    with gr.Blocks(title="AI Storyteller") as app:
+        story = gr.Dropdown(names, value=names[0] if names else None, label="Story")
+        with gr.Row():
+            text = gr.Markdown()
+            gallery = gr.Gallery(label="Pages", columns=3, height="auto")
+        with gr.Tab("Song"):
+            with gr.Row():
+                lyrics_button = gr.Button("Write lyrics", variant="primary")
+                song_button = gr.Button(
+                    "Sing", variant="primary", visible=pipeline.music_model is not None
+                )
+            with gr.Row():
+                lyrics = gr.Textbox(label="Lyrics", lines=16, max_lines=32)
+                lrc = gr.Textbox(label="Timed lyrics (LRC)", lines=16, max_lines=32)
+            song = gr.Audio(label="Song", streaming=True, autoplay=True)
+        with gr.Tab("Narration", visible=studio.narration is not None):
+            page = gr.Dropdown(label="Page")
+            narrate_button = gr.Button("Read aloud", variant="primary")
+            narration = gr.Audio(label="Narration", streaming=True, autoplay=True)
+        with gr.Tab("Images", visible=pipeline.image_model is not None):
+            images_button = gr.Button("Illustrate", variant="primary")
+
+        # Reading a story is cheap; it only needs its own small limit
+        story.change(show_story, story, [text, gallery, page], concurrency_limit=16)
+        app.load(show_story, story, [text, gallery, page], concurrency_limit=16)
+        lyrics_button.click(
+            endpoint(studio.lyrics, "lyrics"),
+            story,
+            [lyrics, lrc],
+            concurrency_id="text",
+            concurrency_limit=limits["text"],
+        )
+        # Lyrics written for a song wait on the text model's own request slots instead
+        song_button.click(
+            endpoint(studio.song, "song"),
+            story,
+            song,
+            concurrency_id="music",
+            concurrency_limit=limits["music"],
+        )
+        narrate_button.click(
+            endpoint(studio.narrate, "narrate"),
+            [story, page],
+            narration,
+            concurrency_id="tts",
+            concurrency_limit=limits["tts"],
+        )
+        images_button.click(
+            endpoint(studio.images, "images"),
+            story,
+            gallery,
+            concurrency_id="image",
+            concurrency_limit=limits["image"],
+        )
+
+    app.queue(max_size=max_queue_size, default_concurrency_limit=1)
+    return app
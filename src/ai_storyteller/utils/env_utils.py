@@ -1,10 +1,12 @@
 import importlib.util
 import os
+from functools import cache
 
 
 # Helper function to check if a module can be imported
+@cache
 def _is_module_available(module_name: str) -> bool:
-    """Checks if a Python module is available for import."""
+    """Checks if a Python module is available for import. Cached: the answer cannot change mid-run."""
     spec = importlib.util.find_spec(module_name)
     return spec is not None
 
@@ -33,17 +35,24 @@ def _get_from_kaggle(key_name: str) -> str | None:
         return None
 
 
-def _get_from_env(key_name: str) -> str | None:
-    """Tries to get the specified environment variable from environment variables (optionally using python-dotenv)."""
+@cache
+def _load_dotenv() -> None:
+    """Loads the .env file into the environment, once per process."""
     if _is_module_available("dotenv"):
         from dotenv import load_dotenv  # type: ignore
 
         # Load .env file, overriding existing environment variables if present
         load_dotenv(override=True)
+
+
+def _get_from_env(key_name: str) -> str | None:
+    """Tries to get the specified environment variable from environment variables (optionally using python-dotenv)."""
+    _load_dotenv()
     # Always try os.getenv, as dotenv just loads vars into the environment
     return os.getenv(key_name)
 
 
+@cache
 def get_env_var(key_name: str) -> str:
     """
     Retrieves the specified environment variable from various sources in order of preference:
@@ -51,6 +60,9 @@ def get_env_var(key_name: str) -> str:
     2. Kaggle secrets
     3. Environment variables (optionally loaded from .env file)
 
+    Found values are memoized, so each key is resolved once per process. Call
+    `get_env_var.cache_clear()` after changing secrets at runtime.
+
     Raises:
         ValueError: If the specified environment variable cannot be found in any source.
 
@@ -0,0 +1,184 @@
+import re
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+# Song lengths DiffRhythm can generate, in seconds
+SONG_LENGTHS = (95, 285)
+
+# A `[mm:ss.xx]` line, as kept by `text_utils.clean_lyric_lines`, with leading
+# whitespace allowed. ASCII digits only, so the table below can convert them.
+LRC_LINE_PATTERN = re.compile(
+    r"^[ \t]*\[(\d\d):(\d\d)\.(\d\d)\](.*)", re.MULTILINE | re.ASCII
+)
+# Looking up two-digit fields is about twice as fast as calling int() on them
+_TWO_DIGITS = {f"{i:02d}": i for i in range(100)}
+
+
+class LrcValidationError(ValueError):
+    """Raised when a lyric sheet would not produce the intended song."""
+
+    def __init__(self, problems: list[str]):
+        super().__init__("Invalid LRC: " + "; ".join(problems))
+        self.problems = problems
+
+
+class LyricLine(NamedTuple):
+    time: int  # Centiseconds from the start of the song
+    text: str
+
+    @property
+    def seconds(self) -> float:
+        return self.time / 100
+
+
+def format_timestamp(time: int) -> str:
+    """Formats centiseconds as an LRC `[mm:ss.xx]` timestamp."""
+    return "[%02d:%02d.%02d]" % (time // 6000, time // 100 % 60, time % 100)
+
+
+class LyricSheet:
+    """
+    Timed lyrics, stored as an `array` of centisecond timestamps and a list of texts.
+
+    Parse LLM output once with `parse`, check it with `validate` or `check` before
+    spending a diffusion run on it, adjust the timing with `shift`, `stretch` or
+    `fit`, and pass it (or `to_lrc()`) straight to the music generator.
+    """
+
+    __slots__ = ("times", "texts")
+
+    def __init__(self, lines: Iterable[tuple[int, str]] = ()):
+        self.times = array("i")
+        self.texts: list[str] = []
+        for time, text in lines:
+            self.times.append(time)
+            self.texts.append(text)
+
+    @classmethod
+    def parse(cls, lrc: str | None) -> "LyricSheet":
+        """
+        Parses LRC text in one pass, keeping only lines that start with a `[mm:ss.xx]` timestamp.
+
+        Anything else the model wrote (code fences, comments, blank lines) is dropped.
+        The regex does the line splitting and matching in one C-level scan.
+        """
+        sheet = cls()
+        times, texts = sheet.times, sheet.texts
+        digits = _TWO_DIGITS
+        for minutes, seconds, hundredths, text in LRC_LINE_PATTERN.findall(lrc or ""):
+            times.append(digits[minutes] * 6000 + digits[seconds] * 100 + digits[hundredths])
+            texts.append(text.strip())
+        return sheet
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __iter__(self) -> Iterator[LyricLine]:
+        return map(LyricLine, self.times, self.texts)
+
+    def __getitem__(self, index: int) -> LyricLine:
+        return LyricLine(self.times[index], self.texts[index])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LyricSheet):
+            return NotImplemented
+        return self.times == other.times and self.texts == other.texts
+
+    def __repr__(self) -> str:
+        return f"LyricSheet({len(self)} lines, last at {self.end_seconds:.2f}s)"
+
+    @property
+    def end_seconds(self) -> float:
+        """When the last line starts, in seconds."""
+        return max(self.times, default=0) / 100
+
+    def to_lrc(self) -> str:
+        return "\n".join(
+            "[%02d:%02d.%02d]%s" % (time // 6000, time // 100 % 60, time % 100, text)
+            for time, text in zip(self.times, self.texts)
+        )
+
+    def validate(self, audio_length: int | None = None, allow_empty: bool = False) -> list[str]:
+        """
+        Lists what is wrong with the sheet; empty if it is fine.
+
+        Args:
+            audio_length: Song length in seconds. If given, lines must start before it.
+            allow_empty: Accept a sheet without lines, i.e. an instrumental.
+
+        Returns:
+            A description of each problem found.
+        """
+        problems = []
+        if not self.times and not allow_empty:
+            problems.append("no timed lyric lines")
+        if audio_length is not None and audio_length not in SONG_LENGTHS:
+            problems.append(f"audio_length must be one of {SONG_LENGTHS}, got {audio_length}")
+
+        times, texts = self.times, self.texts
+        for i in range(1, len(times)):
+            if times[i] <= times[i - 1]:
+                problems.append(
+                    f"line {i + 1} at {format_timestamp(times[i])} does not come after "
+                    f"{format_timestamp(times[i - 1])}"
+                )
+                break
+        if audio_length is not None and times and max(times) >= audio_length * 100:
+            late = sum(time >= audio_length * 100 for time in times)
+            problems.append(
+                f"{late} line(s) start after the {audio_length}s song ends "
+                f"(last at {format_timestamp(max(times))})"
+            )
+        if texts and not any(texts):
+            problems.append("every lyric line is empty")
+        return problems
+
+    def check(self, audio_length: int | None = None, allow_empty: bool = False) -> "LyricSheet":
+        """Like `validate`, but raises `LrcValidationError` on problems. Returns the sheet."""
+        if problems := self.validate(audio_length, allow_empty):
+            raise LrcValidationError(problems)
+        return self
+
+    # --- Timing ---
+
+    def sort(self) -> "LyricSheet":
+        """Returns a copy with lines in time order; lines at the same time keep their order."""
+        return LyricSheet(sorted(zip(self.times, self.texts), key=lambda line: line[0]))
+
+    def shift(self, seconds: float) -> "LyricSheet":
+        """Returns a copy with every line moved by `seconds`, clamped at 0."""
+        offset = round(seconds * 100)
+        return LyricSheet(
+            (max(0, time + offset), text) for time, text in zip(self.times, self.texts)
+        )
+
+    def stretch(self, factor: float, anchor: float = 0.0) -> "LyricSheet":
+        """
+        Returns a copy with the gaps between lines scaled by `factor`.
+
+        Args:
+            factor: Time scale, e.g. 0.5 to sing twice as fast.
+            anchor: Second that stays in place.
+        """
+        if factor <= 0:
+            raise ValueError("factor must be positive.")
+        anchor_time = anchor * 100
+        return LyricSheet(
+            (max(0, round(anchor_time + (time - anchor_time) * factor)), text)
+            for time, text in zip(self.times, self.texts)
+        )
+
+    def fit(self, audio_length: int, end_margin: float = 5.0) -> "LyricSheet":
+        """
+        Returns a copy compressed so the last line starts `end_margin` seconds before the song ends.
+
+        Sheets that already fit are returned unchanged; the first line keeps its time.
+        """
+        if not self.times:
+            return LyricSheet()
+        start, end = min(self.times), max(self.times)
+        target = (audio_length - end_margin) * 100
+        if end <= target or end == start:
+            return LyricSheet(zip(self.times, self.texts))
+        return self.stretch((target - start) / (end - start), anchor=start / 100)
@@ -0,0 +1,313 @@
+import contextlib
+import contextvars
+import fnmatch
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, TextIO
+
+# Upper bounds in seconds, from a token batch up to a long song
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+METRIC_PREFIX = "ai_storyteller_"
+
+_current_span: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+_span_ids = itertools.count(1)
+
+
+@dataclass
+class SpanRecord:
+    """One timed stage. Picklable, so worker processes can send their spans to the parent."""
+
+    name: str
+    start: float  # Unix time
+    duration: float = 0.0  # Seconds
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: str | None = None
+    span_id: str = ""
+    parent_id: str | None = None
+    pid: int = 0
+
+    def fail(self, error: BaseException | str) -> None:
+        """Marks the span failed, e.g. when the caller handles the error itself."""
+        self.status = "error"
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _labels_key(labels: dict[str, Any]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    pairs = [f'{key}="{_escape(value)}"' for key, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Telemetry:
+    """
+    Spans and metrics for the generation backends.
+
+    `span` times a stage such as "music.sample" or "text.generate", nested spans
+    record their parent, and every finished span also feeds the
+    `ai_storyteller_stage_seconds` histogram. `count` and `observe` record other
+    metrics, e.g. tokens generated. Recording is in-memory and cheap; export is opt-in:
+
+    - JSON lines: each finished span is appended to `jsonl_path` as it ends.
+    - Prometheus text: `to_prometheus` / `write_prometheus`, e.g. for node_exporter's
+      textfile collector.
+    - Profiling: spans whose name matches a `profile_stages` pattern run under
+      cProfile, dumping `<stage>-<pid>-<n>.prof` to `profile_dir` for snakeviz or
+      pstats. Sampling profilers such as py-spy need no hook: attach with
+      `py-spy record --pid` and line the flame graph up with the span timeline.
+    - Hooks: `add_hook` callbacks receive every finished `SpanRecord`.
+
+    Spans from a worker process are collected with `drain` there and replayed with
+    `ingest` here, so they reach the same exports.
+    """
+
+    def __init__(self, max_spans: int = 10_000):
+        """
+        Args:
+            max_spans: Finished spans kept in memory for `drain` and `summary`.
+        """
+        self.spans: deque[SpanRecord] = deque(maxlen=max_spans)
+        self.profile_stages: tuple[str, ...] = ()
+        self.profile_dir = Path("profiles")
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._histograms: dict[tuple[str, tuple[tuple[str, str], ...]], _Histogram] = {}
+        self._jsonl: TextIO | None = None
+        self._hooks: list[Callable[[SpanRecord], None]] = []
+        self._profiling = threading.Lock()  # cProfile allows one active profiler
+        self._profile_count = itertools.count(1)
+
+    def configure(
+        self,
+        jsonl_path: str | Path | None = None,
+        profile_stages: Sequence[str] = (),
+        profile_dir: str | Path | None = None,
+    ) -> None:
+        """
+        Args:
+            jsonl_path: Append finished spans here as JSON lines. None stops writing.
+            profile_stages: Span names or glob patterns, e.g. "music.sample" or "text.*", to profile.
+            profile_dir: Where to write .prof files. Defaults to ./profiles.
+        """
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+            if jsonl_path is not None:
+                Path(jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+                self._jsonl = open(jsonl_path, "a", encoding="utf-8", buffering=1)
+        self.profile_stages = tuple(profile_stages)
+        if profile_dir is not None:
+            self.profile_dir = Path(profile_dir)
+
+    def add_hook(self, hook: Callable[[SpanRecord], None]) -> None:
+        self._hooks.append(hook)
+
+    def current_span_id(self) -> str | None:
+        return _current_span.get()
+
+    # --- Spans ---
+
+    def _should_profile(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.profile_stages)
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, parent: str | None = None, **attributes: Any
+    ) -> Iterator[SpanRecord]:
+        """
+        Times the enclosed block as a stage.
+
+        Args:
+            name: Dotted stage name, e.g. "music.decode".
+            parent: Parent span id, for spans continued from another process. Defaults
+                to the enclosing span.
+            **attributes: Values to record with the span, e.g. batch size.
+
+        Yields:
+            The span, so the block can add attributes or mark it failed.
+        """
+        record = SpanRecord(
+            name,
+            start=time.time(),
+            attributes=attributes,
+            span_id=f"{os.getpid():x}-{next(_span_ids):x}",
+            parent_id=parent or _current_span.get(),
+            pid=os.getpid(),
+        )
+        token = _current_span.set(record.span_id)
+        profiler = None
+        if self.profile_stages and self._should_profile(name) and self._profiling.acquire(
+            blocking=False
+        ):
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.fail(e)
+            raise
+        finally:
+            record.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling.release()
+                self._dump_profile(profiler, name)
+            self._finish(record)
+
+    def _dump_profile(self, profiler: Any, name: str) -> None:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / f"{name}-{os.getpid()}-{next(self._profile_count)}.prof"
+        profiler.dump_stats(path)
+        print(f"Profile of {name} written to {path}")
+
+    def _finish(self, record: SpanRecord) -> None:
+        with self._lock:
+            self.spans.append(record)
+            self._observe_locked(
+                "stage_seconds", record.duration, {"stage": record.name, "status": record.status}
+            )
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps(record.to_dict(), default=str) + "\n")
+        for hook in self._hooks:
+            try:
+                hook(record)
+            except Exception as e:
+                print(f"Warning: telemetry hook failed: {e}")
+
+    def drain(self) -> list[SpanRecord]:
+        """Removes and returns the finished spans, e.g. to send them to another process."""
+        with self._lock:
+            records = list(self.spans)
+            self.spans.clear()
+        return records
+
+    def ingest(self, records: Iterable[SpanRecord]) -> None:
+        """Records spans finished elsewhere as if they had finished here."""
+        for record in records:
+            self._finish(record)
+
+    # --- Metrics ---
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Adds to a counter, exported as `ai_storyteller_<name>_total`."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe_locked(self, name: str, value: float, labels: dict[str, Any]) -> None:
+        key = (name, _labels_key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(DEFAULT_BUCKETS)
+        histogram.observe(value)
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Records a value in a histogram, exported as `ai_storyteller_<name>`."""
+        with self._lock:
+            self._observe_locked(name, value, labels)
+
+    def to_prometheus(self) -> str:
+        """Renders counters and histograms in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [
+                (key, (hist.buckets, list(hist.counts), hist.sum, hist.count))
+                for key, hist in sorted(self._histograms.items(), key=lambda item: item[0])
+            ]
+        typed: set[str] = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            metric = f"{METRIC_PREFIX}{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = (*labels, ("le", f"{bound:g}"))
+                lines.append(f"{metric}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels((*labels, ('le', '+Inf')))} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str | Path) -> Path:
+        """Writes `to_prometheus` atomically, so a scraper never reads half a file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f"{path.suffix}.tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return path
+
+    def summary(self) -> str:
+        """A table of count and latency percentiles per stage, from the spans kept in memory."""
+        durations: dict[str, list[float]] = {}
+        with self._lock:
+            for record in self.spans:
+                durations.setdefault(record.name, []).append(record.duration)
+        if not durations:
+            return "No spans recorded."
+        rows = [f"{'stage':<28} {'count':>6} {'total s':>9} {'p50 s':>8} {'p95 s':>8} {'max s':>8}"]
+        for name, values in sorted(durations.items()):
+            values.sort()
+            rows.append(
+                f"{name:<28} {len(values):6d} {sum(values):9.2f} "
+                f"{_percentile(values, 0.5):8.3f} {_percentile(values, 0.95):8.3f} {values[-1]:8.3f}"
+            )
+        return "\n".join(rows)
+
+
+# Process-wide instance used by the backends
+telemetry = Telemetry()
@@ -13,6 +13,8 @@ PATTERN_VERBOSE = r"""
 .* # Match any character (except newline) zero or more times (the lyric text)
 $               # End of the line (due to re.MULTILINE)
 """
+# Compiled once with re.VERBOSE for better readability
+LYRIC_LINE_PATTERN = re.compile(PATTERN_VERBOSE, re.MULTILINE | re.VERBOSE)
 
 
 def clean_lyric_lines(lyrics: str | None) -> str:
@@ -25,17 +27,8 @@ def clean_lyric_lines(lyrics: str | None) -> str:
     Returns:
         list[str]: A list of cleaned lyric lines.
     """
-    # Compile the regex pattern with re.VERBOSE for better readability
-    pattern_verbose = re.compile(PATTERN_VERBOSE, re.MULTILINE | re.VERBOSE)
-    # Use re.findall with re.MULTILINE and re.VERBOSE flags combined
-    # Use the bitwise OR operator '|' to combine flags
-    valid_lyric_lines = re.findall(
-        pattern_verbose,
+    # For timestamps and validation, parse with `lrc.LyricSheet` instead
+    valid_lyric_lines = LYRIC_LINE_PATTERN.findall(
         lyrics or "",  # Use an empty string if lyrics is None
     )
-    valid_lyric_lines = [
-        cleaned_line
-        for line in valid_lyric_lines
-        if (cleaned_line := line.strip()) != ""
-    ]
-    return "\n".join(valid_lyric_lines)
+    return "\n".join(line.strip() for line in valid_lyric_lines)
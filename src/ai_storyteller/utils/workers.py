@@ -0,0 +1,497 @@
+import hashlib
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import traceback
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import ForkingPickler
+from pathlib import Path
+from typing import Any
+
+from ..config.settings import settings
+from .telemetry import telemetry
+
+# Env vars read by the OpenMP, MKL and OpenBLAS runtimes when torch first loads them
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores() -> list[int]:
+    """CPU cores this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # Not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def split_cores(workers: int, cores: Sequence[int] | None = None) -> list[tuple[int, ...]]:
+    """
+    Splits cores into `workers` contiguous, near-equal subsets.
+
+    Neighbouring core ids usually share caches, so contiguous subsets keep each worker's
+    threads close together. With more workers than cores, workers share cores.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    cores = list(cores if cores is not None else available_cores())
+    if workers >= len(cores):
+        return [(cores[i % len(cores)],) for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    subsets = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (i < extra)
+        subsets.append(tuple(cores[start:end]))
+        start = end
+    return subsets
+
+
+def worker_devices(workers: int) -> list[str]:
+    """
+    Picks a device for each of `workers` model workers.
+
+    Without CUDA every worker runs on "cpu", on its own cores (see `split_cores`). With CUDA
+    each worker gets its own GPU: more workers than GPUs would load one model copy per
+    worker onto the same card, so the count is capped at the number of GPUs.
+
+    Returns:
+        One device per worker that should be started.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    import torch
+
+    if not torch.cuda.is_available():
+        return ["cpu"] * workers
+    count = torch.cuda.device_count()
+    if workers > count:
+        print(
+            f"Warning: {workers} workers requested but only {count} CUDA device(s) found; "
+            f"starting {count}."
+        )
+    return [f"cuda:{i}" for i in range(min(workers, count))]
+
+
+def pin_current_process(cores: Sequence[int] | None, num_threads: int | None = None) -> None:
+    """
+    Restricts this process to `cores` and sizes torch's thread pools to match.
+
+    Call it first thing in a fresh worker process: the thread env vars only take effect
+    if torch has not been imported yet.
+    """
+    num_threads = num_threads or (len(cores) if cores else None)
+    if num_threads:
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(num_threads)
+    if cores:
+        try:
+            os.sched_setaffinity(0, cores)
+        except (AttributeError, OSError) as e:
+            print(f"Warning: could not pin pid {os.getpid()} to cores {list(cores)}: {e}")
+    if num_threads:
+        import torch
+
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Already set, or parallel work has started
+
+
+def _state_digest(state: dict[str, Any]) -> str:
+    """Hash of a state dict's names, shapes, dtypes and tensor contents."""
+    import torch
+
+    digest = hashlib.blake2b(digest_size=8)
+    for name, tensor in state.items():
+        digest.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype};".encode())
+        data = tensor.detach().contiguous().reshape(-1)
+        if data.numel():
+            digest.update(memoryview(data.view(torch.uint8).numpy()))
+    return digest.hexdigest()
+
+
+def share_weights(module: Any, key: str, cache_dir: str | Path | None = None) -> bool:
+    """
+    Backs a CPU module's weights with a memory-mapped file shared by every process.
+
+    The first process to get here saves the module's state dict to
+    `<cache_dir>/<key>-<digest>.pt`, where the digest covers every tensor's name, shape,
+    dtype and contents; every process then reloads it with `torch.load(mmap=True)` and
+    assigns the mapped tensors in place of its own. Changed weights under the same key
+    (a new revision, a retrained checkpoint) get a new file, and older files for the
+    key are removed. Inference never writes weights,
+    so N workers keep one copy in the page cache instead of N private copies. Each
+    worker still holds a private copy while it loads, so start workers one at a time
+    when memory is tight.
+
+    Modules whose state cannot be saved and reloaded this way (e.g. quantized packed
+    weights or TorchScript) keep their private weights.
+
+    Args:
+        module: A `torch.nn.Module` on the CPU.
+        key: File name for these weights; include everything that changes them, such
+            as the repository id and dtype.
+        cache_dir: Defaults to `settings.cache_dir / "weights"`.
+
+    Returns:
+        Whether the weights are now shared.
+    """
+    import torch
+
+    if not isinstance(module, torch.nn.Module):
+        return False
+    state = module.state_dict()
+    if any(tensor.device.type != "cpu" for tensor in state.values()):
+        return False
+    weights_dir = Path(cache_dir or settings.cache_dir / "weights")
+    try:
+        path = weights_dir / f"{key}-{_state_digest(state)}.pt"
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            torch.save(state, tmp_path)
+            os.replace(tmp_path, path)  # Atomic, so concurrent workers never read half a file
+            for stale in weights_dir.glob(f"{key}-*.pt"):
+                if stale != path:
+                    stale.unlink(missing_ok=True)  # Processes that mapped it keep their pages
+        shared = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+        module.load_state_dict(shared, assign=True)
+    except Exception as e:
+        print(f"Warning: keeping private weights for {key}: {type(e).__name__}: {e}")
+        return False
+    return True
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a worker process dies while handling a request."""
+
+
+def _serve_model(
+    conn: Connection,
+    factory: Callable[[], Any],
+    cores: Sequence[int] | None,
+    num_threads: int | None,
+    max_concurrency: int,
+) -> None:
+    """Entry point of a `ProcessModel` process: pin, build the model, then serve calls."""
+    pin_current_process(cores, num_threads)
+    try:
+        model = factory()
+    except Exception as e:
+        conn.send({"id": None, "ok": False, "error": f"{type(e).__name__}: {e}"})
+        return
+    conn.send({"id": None, "ok": True, "result": None})
+
+    send_lock = threading.Lock()
+
+    def handle(request_id: int, method: str, args: tuple, kwargs: dict[str, Any]) -> None:
+        # Pickled here rather than by `conn.send`, so a result that can't cross the pipe
+        # still gets a reply instead of leaving the caller waiting forever
+        try:
+            if method == "__getattr__":
+                value = getattr(model, args[0])
+                result = ("method", None) if callable(value) else ("value", value)
+            else:
+                result = getattr(model, method)(*args, **kwargs)
+            if isinstance(result, Iterator):
+                raise TypeError(
+                    f"{method} returned an iterator, which can't be sent between processes."
+                )
+            payload = ForkingPickler.dumps(
+                {"id": request_id, "ok": True, "result": result, "spans": telemetry.drain()}
+            )
+        except Exception as e:
+            payload = ForkingPickler.dumps(
+                {
+                    "id": request_id,
+                    "ok": False,
+                    "error": f"{type(e).__name__}: {e}",
+                    "traceback": traceback.format_exc(),
+                    "spans": telemetry.drain(),
+                }
+            )
+        with send_lock:
+            conn.send_bytes(payload)
+
+    # Calls run in threads, so a model that batches concurrent calls still can
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, KeyboardInterrupt):
+                break
+            if request is None:
+                break
+            executor.submit(handle, *request)
+    close = getattr(model, "close", None)
+    if callable(close):
+        close()
+    conn.close()
+
+
+class ProcessModel:
+    """
+    Runs any model in its own spawned process, pinned to a set of CPU cores.
+
+    Method calls are forwarded over a pipe, so a `ProcessModel` wrapping a text or image
+    model can be used wherever the model itself is. Calls from many threads are in
+    flight at once and run concurrently in the worker, so models that batch concurrent
+    requests keep doing so. Attributes that are not methods are fetched once and cached.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        cores: Sequence[int] | None = None,
+        num_threads: int | None = None,
+        max_concurrency: int = 16,
+        name: str = "model-worker",
+        startup_timeout: float | None = None,
+        autostart: bool = True,
+        attributes: dict[str, Any] | None = None,
+    ):
+        """
+        Args:
+            factory: Picklable callable that builds the model in the worker process,
+                e.g. `functools.partial(FluxImageGeneration, offload="none")`.
+            cores: CPU cores the worker may run on. None leaves it unpinned.
+            num_threads: Torch threads in the worker. Defaults to one per core.
+            max_concurrency: Calls the worker handles at once.
+            name: Process name, shown in logs and process listings.
+            startup_timeout: Seconds to wait for the model to be built. None waits forever.
+            autostart: Whether to start the process now rather than on the first call.
+            attributes: Attribute values known up front, e.g. {"model": model_id}, returned
+                without starting the worker.
+        """
+        self.factory = factory
+        self.cores = tuple(cores) if cores else None
+        self.num_threads = num_threads
+        self.max_concurrency = max_concurrency
+        self.name = name
+        self.startup_timeout = startup_timeout
+        self._process: Any = None
+        self._conn: Connection | None = None
+        self._reader: threading.Thread | None = None
+        self._pending: dict[int, Future[Any]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._attributes: dict[str, tuple[str, Any]] = {
+            name: ("value", value) for name, value in (attributes or {}).items()
+        }
+        if autostart:
+            self.start()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        """Starts the worker process and waits until the model is built."""
+        with self._lock:
+            if self.is_alive:
+                return
+            ctx = mp.get_context("spawn")  # Fresh interpreter: no inherited threads or CUDA state
+            parent_conn, child_conn = ctx.Pipe()
+            self._process = ctx.Process(
+                target=_serve_model,
+                args=(child_conn, self.factory, self.cores, self.num_threads, self.max_concurrency),
+                name=self.name,
+                daemon=True,
+            )
+            self._process.start()
+            child_conn.close()
+            if not parent_conn.poll(self.startup_timeout):
+                self._process.kill()
+                raise TimeoutError(f"Timed out starting {self.name}.")
+            try:
+                reply = parent_conn.recv()
+            except EOFError as e:
+                self._process.join()
+                raise WorkerCrashedError(
+                    f"{self.name} exited with code {self._process.exitcode} while starting."
+                ) from e
+            if not reply["ok"]:
+                self._process.join()
+                raise RuntimeError(f"{self.name} failed to start: {reply['error']}")
+            self._conn = parent_conn
+            self._reader = threading.Thread(
+                target=self._read_replies, name=f"{self.name}-reader", daemon=True
+            )
+            self._reader.start()
+        cores = f" on cores {list(self.cores)}" if self.cores else ""
+        print(f"Started {self.name} (pid {self._process.pid}){cores}")
+
+    def _read_replies(self) -> None:
+        assert self._conn is not None
+        conn = self._conn
+        while True:
+            try:
+                reply = conn.recv()
+            except (EOFError, OSError):
+                break
+            telemetry.ingest(reply.pop("spans", ()))
+            with self._lock:
+                future = self._pending.pop(reply["id"], None)
+            if future is None:
+                continue
+            if reply["ok"]:
+                future.set_result(reply["result"])
+            else:
+                future.set_exception(RuntimeError(reply["error"]))
+        # The worker is gone: fail whatever it was still working on
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(WorkerCrashedError(f"{self.name} exited."))
+
+    def submit(self, method: str, *args: Any, **kwargs: Any) -> Future[Any]:
+        """Calls `method` on the model in the worker without waiting for the result."""
+        if self._process is None:
+            self.start()  # Not started yet (autostart=False): start on demand
+        future: Future[Any] = Future()
+        with self._lock:
+            if not self.is_alive or self._conn is None:
+                raise WorkerCrashedError(f"{self.name} is not running.")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self._conn.send((request_id, method, args, kwargs))
+        return future
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Calls `method` on the model in the worker and waits for the result."""
+        return self.submit(method, *args, **kwargs).result()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._attributes:
+            self._attributes[name] = self.call("__getattr__", name)
+        kind, value = self._attributes[name]
+        if kind == "value":
+            return value
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Lets the worker finish its calls in flight and close the model, then stops it."""
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+            self._process = None
+        if conn is not None:
+            conn.close()
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+
+    def close(self) -> None:
+        self.stop()
+
+    def __enter__(self) -> "ProcessModel":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+class ModelPool:
+    """
+    Routes calls across interchangeable model instances, each to the least loaded.
+
+    Members are typically one worker per core subset (see `split_cores`), e.g.
+    `DiffRhythmWorker`s or `ProcessModel`s. A call goes to the member with the fewest
+    calls in flight, ties broken by whichever has been given the fewest calls so far,
+    so work spreads evenly. Method calls and attributes are looked up as on a single
+    member, so a pool can stand in for one model; attributes come from the first member.
+    """
+
+    def __init__(self, members: Sequence[Any], name: str = "model"):
+        """
+        Args:
+            members: Model instances with the same methods and configuration.
+            name: Label of this pool in telemetry.
+        """
+        if not members:
+            raise ValueError("A pool needs at least one member.")
+        self.members = list(members)
+        self.name = name
+        self.in_flight = [0] * len(self.members)
+        self.dispatched = [0] * len(self.members)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def _acquire(self) -> int:
+        with self._lock:
+            index = min(
+                range(len(self.members)), key=lambda i: (self.in_flight[i], self.dispatched[i])
+            )
+            self.in_flight[index] += 1
+            self.dispatched[index] += 1
+        telemetry.count("pool_calls", pool=self.name, member=index)
+        return index
+
+    def _release(self, index: int) -> None:
+        with self._lock:
+            self.in_flight[index] -= 1
+
+    def _stream(self, index: int, iterator: Iterator[Any]) -> Iterator[Any]:
+        # A generator keeps its member busy until it is exhausted or closed
+        try:
+            yield from iterator
+        finally:
+            self._release(index)
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Calls `method` on the least loaded member."""
+        index = self._acquire()
+        try:
+            result = getattr(self.members[index], method)(*args, **kwargs)
+        except BaseException:
+            self._release(index)
+            raise
+        if isinstance(result, Iterator):
+            return self._stream(index, result)
+        self._release(index)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        value = getattr(self.members[0], name)
+        if not callable(value):
+            return value
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def stop(self) -> None:
+        """Stops every member, in parallel."""
+        threads = []
+        for member in self.members:
+            stop = getattr(member, "stop", None) or getattr(member, "close", None)
+            if callable(stop):
+                threads.append(threading.Thread(target=stop))
+                threads[-1].start()
+        for thread in threads:
+            thread.join()
+
+    def close(self) -> None:
+        self.stop()
+
+    def __enter__(self) -> "ModelPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
@@ -0,0 +1,38 @@
+import numpy as np
+
+from ai_storyteller.asr.vad import EnergyVAD
+
+SAMPLE_RATE = 16000
+
+
+def speech(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.1 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))).astype(
+        np.float32
+    )
+
+
+def noise(seconds: float, amplitude: float = 3e-4) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (amplitude * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def segments(audio: np.ndarray) -> list[tuple[float, float]]:
+    vad = EnergyVAD(SAMPLE_RATE)
+    found = []
+    for start in range(0, len(audio), 4000):
+        found += vad.process(audio[start : start + 4000])
+    found += vad.flush()
+    return [(segment.start(SAMPLE_RATE), segment.end(SAMPLE_RATE)) for segment in found]
+
+
+def test_speech_at_the_start_is_kept() -> None:
+    found = segments(np.concatenate([speech(2), noise(1), speech(2)]))
+
+    assert len(found) == 2
+    assert found[0][0] == 0.0 and found[0][1] > 1.9
+    assert 2.7 < found[1][0] < 3.0
+
+
+def test_steady_hum_is_not_speech() -> None:
+    assert segments(noise(5, amplitude=0.008)) == []
@@ -0,0 +1,48 @@
+import numpy as np
+
+from ai_storyteller.music_generation.postprocess import Mastering
+from ai_storyteller.music_generation.streaming import AudioChunk
+
+SAMPLE_RATE = 1000
+
+
+def tone(seconds: float) -> np.ndarray:
+    return np.full((int(seconds * SAMPLE_RATE), 2), 8000, dtype=np.int16)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros((int(seconds * SAMPLE_RATE), 2), dtype=np.int16)
+
+
+def trim(song: np.ndarray, chunk_seconds: float = 1.0) -> np.ndarray:
+    size = int(chunk_seconds * SAMPLE_RATE)
+    chunks = (
+        AudioChunk(song[start : start + size], SAMPLE_RATE, start)
+        for start in range(0, len(song), size)
+    )
+    return np.concatenate([chunk.pcm for chunk in Mastering(keep_silence=0.5).trim_end(chunks)])
+
+
+def test_trailing_silence_is_cut_to_keep_silence() -> None:
+    song = np.concatenate([tone(2), silence(4)])
+
+    assert len(trim(song)) == 2500
+
+
+def test_rests_within_the_song_are_kept() -> None:
+    song = np.concatenate([tone(1.5), silence(3), tone(1.5), silence(2.2)])
+
+    trimmed = trim(song, chunk_seconds=0.7)
+
+    assert len(trimmed) == 6500
+    np.testing.assert_array_equal(trimmed[:6000], song[:6000])
+
+
+def test_only_the_current_silent_run_is_held_back() -> None:
+    song = np.concatenate([tone(1), silence(3), tone(1)])
+    chunks = [AudioChunk(song[i : i + 1000], SAMPLE_RATE, i) for i in range(0, 5000, 1000)]
+    out = Mastering().trim_end(iter(chunks))
+
+    first = next(out)
+
+    assert len(first.pcm) == 1000  # Emitted before any of the silence arrives
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any
+
+from ai_storyteller.music_generation.jobs import MusicJob, load_lyrics
+from ai_storyteller.music_generation.scheduler import JobStatus, MusicJobManager
+
+LRC = "[00:01.00]Once upon a time\n[00:05.00]Seven little goats\n"
+
+
+class FakeMusicModel:
+    """Writes the lyrics it was asked to sing, resolved like `DiffRhythmWorker` does."""
+
+    def __init__(self) -> None:
+        self.calls: list[dict[str, Any]] = []
+
+    def generate_music(self, **kwargs: Any) -> Path:
+        self.calls.append(kwargs)
+        lyrics = load_lyrics(kwargs.get("lrc"), kwargs["lrc_path"], kwargs["audio_length"])
+        path = Path(kwargs["output_dir"]) / kwargs["output_file_name"]
+        path.write_text(lyrics, encoding="utf-8")
+        return path
+
+
+def run_job(job: MusicJob) -> tuple[JobStatus, str | None, Path | None, FakeMusicModel]:
+    model = FakeMusicModel()
+
+    async def main() -> tuple[JobStatus, str | None, Path | None]:
+        async with MusicJobManager(lambda: model, max_workers=1) as manager:
+            job_id = await manager.submit(job, user="alice")
+            scheduled = manager.get(job_id)
+            await scheduled.done.wait()
+            return scheduled.status, scheduled.error, scheduled.path
+
+    return (*asyncio.run(main()), model)
+
+
+def test_inline_lyrics_reach_the_model(tmp_path: Path) -> None:
+    status, error, path, model = run_job(MusicJob(None, tmp_path, lrc=LRC))
+
+    assert status is JobStatus.SUCCEEDED, error
+    assert model.calls[0]["lrc"] == LRC
+    assert path is not None and "Seven little goats" in path.read_text(encoding="utf-8")
+
+
+def test_inline_lyrics_win_over_the_file(tmp_path: Path) -> None:
+    lrc_path = tmp_path / "song.lrc"
+    lrc_path.write_text("[00:01.00]From the file\n", encoding="utf-8")
+
+    status, error, path, _ = run_job(MusicJob(lrc_path, tmp_path, lrc=LRC))
+
+    assert status is JobStatus.SUCCEEDED, error
+    assert path is not None and "From the file" not in path.read_text(encoding="utf-8")
+
+
+def test_lyrics_file_without_inline_lyrics(tmp_path: Path) -> None:
+    lrc_path = tmp_path / "song.lrc"
+    lrc_path.write_text(LRC, encoding="utf-8")
+
+    status, error, _, model = run_job(MusicJob(lrc_path, tmp_path))
+
+    assert status is JobStatus.SUCCEEDED, error
+    assert "lrc" not in model.calls[0]
+
+
+class HangingMusicModel:
+    """Never finishes a song until it is killed, like a stuck worker process."""
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.killed = threading.Event()
+        self.stopped = threading.Event()
+
+    def generate_music(self, **kwargs: Any) -> Path | None:
+        self.killed.wait(10)
+        return None
+
+    def terminate(self) -> None:
+        self.calls.append("terminate")
+        self.killed.set()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self.calls.append("stop")
+        self.stopped.set()
+
+
+def test_timed_out_job_kills_and_reaps_the_model(tmp_path: Path) -> None:
+    model = HangingMusicModel()
+
+    async def main() -> JobStatus:
+        async with MusicJobManager(lambda: model, max_workers=1) as manager:
+            job_id = await manager.submit(MusicJob(None, tmp_path, lrc=LRC), timeout=0.05)
+            scheduled = manager.get(job_id)
+            await scheduled.done.wait()
+            await asyncio.to_thread(model.stopped.wait, 5)
+            return scheduled.status
+
+    assert asyncio.run(main()) is JobStatus.TIMED_OUT
+    assert model.calls == ["terminate", "stop"]
@@ -0,0 +1,40 @@
+from ai_storyteller.pipeline.runner import StoryPipeline
+from ai_storyteller.pipeline.story import Story, StoryPage
+
+STYLE_GUIDE = {
+    "overall_style": "Soft watercolor.",
+    "character_design": {"mother_goat": "Kind face, wearing an apron."},
+}
+
+
+def make_pipeline() -> StoryPipeline:
+    return StoryPipeline(text_model=None, image_style="Crayon drawing")
+
+
+def test_written_prompt_uses_the_style_guide() -> None:
+    page = StoryPage("1", "The goats went out.", extra={
+        "image_prompt": "Style: [Use Defined Style Guide]. Full page illustration of goats.",
+    })
+    story = Story("goats", "Goats", [page], extra={"style_guide": STYLE_GUIDE})
+
+    prompt = make_pipeline().page_image_prompt(story, "1")
+
+    assert prompt == (
+        "Style: Soft watercolor; character design: mother goat: Kind face, wearing an apron."
+        " Full page illustration of goats."
+    )
+
+
+def test_written_prompt_without_a_style_guide() -> None:
+    page = StoryPage("1", "", extra={"image_prompt": "[Use Defined Style Guide]. Goats."})
+    story = Story("goats", "Goats", [page])
+
+    assert make_pipeline().page_image_prompt(story, "1") == "Crayon drawing. Goats."
+
+
+def test_page_text_without_a_written_prompt() -> None:
+    story = Story("goats", "Goats", [StoryPage("cover", ""), StoryPage("1", "The goats went out.")])
+    pipeline = make_pipeline()
+
+    assert pipeline.page_image_prompt(story, "1") == "Crayon drawing. The goats went out."
+    assert pipeline.page_image_prompt(story, "cover") == "Crayon drawing. Goats"